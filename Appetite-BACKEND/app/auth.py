@@ -89,3 +89,10 @@ async def get_current_user(
     except Exception as e:
         logger.exception("verify_id_token failed")
         raise HTTPException(status_code=401, detail="Invalid or expired token")
+
+# --- Dependency for admin-only endpoints ---
+async def require_admin(user: FirebaseUser = Depends(get_current_user)) -> FirebaseUser:
+    """The ID token must carry the custom claim admin=true (set with auth.set_custom_user_claims)"""
+    if not user.claims.get("admin"):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin only")
+    return user
@@ -1,53 +1,72 @@
 ﻿import os
-import torch
-import clip
 from contextlib import asynccontextmanager
 from loguru import logger
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from firebase_admin import firestore
-import whisper
 
 
 from app.routers import (
     recipes, auth, debug, comments, user, searchSimRecipe, 
-    voice_agent, searchIngredients, follow, ws_voice_agent) #, feed
-from app.services.searchSimRecipe import build_faiss_index
+    voice_agent, searchIngredients, follow, ws_voice_agent, health, admin) #, feed
+from app.resources import start_resource, is_ready
+from app.services.clip_batcher import ClipBatcher
+from app.utils.executors import shutdown_cpu_executor
+from app.utils.http_fetch import create_http_client
+from app.services.searchSimRecipe import load_clip_model, load_recipe_index
+from app.services.ingredient_index import load_ingredient_index
+from app.services.index_rebuild import start_rebuild_schedule
+from app.services.recipe_ingredient_index import load_recipe_ingredient_index, start_recipe_ingredient_refresh
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # --- Startup ---
-    logger.info("Choose device...")
-    app.state.device = "cuda" if torch.cuda.is_available() else "cpu"
+    # Firestore
+    logger.info("Connecting Firestore...")
+    app.state.db = firestore.client()
+    logger.info("Firestore ready")
+
+    # Heavy resources load in the background; /readyz reports their state
+    # and endpoints that need them answer 503 until then.
+    app.state.loaders = [
+        start_resource(app, "clip", load_clip_model),
+        start_resource(app, "recipe_index", load_recipe_index),
+        start_resource(app, "ingredient_index", load_ingredient_index),
+        start_resource(app, "recipe_ingredients", load_recipe_ingredient_index),
+    ]
+
+    # Pooled client for remote image fetches
+    app.state.http = create_http_client()
+
+    # Concurrent similarity queries share CLIP forward passes
+    app.state.clip_batcher = ClipBatcher(app)
+    app.state.clip_batcher.start()
 
-    # Load CLIP
-    logger.info("Loading CLIP model...")
-    model, preprocess = clip.load("ViT-B/32", device=app.state.device)
-    app.state.model = model
-    app.state.preprocess = preprocess
-    logger.info("CLIP model ready")
+    # Periodic zero-downtime rebuild of the similarity index (INDEX_REBUILD_INTERVAL_HOURS)
+    app.state.rebuild_schedule = start_rebuild_schedule(app)
+    # Ingredient search picks up recipes other workers wrote (RECIPE_INGREDIENTS_REFRESH_SECONDS)
+    app.state.ingredient_refresh = start_recipe_ingredient_refresh(app)
 
     # Load Whisper STT
     # logger.info("Loading Whisper STT model...")
     # app.state.whisper = whisper.load_model("large-v3-turbo", device=app.state.device)
     # logger.info("Whisper STT ready")
 
-    # Firestore
-    logger.info("Connecting Firestore...")
-    app.state.db = firestore.client()
-    logger.info("Firestore ready")
-
-    # Build FAISS
-    logger.info("Fetching and Building feature index...")
-    index, ids = build_faiss_index(app)
-    app.state.faiss_index = index
-    app.state.id_mapping = ids
-    logger.info("Feature index ready")
-
     yield   # Where the app runs
 
     # --- Shutdown ---
     logger.info("Shutting down app")
+    for task in app.state.loaders:
+        task.cancel()
+    for task in (app.state.rebuild_schedule, app.state.ingredient_refresh):
+        if task is not None:
+            task.cancel()
+    await app.state.clip_batcher.stop()
+    shutdown_cpu_executor()
+    await app.state.http.aclose()
+    if is_ready(app, "recipe_index") and app.state.recipe_index.dirty:
+        # Keep live adds/removes so the next boot's delta stays small
+        app.state.recipe_index.persist()
 
 
 def create_app():
@@ -62,10 +81,12 @@ def create_app():
         allow_headers=["*"],
     )
 
+    app.include_router(health.router)
     app.include_router(auth.router)
     app.include_router(recipes.router)
     app.include_router(searchSimRecipe.router)
     app.include_router(debug.router)
+    app.include_router(admin.router)
     app.include_router(user.router)
     app.include_router(searchIngredients.router)
     app.include_router(follow.router)
@@ -0,0 +1,54 @@
+"""
+Preload-then-fork serving (gunicorn.conf.py).
+
+The gunicorn master calls preload_shared_resources() once, before forking
+the workers:
+  1. refresh the FAISS snapshot in a short-lived child process, so workers
+     memory-map the same file and only fetch a (near) empty delta instead of
+     each scanning recipe_embeddings. The master itself never talks to
+     Firestore: gRPC channels don't survive fork;
+  2. load the CLIP weights, shared by all workers as copy-on-write pages;
+  3. gc.freeze(), so garbage collections in the workers don't write to
+     (and un-share) the pages of everything loaded so far.
+
+  python -m app.preload   # step 1 only
+"""
+import gc
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+from loguru import logger
+
+from app.services.searchSimRecipe import load_or_build_faiss_index, preload_clip_model
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+SNAPSHOT_REFRESH_TIMEOUT_SECONDS = float(os.getenv("SNAPSHOT_REFRESH_TIMEOUT_SECONDS", "600"))
+
+
+def refresh_index_snapshot() -> None:
+    """Bring the local FAISS snapshot up to date with Firestore (full build if missing or stale)"""
+    from app.db.firestore import db
+    load_or_build_faiss_index(SimpleNamespace(state=SimpleNamespace(db=db)))
+
+
+def preload_shared_resources() -> None:
+    started = time.perf_counter()
+    try:
+        subprocess.run([sys.executable, "-m", "app.preload"], cwd=PROJECT_ROOT,
+                       check=True, timeout=SNAPSHOT_REFRESH_TIMEOUT_SECONDS)
+    except (subprocess.SubprocessError, OSError) as e:
+        # Workers still start; each builds or loads the index itself
+        logger.warning(f"FAISS snapshot refresh failed, workers load the index themselves: {e}")
+
+    if preload_clip_model():
+        logger.info("CLIP weights preloaded for the workers")
+    gc.freeze()
+    logger.info(f"Shared resources preloaded in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    refresh_index_snapshot()
@@ -0,0 +1,101 @@
+# app/resources.py
+import asyncio
+import time
+from typing import Callable, Dict, Optional
+
+from fastapi import FastAPI, HTTPException, Request, status
+from loguru import logger
+
+# Heavy resources (CLIP, FAISS index, ...) load in the background after startup.
+# Endpoints that need one declare it with `Depends(require_resource("clip"))`
+# and get a fast 503 + Retry-After until it is ready.
+
+LOADING = "loading"
+READY = "ready"
+FAILED = "failed"
+
+RETRY_AFTER_SECONDS = 5
+
+
+class ResourceState:
+    def __init__(self, name: str):
+        self.name = name
+        self.status = LOADING
+        self.error: Optional[str] = None
+        self.started_at = time.time()
+        self.ready_at: Optional[float] = None
+        self.settled = asyncio.Event()  # set once READY or FAILED
+
+    def to_dict(self) -> dict:
+        return {
+            "status": self.status,
+            "error": self.error,
+            "load_seconds": round(self.ready_at - self.started_at, 2) if self.ready_at else None,
+        }
+
+
+def _states(app: FastAPI) -> Dict[str, ResourceState]:
+    if not hasattr(app.state, "resources"):
+        app.state.resources = {}
+    return app.state.resources
+
+
+def start_resource(app: FastAPI, name: str, loader: Callable[[FastAPI], None]) -> asyncio.Task:
+    """Run a blocking loader in a worker thread and track its state"""
+    state = ResourceState(name)
+    _states(app)[name] = state
+
+    async def _run():
+        logger.info(f"Loading {name}...")
+        try:
+            await asyncio.to_thread(loader, app)
+        except Exception as e:
+            state.status = FAILED
+            state.error = str(e)
+            logger.exception(f"Failed to load {name}")
+            state.settled.set()
+            return
+        state.status = READY
+        state.ready_at = time.time()
+        state.settled.set()
+        logger.info(f"{name} ready in {state.ready_at - state.started_at:.1f}s")
+
+    return asyncio.create_task(_run(), name=f"load-{name}")
+
+
+def is_ready(app: FastAPI, name: str) -> bool:
+    state = _states(app).get(name)
+    return state is not None and state.status == READY
+
+
+async def wait_resource(app: FastAPI, name: str) -> bool:
+    """Wait until the named resource has loaded or failed; True if it is ready"""
+    state = _states(app).get(name)
+    if state is None:
+        return False
+    if state.status == LOADING:
+        await state.settled.wait()
+    return state.status == READY
+
+
+def readiness(app: FastAPI) -> Dict[str, dict]:
+    return {name: s.to_dict() for name, s in _states(app).items()}
+
+
+def require_resource(*names: str):
+    """FastAPI dependency: 503 unless every named resource is ready"""
+    def _check(request: Request):
+        for name in names:
+            state = _states(request.app).get(name)
+            if state is None or state.status == LOADING:
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail=f"{name} is still loading",
+                    headers={"Retry-After": str(RETRY_AFTER_SECONDS)},
+                )
+            if state.status == FAILED:
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail=f"{name} failed to load",
+                )
+    return _check
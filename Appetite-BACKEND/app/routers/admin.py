@@ -0,0 +1,15 @@
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+
+from app.auth import require_admin
+from app.resources import require_resource
+from app.services.index_rebuild import index_status, start_rebuild
+
+router = APIRouter(prefix="/api/v1/admin", tags=["admin"], dependencies=[Depends(require_admin)])
+
+@router.post("/recipe-index/rebuild", status_code=status.HTTP_202_ACCEPTED,
+             dependencies=[Depends(require_resource("recipe_index"))])
+async def rebuild_recipe_index(request: Request):
+    """Rebuild the similarity index in the background; the current one serves until the swap"""
+    if start_rebuild(request.app, "admin") is None:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="A rebuild is already running")
+    return index_status(request.app)
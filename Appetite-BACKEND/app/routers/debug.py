@@ -1,7 +1,10 @@
 # app/debug.py
-from fastapi import APIRouter
+from fastapi import APIRouter, Request
 import firebase_admin
 
+from app.services.index_rebuild import index_status
+from app.utils.metrics import collect_metrics
+
 router = APIRouter(prefix="/api/v1/debug", tags=["debug"])
 
 @router.get("/firebase")
@@ -13,4 +16,14 @@ def firebase_info():
         "initialized": True,
         "app_name": app.name,
         "project_id": project_id,
-    }
\ No newline at end of file
+    }
+
+@router.get("/metrics")
+def metrics():
+    """In-process counters (CLIP batch sizes, queue depth, ...)"""
+    return collect_metrics()
+
+@router.get("/recipe-index")
+def recipe_index(request: Request):
+    """Live similarity index (vectors, version) and the last / running rebuild (duration, vectors, version)"""
+    return index_status(request.app)
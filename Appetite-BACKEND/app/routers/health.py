@@ -0,0 +1,25 @@
+from fastapi import APIRouter, Request
+from fastapi.responses import JSONResponse
+
+from app.resources import readiness, READY, RETRY_AFTER_SECONDS
+
+router = APIRouter(tags=["health"])
+
+
+@router.get("/healthz")
+def liveness():
+    return {"status": "ok"}
+
+
+@router.get("/readyz")
+def readyz(request: Request):
+    """200 once every background resource is ready, 503 (with per-resource state) before that"""
+    resources = readiness(request.app)
+    ready = all(r["status"] == READY for r in resources.values())
+    if ready:
+        return {"ready": True, "resources": resources}
+    return JSONResponse(
+        status_code=503,
+        content={"ready": False, "resources": resources},
+        headers={"Retry-After": str(RETRY_AFTER_SECONDS)},
+    )
@@ -2,7 +2,7 @@ import json
 from typing import Optional, Dict, Any, List
 from fastapi import (
     APIRouter, Depends, HTTPException, Query, status,
-    UploadFile, File, Body, Form
+    UploadFile, File, Body, Form, Request
 )
 from pydantic import BaseModel, conint 
 from firebase_admin import firestore
@@ -20,6 +20,9 @@ from app.services.recipes import (
     list_all_recipes as svc_list_all_recipes,
     upload_recipe_image as svc_upload_recipe_image
 )
+from app.services.recipe_cache import invalidate_recipe
+from app.services.recipe_ingredient_index import index_recipe_ingredients, remove_recipe_ingredients
+from app.services.searchSimRecipe import index_recipe_image, remove_recipe_from_index
 
 router = APIRouter(prefix="/api/v1/recipes", tags=["recipes"])
 
@@ -65,6 +68,7 @@ def serialize_firestore(data):
 @router.delete("/id/{id}", status_code=status.HTTP_200_OK)
 def delete_recipe(
     id: str,
+    request: Request,
     user: FirebaseUser = Depends(get_current_user)
 ):
     recipe_ref = firestore.client().collection("recipes").document(id)
@@ -86,6 +90,9 @@ def delete_recipe(
     print("Deleted recipe:", json.dumps(printable, ensure_ascii=False, indent=2))
 
     recipe_ref.delete()
+    invalidate_recipe(id)
+    remove_recipe_from_index(request, id)
+    remove_recipe_ingredients(request.app, id)
     return {"message": "Recipe deleted successfully.", "id": id}
 
 @router.get("/search")
@@ -238,6 +245,7 @@ def rate_recipe(
         if count > 0 else 0.0
     )
     recipe_ref.update({"ratingAvg": round(avg, 1)})
+    invalidate_recipe(recipe_id)
 
     return {"message": "Rating updated", "ratingAvg": round(avg, 1), "ratingCount": count, "ratingBuckets": buckets}
 
@@ -265,6 +273,7 @@ def get_my_rating(
 
 @router.post("/", status_code=status.HTTP_201_CREATED)
 async def create_recipe(
+    request: Request,
     data: str = Form(...),                 # JSON string for RecipeCreate
     file: UploadFile = File(...),          # forces binary image
     user: FirebaseUser = Depends(get_current_user),
@@ -276,6 +285,11 @@ async def create_recipe(
 
     try:
         recipe = await svc_create_recipe(user.uid, file, body)   # <-- await
-        return recipe
     except RuntimeError as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+    # Make the new recipe searchable by ingredients and by image right away
+    index_recipe_ingredients(request.app, recipe)
+    await file.seek(0)
+    await index_recipe_image(request, recipe["id"], await file.read(), recipe)
+    return recipe
@@ -1,54 +1,58 @@
-from fastapi import APIRouter, UploadFile, File, Query, Request, HTTPException
-from PIL import Image
-import io
+from typing import Optional
 
-from app.services.searchIngredients import search_recipes_by_ingredients
-from app.services.searchSimRecipe import get_recipe_details
+from fastapi import APIRouter, Depends, UploadFile, File, Query, Request, HTTPException
+from fastapi.responses import StreamingResponse
+from loguru import logger
+from app.resources import require_resource
+from app.services.ingredient_photo_search import (
+    STREAM_FORMATS, STREAM_MEDIA_TYPES, encode_event, photo_search_events)
+from app.services.recipe_ingredient_index import SCORE_MODES
 
 router = APIRouter(prefix="/api/v1/ingredients", tags=["ingredients"])
 
-@router.post("/by-upload")
+@router.post("/by-upload", dependencies=[Depends(require_resource("recipe_ingredients"))])
 async def search_ingredients_by_upload(
     request: Request,
     file: UploadFile = File(...),
     top_k: int = Query(5, ge=1, le=20),
+    mode: str = Query("overlap", pattern=f"^({'|'.join(SCORE_MODES)})$",
+                      description="overlap: most (rare) ingredients in common; "
+                                  "coverage: recipes the ingredients cover best"),
+    similar: bool = Query(True, description="also rank recipes that look like the photo (CLIP)"),
+    stream: Optional[str] = Query(None, pattern=f"^({'|'.join(STREAM_FORMATS)})$",
+                                  description="ndjson / sse: send each part as soon as it is ready"),
 ):
     """
-    Upload an image -> Gemini extracts ingredient list -> 
-    search recipes in Firestore that contain those ingredients ->
-    return recipe details.
+    Upload an image -> Gemini extracts ingredient list, while CLIP finds
+    recipes that look like it -> recipes from the in-memory ingredient index
+    and the similar ones are fused into one ranking -> return recipe details.
+    With stream=ndjson|sse the events similar / ingredients / results are
+    sent as they complete (errors as a final error event).
     """
-    try:
-        # 1. Read uploaded image
-        image_bytes = await file.read()
-        pil_image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
-
-        # 2. Extract ingredients using Gemini
-        from app.services.gemini_api import extract_ingredients_from_image
-        ingredients = await extract_ingredients_from_image(image_bytes)
-
-        if not ingredients:
-            raise HTTPException(status_code=400, detail="No ingredients detected in image")
-
-        # 3. Find candidate recipes from Firestore
-        raw_matches = search_recipes_by_ingredients(ingredients, top_k=top_k)
-
-        # 4. Enrich with recipe details
-        enriched_results = []
-        for match in raw_matches:
-            details = get_recipe_details(match["id"], request)
-            if details:
-                enriched_results.append({
-                    **details,  # includes id, title/name, thumbnail, etc.
-                    "matched_ingredients": match["matched_ingredients"],
-                    "all_ingredients": match["all_ingredients"]
-                })
-
-        return {
-            "detected_ingredients": ingredients,
-            "results": enriched_results
-        }
+    image_bytes = await file.read()
+    events = photo_search_events(request, image_bytes, top_k, mode, similar)
+
+    if stream:
+        async def body():
+            try:
+                async for event, payload in events:
+                    yield encode_event(event, payload, stream)
+            except ValueError as e:
+                yield encode_event("error", {"status": 400, "detail": str(e)}, stream)
+            except Exception as e:
+                logger.exception("Streamed ingredient search failed")
+                yield encode_event("error", {"status": 500, "detail": f"Ingredient search failed: {e}"}, stream)
+
+        return StreamingResponse(body(), media_type=STREAM_MEDIA_TYPES[stream],
+                                 headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
+    try:
+        response = {}
+        async for event, payload in events:
+            if event != "similar":
+                response.update(payload)
+        return response
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Ingredient search failed: {str(e)}")
-
@@ -1,12 +1,31 @@
-import requests
-import faiss
-import numpy as np
-from io import BytesIO
-from PIL import Image
-from fastapi import APIRouter, UploadFile, File, HTTPException, Query, Request
-from app.services.searchSimRecipe import encode_image, get_recipe_details
-
-router = APIRouter(prefix="/api/v1/similarity", tags=["similarity"])
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from app.resources import require_resource
+from app.services.recipe_attributes import MINUTES_BUCKET_PATTERN
+from app.services.searchSimRecipe import (
+    get_recipes_details, make_filters, query_cache, search_similar,
+    upload_cache_key, url_cache_key)
+from app.utils.executors import run_cpu
+from app.utils.http_fetch import (
+    ImageFetchError, cancel_on_disconnect, fetch_image_bytes, open_image, read_capped)
+from app.utils.images import decode_image
+
+router = APIRouter(
+    prefix="/api/v1/similarity",
+    tags=["similarity"],
+    dependencies=[Depends(require_resource("clip", "recipe_index"))],
+)
+
+def similarity_filters(
+    categories: Optional[List[str]] = Query(None, description="Category tags to match (repeat param for multiple)"),
+    areas: Optional[List[str]] = Query(None, description="Area/cuisine tags to match (repeat param for multiple)"),
+    minutes_bucket: Optional[str] = Query(None, pattern=MINUTES_BUCKET_PATTERN,
+                                          description="quick(<=15), short(<=30), medium(<=45), long(>60)"),
+) -> Optional[dict]:
+    """Same filters as /recipes/search, applied inside the vector search"""
+    return make_filters(categories, areas, minutes_bucket)
 
 # ------------------------
 # API Endpoints
@@ -16,62 +35,59 @@ router = APIRouter(prefix="/api/v1/similarity", tags=["similarity"])
 async def search_by_upload(
     request: Request,   # 👈 just add this
     file: UploadFile = File(...),
-    top_k: int = Query(8, ge=1, le=20)
+    top_k: int = Query(8, ge=1, le=20),
+    filters: Optional[dict] = Depends(similarity_filters),
 ):
-    faiss_index = getattr(request.app.state, "faiss_index", None)
-    id_mapping = getattr(request.app.state, "id_mapping", None)
-
-    if faiss_index is None:
-        raise HTTPException(status_code=404, detail="FAISS index not built")
-
-    try:
-        pil_img = Image.open(BytesIO(await file.read())).convert("RGB")
-    except Exception:
-        raise HTTPException(status_code=400, detail="Invalid image file")
-
-    query_vec = encode_image(pil_img, request).reshape(1, -1).astype("float32")
-    faiss.normalize_L2(query_vec)
+    image_bytes = await file.read()
 
-    sims, idxs = faiss_index.search(query_vec, top_k)
+    async def load_image():
+        try:
+            return await run_cpu(decode_image, image_bytes)
+        except Exception:
+            raise HTTPException(status_code=400, detail="Invalid image file")
 
-    results = []
-    for score, idx in zip(sims[0], idxs[0]):
-        recipe_id = id_mapping[idx]
-        details = get_recipe_details(recipe_id, request)  # 👈 pass request
-        if details:
-            results.append({**details, "similarity": float(score)})
+    hits = await search_similar(request, top_k, upload_cache_key(image_bytes), load_image, filters)
 
-    return {"results": results}
+    scores = dict(hits)
+    details = await run_in_threadpool(get_recipes_details, [rid for rid, _ in hits], request)
+    return {"results": [{**d, "similarity": scores[d["id"]]} for d in details]}
 
 @router.get("/by-url")
 async def search_by_url(
     request: Request,   # 👈 just add this
     url: str = Query(..., description="Publicly accessible image URL"),
-    top_k: int = Query(8, ge=1, le=20)
+    top_k: int = Query(8, ge=1, le=20),
+    filters: Optional[dict] = Depends(similarity_filters),
 ):
-    faiss_index = getattr(request.app.state, "faiss_index", None)
-    id_mapping = getattr(request.app.state, "id_mapping", None)
+    http = request.app.state.http
 
-
-    if faiss_index is None:
-        raise HTTPException(status_code=404, detail="FAISS index not built")
+    async def fetch():
+        # Headers first: with an ETag the image may already be cached and the body is skipped
+        async with open_image(http, url) as response:
+            etag = response.headers.get("ETag")
+            if etag and url_cache_key(url, etag) in query_cache:
+                return url_cache_key(url, etag), None
+            image_bytes = await read_capped(response)
+            return (url_cache_key(url, etag) if etag else upload_cache_key(image_bytes)), image_bytes
 
     try:
-        response = requests.get(url, timeout=10)
-        pil_img = Image.open(BytesIO(response.content)).convert("RGB")
-    except Exception:
-        raise HTTPException(status_code=400, detail="Invalid image URL")
-
-    query_vec = encode_image(pil_img, request).reshape(1, -1).astype("float32")
-    faiss.normalize_L2(query_vec)
-
-    sims, idxs = faiss_index.search(query_vec, top_k)
-
-    results = []
-    for score, idx in zip(sims[0], idxs[0]):
-        recipe_id = id_mapping[idx]
-        details = get_recipe_details(recipe_id, request)  # 👈 pass request
-        if details:
-            results.append({**details, "similarity": float(score)})
-
-    return {"results": results}
+        cache_key, image_bytes = await cancel_on_disconnect(request, fetch())
+    except ImageFetchError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+
+    async def load_image():
+        try:
+            data = image_bytes
+            if data is None:  # cache entry expired since the header check
+                data = await cancel_on_disconnect(request, fetch_image_bytes(http, url))
+            return await run_cpu(decode_image, data)
+        except ImageFetchError as e:
+            raise HTTPException(status_code=e.status_code, detail=str(e))
+        except Exception:
+            raise HTTPException(status_code=400, detail="Invalid image URL")
+
+    hits = await search_similar(request, top_k, cache_key, load_image, filters)
+
+    scores = dict(hits)
+    details = await run_in_threadpool(get_recipes_details, [rid for rid, _ in hits], request)
+    return {"results": [{**d, "similarity": scores[d["id"]]} for d in details]}
@@ -6,6 +6,7 @@ import cloudinary
 import cloudinary.uploader
 from app.services.users import svc_get_all_users, Profile, ProfileCreate,ProfileUpdate, UserSearchResult
 from app.services.users import svc_search_user
+from app.services.recipe_cache import invalidate_recipe
 
 router = APIRouter(prefix="/api/v1/user", tags=["User"])
 
@@ -92,6 +93,7 @@ def update_my_profile(
         recipes_ref = db.collection("recipes").where("contributorId", "==", user.uid)
         for recipe_doc in recipes_ref.stream():
             recipe_doc.reference.update({"contributorName": new_name})
+            invalidate_recipe(recipe_doc.id)
 
     return get_user_info(uid=user.uid)
 
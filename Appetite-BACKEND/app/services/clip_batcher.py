@@ -0,0 +1,114 @@
+import asyncio
+import os
+import time
+from collections import Counter
+
+import numpy as np
+from fastapi import FastAPI
+from loguru import logger
+
+from app.utils.executors import run_cpu
+from app.utils.lazy import lazy_import
+from app.utils.metrics import register_metrics
+
+torch = lazy_import("torch")
+
+CLIP_MAX_BATCH = int(os.getenv("CLIP_MAX_BATCH", "16"))
+CLIP_MAX_WAIT_MS = float(os.getenv("CLIP_MAX_WAIT_MS", "5"))
+
+
+class ClipBatcher:
+    """
+    Micro-batching scheduler for CLIP image encoding.
+    Concurrent requests enqueue their preprocessed tensor; the worker waits up
+    to CLIP_MAX_WAIT_MS after the first arrival (or until CLIP_MAX_BATCH items)
+    and runs a single model.encode_image over the stacked batch. Each caller
+    gets its own row back through a future.
+    """
+
+    def __init__(self, app: FastAPI, max_batch: int = CLIP_MAX_BATCH, max_wait_ms: float = CLIP_MAX_WAIT_MS):
+        self.app = app
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait_ms / 1000
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._task = None
+
+        self._batches = 0
+        self._items = 0
+        self._batch_sizes = Counter()
+        self._last_forward_ms = 0.0
+        register_metrics("clip_batcher", self.stats)
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run(), name="clip-batcher")
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def encode(self, image_tensor) -> np.ndarray:
+        """Queue one preprocessed image tensor (C,H,W) and wait for its embedding"""
+        fut = asyncio.get_running_loop().create_future()
+        await self._queue.put((image_tensor, fut))
+        return await fut
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self._queue.qsize(),
+            "batches": self._batches,
+            "items": self._items,
+            "avg_batch_size": round(self._items / self._batches, 2) if self._batches else 0.0,
+            "batch_sizes": dict(sorted(self._batch_sizes.items())),
+            "last_forward_ms": round(self._last_forward_ms, 2),
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait * 1000,
+        }
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    def _forward(self, tensors):
+        device = self.app.state.device
+        with torch.no_grad():
+            features = self.app.state.model.encode_image(torch.stack(tensors).to(device))
+        return features.float().cpu().numpy()
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            live = [(t, fut) for t, fut in batch if not fut.cancelled()]  # caller went away
+            if not live:
+                continue
+
+            started = time.perf_counter()
+            try:
+                features = await run_cpu(self._forward, [t for t, _ in live])
+            except Exception as e:
+                logger.error(f"CLIP batch of {len(live)} failed: {e}")
+                for _, fut in live:
+                    if not fut.done():
+                        fut.set_exception(e)
+                continue
+
+            self._last_forward_ms = (time.perf_counter() - started) * 1000
+            self._batches += 1
+            self._items += len(live)
+            self._batch_sizes[len(live)] += 1
+            for (_, fut), vec in zip(live, features):
+                if not fut.done():
+                    fut.set_result(vec)
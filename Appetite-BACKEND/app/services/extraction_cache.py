@@ -0,0 +1,164 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Optional
+
+from loguru import logger
+
+from app.utils.cache import TTLCache
+
+# ------------------------
+# Gemini ingredient extraction cache
+# ------------------------
+# Extraction is a paid Gemini call that takes seconds, and people re-scan the
+# same fridge photo. Parsed ingredient lists are kept by image key (sha256 of
+# the uploaded bytes + a tag of the model / prompt, see gemini_api) in an
+# in-memory LRU, optionally backed by one JSON file per entry under
+# GEMINI_CACHE_DIR so results survive restarts and are shared by the workers
+# on a host. With GEMINI_CACHE_NEAR_DISTANCE > 0, a photo whose dHash is within
+# that many bits of one cached in memory (the same shot re-encoded or resized
+# by the client) reuses its result too. That is off by default: two shots of
+# the same fridge with different contents can hash that close.
+
+GEMINI_CACHE_SIZE = int(os.getenv("GEMINI_CACHE_SIZE", "2048"))
+GEMINI_CACHE_TTL = float(os.getenv("GEMINI_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+GEMINI_CACHE_DIR = os.getenv("GEMINI_CACHE_DIR", "")                               # "" = memory only
+GEMINI_CACHE_NEAR_DISTANCE = int(os.getenv("GEMINI_CACHE_NEAR_DISTANCE", "0"))   # dHash bits, 0 = exact only
+
+PRUNE_EVERY = 500  # disk stores between sweeps for expired files
+
+
+class ExtractionCache:
+    """
+    Ingredient lists by image key: a TTLCache in memory, optionally backed by
+    JSON files in disk_dir ({"ingredients", "dhash", "expires_at"} with wall
+    clock expiry), plus the dHash fingerprints of the entries in memory for
+    near-duplicate lookups.
+    """
+
+    def __init__(self, maxsize: int, ttl_seconds: float, disk_dir: Optional[str] = None, near_distance: int = 0):
+        self.memory = TTLCache(maxsize, ttl_seconds)
+        self.ttl = ttl_seconds
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self.near_distance = near_distance
+        self._fingerprints: "OrderedDict[str, int]" = OrderedDict()  # key -> dHash, LRU like memory
+        self._lock = threading.Lock()
+        self.counts = {"memory_hits": 0, "disk_hits": 0, "near_hits": 0, "stores": 0}
+        if self.disk_dir:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+
+    def get(self, key: str) -> Optional[List[str]]:
+        """Exact lookup: memory, then disk (a disk hit is promoted to memory)"""
+        ingredients = self.memory.get(key)
+        if ingredients is not None:
+            self.counts["memory_hits"] += 1
+            return list(ingredients)
+        entry = self._read(key)
+        if entry is None:
+            return None
+        self.counts["disk_hits"] += 1
+        self._remember(key, entry["ingredients"], entry.get("dhash"), entry["expires_at"] - time.time())
+        return list(entry["ingredients"])
+
+    def get_near(self, fingerprint: int) -> Optional[List[str]]:
+        """Result of the closest cached image within near_distance dHash bits, if any"""
+        if self.near_distance <= 0:
+            return None
+        with self._lock:
+            candidates = list(self._fingerprints.items())
+        close = sorted((d, key) for key, other in candidates
+                       if (d := (fingerprint ^ other).bit_count()) <= self.near_distance)
+        for _, key in close:
+            ingredients = self.memory.get(key)
+            if ingredients is not None:
+                self.counts["near_hits"] += 1
+                return list(ingredients)
+            with self._lock:  # evicted / expired from memory since
+                self._fingerprints.pop(key, None)
+        return None
+
+    def put(self, key: str, ingredients: List[str], fingerprint: Optional[int] = None) -> None:
+        ingredients = list(ingredients)
+        self._remember(key, ingredients, fingerprint, self.ttl)
+        self.counts["stores"] += 1
+        if self.disk_dir:
+            self._write(key, {"ingredients": ingredients, "dhash": fingerprint, "expires_at": time.time() + self.ttl})
+            if self.counts["stores"] % PRUNE_EVERY == 0:
+                self.prune()
+
+    def clear(self) -> None:
+        """Drop the memory tier (disk entries stay)"""
+        self.memory.clear()
+        with self._lock:
+            self._fingerprints.clear()
+
+    def prune(self) -> int:
+        """Delete expired disk entries; returns how many"""
+        if not self.disk_dir:
+            return 0
+        now, removed = time.time(), 0
+        for path in self.disk_dir.glob("*.json"):
+            try:
+                if json.loads(path.read_text()).get("expires_at", 0) <= now:
+                    path.unlink(missing_ok=True)
+                    removed += 1
+            except (OSError, ValueError):
+                continue
+        return removed
+
+    def stats(self) -> dict:
+        return {
+            **self.memory.stats(),
+            **self.counts,
+            "disk_dir": str(self.disk_dir) if self.disk_dir else None,
+            "near_distance": self.near_distance,
+        }
+
+    # ------------------------
+    # internals
+    # ------------------------
+
+    def _remember(self, key: str, ingredients: List[str], fingerprint: Optional[int], ttl: float) -> None:
+        if ttl <= 0:
+            return
+        self.memory.set(key, ingredients, ttl_seconds=ttl)
+        if fingerprint is None or self.near_distance <= 0:
+            return
+        with self._lock:
+            self._fingerprints[key] = fingerprint
+            self._fingerprints.move_to_end(key)
+            while len(self._fingerprints) > self.memory.maxsize:
+                self._fingerprints.popitem(last=False)
+
+    def _path(self, key: str) -> Path:
+        return self.disk_dir / f"{key}.json"
+
+    def _read(self, key: str) -> Optional[dict]:
+        if not self.disk_dir:
+            return None
+        path = self._path(key)
+        try:
+            entry = json.loads(path.read_text())
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Unreadable extraction cache entry {path.name}: {e}")
+            return None
+        if entry.get("expires_at", 0) <= time.time():
+            path.unlink(missing_ok=True)
+            return None
+        return entry
+
+    def _write(self, key: str, entry: dict) -> None:
+        # temp file + rename, so concurrent readers (other workers) never see a partial entry
+        path = self._path(key)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            tmp.write_text(json.dumps(entry))
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning(f"Could not write extraction cache entry {path.name}: {e}")
+            tmp.unlink(missing_ok=True)
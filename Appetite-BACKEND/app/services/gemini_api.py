@@ -1,24 +1,51 @@
+import asyncio
+import hashlib
 import os
-import google.generativeai as genai
+from functools import lru_cache
 from loguru import logger
 from PIL import Image
-from io import BytesIO
 import json
+from typing import Awaitable, Callable, List, Optional, Union
 from app.db.firestore import db
 import re
 
+from app.services.extraction_cache import (GEMINI_CACHE_DIR, GEMINI_CACHE_NEAR_DISTANCE, GEMINI_CACHE_SIZE,
+                                           GEMINI_CACHE_TTL, ExtractionCache)
+from app.services.recipe_cache import get_recipe_doc
 from app.services.recipes import get_step
+from app.utils.executors import run_cpu
+from app.utils.images import GEMINI_MIN_SIDE, decode_image, dhash
+from app.utils.lazy import lazy_import
+from app.utils.media import prepare_audio, prepare_image, record_request
+from app.utils.metrics import register_metrics
 
+# The Gemini SDK is imported and configured on the first call
+genai = lazy_import("google.generativeai")
 
-# Configure Gemini
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+@lru_cache(maxsize=1)
+def _configure_gemini():
+    genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+
+def gemini_model(name: str = "gemini-2.5-flash"):
+    _configure_gemini()
+    return genai.GenerativeModel(name)
+
+async def _generate(call: str, contents, model_name: str = "gemini-2.5-flash"):
+    """
+    generate_content off the event loop (it is a blocking HTTP call), with the
+    request's payload size logged and counted under call (llm_requests metrics).
+    Media in contents should already be prepared (app.utils.media).
+    """
+    record_request(call, contents)
+    model = gemini_model(model_name)
+    return await asyncio.to_thread(model.generate_content, contents)
 
 VALID_INTENTS = ["next", "previous", "repeat", "question", "noise"]
 
 async def gemini_classify_from_audio(
     audio_bytes: bytes) -> dict:
     """
-    Send audio directly to Gemini.
+    Send audio to Gemini (WAV shrunk to 16 kHz mono / Opus first, see app.utils.media).
     Returns dict: {"transcript": "...", "intent": "..."}
     """
 
@@ -37,10 +64,8 @@ async def gemini_classify_from_audio(
     """
 
     try:
-        model = genai.GenerativeModel("gemini-2.5-flash")
-        response = model.generate_content(
-            [prompt, {"mime_type": "audio/mp4", "data": audio_bytes}]
-        )
+        audio = await asyncio.to_thread(prepare_audio, audio_bytes)
+        response = await _generate("classify_audio", [prompt, audio])
         raw = response.text.strip()
         logger.info(f"Gemini audio classification raw response: {raw}")
 
@@ -83,8 +108,7 @@ async def gemini_classify_intent(text: str) -> str:
     """
 
     try:
-        model = genai.GenerativeModel("gemini-2.5-flash")  # free-tier model
-        response = model.generate_content(prompt)
+        response = await _generate("classify_intent", prompt)  # free-tier model
         label = response.text.strip().lower()
 
         if label in VALID_INTENTS:
@@ -103,11 +127,10 @@ async def gemini_answer(recipe_id: str, question: str, step_index: int) -> str:
     """
     try:
         # Load recipe doc
-        doc = db.collection("recipes").document(recipe_id).get()
-        if not doc.exists:
+        recipe = get_recipe_doc(db, recipe_id)
+        if recipe is None:
             return "I couldn’t find this recipe."
 
-        recipe = doc.to_dict()
         name = recipe.get("name", "Unnamed recipe")
         category = recipe.get("category", "")
         area = recipe.get("area", "")
@@ -153,8 +176,7 @@ async def gemini_answer(recipe_id: str, question: str, step_index: int) -> str:
 
 
 
-        model = genai.GenerativeModel("gemini-2.5-flash")
-        response = model.generate_content(prompt)
+        response = await _generate("answer", prompt)
         if response.candidates and response.candidates[0].content.parts:
             answer = response.candidates[0].content.parts[0].text
             return answer.strip()
@@ -168,23 +190,27 @@ async def gemini_answer(recipe_id: str, question: str, step_index: int) -> str:
 
 
 # Choose a lightweight model for structured extraction
+INGREDIENTS_MODEL = "gemini-2.5-flash"
+INGREDIENTS_PROMPT = (
+    "Extract a clean JSON array of ingredients visible in this image. "
+    "Return ONLY a JSON array of lowercase strings, like: [\"tomato\", \"egg\"]"
+)
 
-async def extract_ingredients_from_image(image_bytes: bytes):
+async def extract_ingredients_from_image(image: Union[Image.Image, bytes], source: Optional[bytes] = None):
     """
     Send image to Gemini and extract ingredient names.
+    Takes the already decoded image (app.utils.images.decode_image) and / or the
+    uploaded bytes (source): a small JPEG / WebP upload is sent as is, anything
+    else is downscaled and re-encoded once (app.utils.media.prepare_image).
     Returns a list like ["tomato", "egg", "olive oil"]
     """
-    # Convert bytes → PIL → send as inline image
-    pil_img = Image.open(BytesIO(image_bytes)).convert("RGB")
-
-    prompt = (
-        "Extract a clean JSON array of ingredients visible in this image. "
-        "Return ONLY a JSON array of lowercase strings, like: [\"tomato\", \"egg\"]"
-    )
+    if not isinstance(image, Image.Image):
+        image, source = None, image
+    blob = await run_cpu(prepare_image, image, source)
 
     try:
-        model = genai.GenerativeModel("gemini-2.5-flash")  # free-tier model
-        response = model.generate_content([prompt, pil_img])
+        # runs off the event loop, so work started alongside it (CLIP) keeps running
+        response = await _generate("extract_ingredients", [INGREDIENTS_PROMPT, blob], INGREDIENTS_MODEL)
         raw_text = response.text.strip()
 
         # Sometimes Gemini adds ```json ... ```
@@ -197,3 +223,54 @@ async def extract_ingredients_from_image(image_bytes: bytes):
         print("⚠️ Failed to parse Gemini response:", e)
         return []
 
+
+# ------------------------
+# Cached extraction (see app.services.extraction_cache)
+# ------------------------
+# Keys carry a tag of the model and prompt, so changing either stops serving
+# answers the old one gave.
+
+extraction_cache = ExtractionCache(GEMINI_CACHE_SIZE, GEMINI_CACHE_TTL, GEMINI_CACHE_DIR, GEMINI_CACHE_NEAR_DISTANCE)
+register_metrics("gemini_extraction_cache", extraction_cache.stats)
+
+_EXTRACTION_TAG = hashlib.sha256(f"{INGREDIENTS_MODEL}\n{INGREDIENTS_PROMPT}".encode()).hexdigest()[:12]
+
+def extraction_cache_key(image_bytes: bytes) -> str:
+    return f"{hashlib.sha256(image_bytes).hexdigest()}-{_EXTRACTION_TAG}"
+
+async def decode_for_gemini(image_bytes: bytes) -> Image.Image:
+    """Decode an upload at about the size Gemini looks at; ValueError if it isn't an image"""
+    try:
+        return await run_cpu(decode_image, image_bytes, GEMINI_MIN_SIDE)
+    except Exception as e:
+        raise ValueError("Invalid image file") from e
+
+async def extract_ingredients_cached(
+    image_bytes: bytes,
+    load_image: Optional[Callable[[], Awaitable[Image.Image]]] = None,
+) -> List[str]:
+    """
+    extract_ingredients_from_image behind the extraction cache. An exact
+    repeat is answered before the image is even decoded; otherwise the image
+    is loaded once (load_image, default decode_for_gemini), matched against
+    near duplicates when that is enabled, and only then sent to Gemini.
+    Empty results (nothing found, or the call failed) are not cached.
+    """
+    key = extraction_cache_key(image_bytes)
+    cached = await asyncio.to_thread(extraction_cache.get, key)  # may read the disk tier
+    if cached is not None:
+        return cached
+
+    pil_img = await (load_image() if load_image else decode_for_gemini(image_bytes))
+    fingerprint = None
+    if extraction_cache.near_distance > 0:
+        fingerprint = await run_cpu(dhash, pil_img)
+        near = extraction_cache.get_near(fingerprint)
+        if near is not None:
+            await asyncio.to_thread(extraction_cache.put, key, near, fingerprint)  # the next exact repeat skips the decode
+            return near
+
+    ingredients = await extract_ingredients_from_image(pil_img, image_bytes)
+    if ingredients:
+        await asyncio.to_thread(extraction_cache.put, key, ingredients, fingerprint)
+    return ingredients
@@ -0,0 +1,152 @@
+import asyncio
+import os
+import time
+from typing import Optional, Tuple
+
+from fastapi import FastAPI
+from loguru import logger
+
+from app.resources import is_ready
+from app.services.index_snapshot import new_watermark
+from app.services.recipe_index import RecipeIndex
+from app.services.searchSimRecipe import (
+    apply_index_changes, build_faiss_index, get_recipe_embeddings_since, load_recipe_attributes)
+
+# ------------------------
+# Background rebuild of the recipe similarity index
+# ------------------------
+# A full rebuild (fresh Firestore scan, retrained IVF centroids, HNSW
+# tombstones dropped) runs in a worker thread next to the live index, which
+# keeps serving. When it is done the new RecipeIndex replaces
+# app.state.recipe_index in one reference assignment: a search holds either
+# the old or the new object, each with its own faiss index, label mapping and
+# version, never a mix. Live adds / removes made during the build are
+# journaled on the old index and replayed onto the new one (hand_over), and
+# embeddings other workers wrote meanwhile come in as a watermark delta.
+#
+# Triggered by POST /api/v1/admin/recipe-index/rebuild or every
+# INDEX_REBUILD_INTERVAL_HOURS (0 = never). Both indexes are in memory
+# while the new one is built.
+
+INDEX_REBUILD_INTERVAL_HOURS = float(os.getenv("INDEX_REBUILD_INTERVAL_HOURS", "0"))
+
+
+class RebuildStatus:
+    def __init__(self):
+        self.running = False
+        self.trigger: Optional[str] = None
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.duration_seconds: Optional[float] = None
+        self.vectors: Optional[int] = None
+        self.version: Optional[int] = None
+        self.replayed_writes: Optional[int] = None
+        self.error: Optional[str] = None
+        self.rebuilds = 0
+
+    def to_dict(self) -> dict:
+        return {
+            "running": self.running,
+            "trigger": self.trigger,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "duration_seconds": self.duration_seconds,
+            "vectors": self.vectors,
+            "version": self.version,
+            "replayed_writes": self.replayed_writes,
+            "error": self.error,
+            "rebuilds": self.rebuilds,
+        }
+
+
+def _status(app: FastAPI) -> RebuildStatus:
+    if not hasattr(app.state, "index_rebuild"):
+        app.state.index_rebuild = RebuildStatus()
+    return app.state.index_rebuild
+
+
+def rebuild_recipe_index(app: FastAPI) -> Tuple[RecipeIndex, int]:
+    """
+    Build a fresh index off to the side and swap it in (blocking; run it in a thread).
+    Returns (new index, live writes replayed onto it).
+    """
+    current: RecipeIndex = app.state.recipe_index
+    current.start_journal()
+    try:
+        watermark = new_watermark()
+        fresh = build_faiss_index(app)
+        # Embeddings written while the full scan ran (by any worker)
+        next_watermark = new_watermark()
+        apply_index_changes(fresh, get_recipe_embeddings_since(app, watermark))
+        fresh.watermark = next_watermark
+        fresh.built_at = watermark
+        load_recipe_attributes(app, fresh)
+    except Exception:
+        current.stop_journal()
+        raise
+
+    replayed = current.hand_over(fresh)
+    app.state.recipe_index = fresh  # the swap: one reference, readers see old or new
+    logger.info(f"Swapped in rebuilt recipe index: {fresh.ntotal} vectors, version {fresh.version}, "
+                f"{replayed} live writes replayed")
+    try:
+        fresh.persist()  # later boots start from the rebuilt snapshot
+    except Exception as e:
+        logger.warning(f"Rebuilt index is live but the snapshot was not saved: {e}")
+    return fresh, replayed
+
+
+def start_rebuild(app: FastAPI, trigger: str) -> Optional[asyncio.Task]:
+    """Start a background rebuild; None if one is already running"""
+    state = _status(app)
+    if state.running:
+        return None
+    state.running = True
+    state.trigger = trigger
+    state.started_at = time.time()
+    state.error = None
+
+    async def _run():
+        t0 = time.perf_counter()
+        try:
+            fresh, replayed = await asyncio.to_thread(rebuild_recipe_index, app)
+        except Exception as e:
+            state.error = str(e)
+            logger.exception("Recipe index rebuild failed; the current index keeps serving")
+        else:
+            state.vectors = fresh.ntotal
+            state.version = fresh.version
+            state.replayed_writes = replayed
+            state.rebuilds += 1
+        finally:
+            state.duration_seconds = round(time.perf_counter() - t0, 2)
+            state.finished_at = time.time()
+            state.running = False
+
+    return asyncio.create_task(_run(), name="rebuild-recipe-index")
+
+
+def start_rebuild_schedule(app: FastAPI) -> Optional[asyncio.Task]:
+    """Rebuild every INDEX_REBUILD_INTERVAL_HOURS; None when scheduling is off"""
+    if INDEX_REBUILD_INTERVAL_HOURS <= 0:
+        return None
+
+    async def _loop():
+        while True:
+            await asyncio.sleep(INDEX_REBUILD_INTERVAL_HOURS * 3600)
+            if not is_ready(app, "recipe_index"):
+                continue
+            task = start_rebuild(app, "schedule")
+            if task is not None:
+                await task
+
+    return asyncio.create_task(_loop(), name="rebuild-recipe-index-schedule")
+
+
+def index_status(app: FastAPI) -> dict:
+    """Current index (vectors, version, type) plus the last / running rebuild"""
+    current = None
+    if is_ready(app, "recipe_index"):
+        index: RecipeIndex = app.state.recipe_index
+        current = {"vectors": index.ntotal, "version": index.version, "index_type": index.index_type}
+    return {"current": current, "rebuild": _status(app).to_dict()}
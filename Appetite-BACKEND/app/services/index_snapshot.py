@@ -0,0 +1,161 @@
+import os
+import json
+import hashlib
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+from loguru import logger
+
+from app.utils.lazy import lazy_import
+
+faiss = lazy_import("faiss")
+
+try:
+    import fcntl
+except ImportError:  # Windows dev server: a single process, nothing to serialize
+    fcntl = None
+
+# ------------------------
+# Local snapshot of the recipe similarity index
+# ------------------------
+# Layout (one pair of files per format version):
+#   <FAISS_SNAPSHOT_DIR>/recipes_v<N>.index      -> faiss.write_index output
+#   <FAISS_SNAPSHOT_DIR>/recipes_v<N>.meta.json  -> label -> recipe id mapping, tombstones, watermark
+#   <FAISS_SNAPSHOT_DIR>/recipes_v<N>.lock       -> flock: exclusive while saving the pair, shared while loading
+# Several server workers may persist at once; the lock keeps one worker's
+# index from being paired with another's meta. The meta records the sha256
+# of the index it was written with, so a pair torn by a crash between the
+# two renames is detected on load and rebuilt.
+
+SNAPSHOT_FORMAT_VERSION = 4  # 2: IndexIDMap2 + label -> recipe id mapping, 3: + tombstones, 4: + index sha256
+SNAPSHOT_DIR = Path(os.getenv("FAISS_SNAPSHOT_DIR", "faiss_snapshot"))
+SNAPSHOT_MAX_AGE_HOURS = float(os.getenv("FAISS_SNAPSHOT_MAX_AGE_HOURS", "168"))
+WATERMARK_SKEW = timedelta(minutes=5)  # tolerate clock drift vs Firestore server time
+
+
+def _snapshot_paths() -> Tuple[Path, Path]:
+    stem = SNAPSHOT_DIR / f"recipes_v{SNAPSHOT_FORMAT_VERSION}"
+    return stem.with_suffix(".index"), stem.with_suffix(".meta.json")
+
+
+@contextmanager
+def _snapshot_lock(exclusive: bool):
+    """flock on the snapshot's lock file (a no-op without fcntl)"""
+    lock_path = SNAPSHOT_DIR / f"recipes_v{SNAPSHOT_FORMAT_VERSION}.lock"
+    with open(lock_path, "a") as f:
+        if fcntl:
+            fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def new_watermark() -> datetime:
+    """Watermark for a build that starts now (embeddings written after it are fetched as delta)."""
+    return datetime.now(timezone.utc) - WATERMARK_SKEW
+
+
+def save_snapshot(index, id_mapping: Dict[int, str], watermark: datetime,
+                  index_type: str, removed: Iterable[int] = (), built_at: Optional[datetime] = None) -> None:
+    """
+    Atomically write the index and its metadata to the snapshot directory.
+    built_at is when the full build this index descends from started (None: now);
+    delta saves pass it through so the max age counts from the last full build.
+    """
+    index_path, meta_path = _snapshot_paths()
+    SNAPSHOT_DIR.mkdir(parents=True, exist_ok=True)
+
+    # Written to temp files outside the lock; only the two renames are serialized
+    tmp_suffix = f"{os.getpid()}.{threading.get_ident()}.tmp"
+    tmp_index = index_path.with_suffix(f".index.{tmp_suffix}")
+    faiss.write_index(index, str(tmp_index))
+
+    meta = {
+        "format_version": SNAPSHOT_FORMAT_VERSION,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "built_at": (built_at or datetime.now(timezone.utc)).isoformat(),
+        "watermark": watermark.isoformat(),
+        "index_type": index_type,  # configured FAISS_INDEX_TYPE the index was built for
+        "dim": index.d,
+        "count": index.ntotal,
+        "id_mapping": {str(label): rid for label, rid in id_mapping.items()},
+        "removed": sorted(removed),  # labels still stored but deleted (hnsw)
+        "index_sha256": _file_sha256(tmp_index),
+    }
+    tmp_meta = meta_path.with_suffix(f".json.{tmp_suffix}")
+    with open(tmp_meta, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+
+    with _snapshot_lock(exclusive=True):
+        os.replace(tmp_index, index_path)
+        os.replace(tmp_meta, meta_path)
+
+    logger.info(f"Saved FAISS snapshot: {index.ntotal} vectors -> {index_path}")
+
+
+def load_snapshot(index_type: str) -> Optional[Tuple[object, Dict[int, str], list, datetime, datetime]]:
+    """
+    Load the snapshot memory-mapped.
+    Returns (index, id_mapping, removed labels, watermark, built_at) or None if
+    missing, stale (full build older than the max age), or built with a
+    different index_type.
+    The returned index is read-only; copy it before mutating.
+    """
+    index_path, meta_path = _snapshot_paths()
+    if not (index_path.is_file() and meta_path.is_file()):
+        return None
+
+    try:
+        with _snapshot_lock(exclusive=False):
+            return _load_pair(index_path, meta_path, index_type)
+    except Exception as e:
+        logger.warning(f"Failed to load FAISS snapshot: {e}")
+        return None
+
+
+def _load_pair(index_path: Path, meta_path: Path, index_type: str):
+    with open(meta_path, "r", encoding="utf-8") as f:
+        meta = json.load(f)
+
+    if meta.get("format_version") != SNAPSHOT_FORMAT_VERSION:
+        logger.info("FAISS snapshot has an old format version, ignoring it")
+        return None
+
+    if meta.get("index_type") != index_type:
+        logger.info(f"FAISS snapshot is {meta.get('index_type')}, configured {index_type}; ignoring it")
+        return None
+
+    built_at = datetime.fromisoformat(meta.get("built_at") or meta["created_at"])
+    if datetime.now(timezone.utc) - built_at > timedelta(hours=SNAPSHOT_MAX_AGE_HOURS):
+        # Deletions are applied on refresh (the delta by updatedAt carries deleted=True:
+        # the vector is removed, or tombstoned for hnsw); only a rebuild compacts the tombstones
+        logger.info("FAISS snapshot's last full build is older than max age, ignoring it")
+        return None
+
+    if _file_sha256(index_path) != meta.get("index_sha256"):
+        logger.warning("FAISS snapshot index does not match its meta file, ignoring it")
+        return None
+
+    # Zero-copy mmap for flat storage (faiss >= 1.11); plain read otherwise
+    mmap_flag = getattr(faiss, "IO_FLAG_MMAP_IFC", 0)
+    index = faiss.read_index(str(index_path), mmap_flag)
+    id_mapping = {int(label): rid for label, rid in meta["id_mapping"].items()}
+    removed = meta.get("removed", [])
+    if index.ntotal != len(id_mapping) + len(removed) or index.ntotal != meta.get("count"):
+        logger.warning("FAISS snapshot index and id_mapping disagree, ignoring it")
+        return None
+
+    return index, id_mapping, removed, datetime.fromisoformat(meta["watermark"]), built_at
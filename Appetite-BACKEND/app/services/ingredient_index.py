@@ -0,0 +1,125 @@
+import itertools
+import os
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+from fastapi import FastAPI
+from loguru import logger
+
+from app.resources import is_ready
+from app.utils.cache import TTLCache
+from app.utils.embedding_codec import EMBEDDING_FIELDS, decode_embedding
+from app.utils.lazy import lazy_import
+from app.utils.metrics import register_metrics
+
+clip = lazy_import("clip")
+faiss = lazy_import("faiss")
+torch = lazy_import("torch")
+
+# ------------------------
+# Fuzzy ingredient mapping
+# ------------------------
+# ingredient_embeddings holds a CLIP text embedding per canonical ingredient
+# name (doc id = name). Detected ingredients ("cherry tomatoes") are mapped to
+# their nearest canonical terms ("tomato") above a similarity threshold
+# before recipe scoring. Mappings are cached per query term.
+
+INGREDIENT_MATCH_THRESHOLD = float(os.getenv("INGREDIENT_MATCH_THRESHOLD", "0.85"))
+INGREDIENT_MATCH_K = int(os.getenv("INGREDIENT_MATCH_K", "3"))
+INGREDIENT_MAPPING_CACHE_SIZE = int(os.getenv("INGREDIENT_MAPPING_CACHE_SIZE", "10000"))
+INGREDIENT_MAPPING_CACHE_TTL = float(os.getenv("INGREDIENT_MAPPING_CACHE_TTL_SECONDS", "86400"))
+
+mapping_cache = TTLCache(INGREDIENT_MAPPING_CACHE_SIZE, INGREDIENT_MAPPING_CACHE_TTL)
+register_metrics("ingredient_mapping_cache", mapping_cache.stats)
+
+_versions = itertools.count(1)
+
+
+def normalize_ingredient(name: str) -> str:
+    return " ".join(name.strip().lower().split())
+
+
+class IngredientIndex:
+    """Exact inner-product index over the (small) canonical ingredient vocabulary"""
+
+    def __init__(self, terms: Sequence[str], embeddings: np.ndarray):
+        self.terms = list(terms)
+        self.vocab = set(self.terms)
+        embeddings = np.ascontiguousarray(embeddings, dtype="float32")
+        faiss.normalize_L2(embeddings)
+        self._index = faiss.IndexFlatIP(embeddings.shape[1])
+        self._index.add(embeddings)
+        self.version = next(_versions)  # cached mappings are keyed by the vocabulary they came from
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    def nearest(self, query_embeddings: np.ndarray, k: int = INGREDIENT_MATCH_K,
+                threshold: float = INGREDIENT_MATCH_THRESHOLD) -> List[List[str]]:
+        """For each query row, canonical terms with cosine similarity >= threshold, best first"""
+        q = np.ascontiguousarray(query_embeddings, dtype="float32").reshape(len(query_embeddings), -1)
+        faiss.normalize_L2(q)
+        sims, idx = self._index.search(q, min(k, len(self.terms)))
+        return [
+            [self.terms[i] for s, i in zip(row_sims, row_idx) if i >= 0 and s >= threshold]
+            for row_sims, row_idx in zip(sims, idx)
+        ]
+
+
+def load_ingredient_index(app: FastAPI) -> None:
+    docs = app.state.db.collection("ingredient_embeddings").select(EMBEDDING_FIELDS).stream()
+    terms, rows = [], []
+    for doc in docs:
+        embedding = decode_embedding(doc.to_dict() or {})
+        if embedding is not None:
+            terms.append(normalize_ingredient(doc.id))
+            rows.append(embedding)
+    if not rows:
+        # optional: detected names are used as is (identity mapping) until the vocabulary is seeded
+        logger.warning("ingredient_embeddings is empty; run db_init/addIngredientEmbeddings.py. "
+                       "Ingredients are matched without fuzzy mapping")
+        app.state.ingredient_index = None
+        return
+    app.state.ingredient_index = IngredientIndex(terms, np.vstack(rows).astype("float32"))
+    logger.info(f"Ingredient index ready with {len(terms)} terms")
+
+
+def encode_texts(app: FastAPI, texts: List[str]) -> np.ndarray:
+    """CLIP text embeddings, one row per text (blocking; run it in the CPU pool)"""
+    tokens = clip.tokenize(texts, truncate=True).to(app.state.device)
+    with torch.no_grad():
+        features = app.state.model.encode_text(tokens)
+    return features.float().cpu().numpy()
+
+
+def map_ingredients(app: FastAPI, ingredients: List[str],
+                    encode: Callable[[FastAPI, List[str]], np.ndarray] = encode_texts) -> Dict[str, List[str]]:
+    """
+    {detected ingredient: [canonical terms]} for the given detected names.
+    Exact vocabulary hits map to themselves; the rest go through CLIP text
+    embeddings + the ingredient index (one batched encode for all misses).
+    Without the index (not loaded yet, or an empty vocabulary) or CLIP,
+    every term maps to itself.
+    """
+    terms = list(dict.fromkeys(normalize_ingredient(i) for i in ingredients if i and i.strip()))
+    index: Optional[IngredientIndex] = getattr(app.state, "ingredient_index", None)
+    if index is None or not (is_ready(app, "ingredient_index") and is_ready(app, "clip")):
+        return {t: [t] for t in terms}
+
+    mapping, pending = {}, []
+    for term in terms:
+        if term in index.vocab:
+            mapping[term] = [term]
+            continue
+        cached = mapping_cache.get((index.version, term))
+        if cached is not None:
+            mapping[term] = cached
+        else:
+            pending.append(term)
+
+    if pending:
+        for term, nearest in zip(pending, index.nearest(encode(app, pending))):
+            mapping[term] = nearest or [term]  # nothing close enough: keep the raw term
+            mapping_cache.set((index.version, term), mapping[term])
+
+    return {t: mapping[t] for t in terms}
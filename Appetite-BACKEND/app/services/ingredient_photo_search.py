@@ -0,0 +1,164 @@
+import asyncio
+import json
+from typing import AsyncIterator, List, Optional, Tuple
+
+from fastapi import Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from loguru import logger
+from PIL import Image
+
+from app.resources import is_ready
+from app.services.gemini_api import decode_for_gemini, extract_ingredients_cached
+from app.services.ingredient_index import map_ingredients
+from app.services.recipe_ingredient_index import RecipeIngredientIndex
+from app.services.searchIngredients import query_terms, search_recipes_by_ingredients
+from app.services.searchSimRecipe import get_recipes_details, search_similar, upload_cache_key
+from app.utils.executors import run_cpu
+
+# ------------------------
+# Photo -> recipes pipeline (POST /api/v1/ingredients/by-upload)
+# ------------------------
+# Gemini extraction takes seconds, CLIP similarity on the same photo tens of
+# milliseconds. Both start at once from one shared decode of the upload
+# (skipped entirely when both caches hit), so visually similar recipes are
+# ready long before the ingredients are. The final ranking fuses the
+# ingredient matches and the similar recipes by reciprocal rank, so a recipe
+# both find ranks above one only one of them finds.
+
+RRF_K = 60            # reciprocal rank fusion constant: score = sum of 1 / (RRF_K + rank)
+CANDIDATE_FACTOR = 2  # each source contributes top_k * CANDIDATE_FACTOR candidates
+
+STREAM_FORMATS = ("ndjson", "sse")
+STREAM_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "sse": "text/event-stream"}
+
+
+def fuse_candidates(ingredient_matches: List[dict], similar_hits: List[Tuple[str, float]], top_k: int) -> List[dict]:
+    """
+    Reciprocal rank fusion of the ingredient ranking (search_recipes_by_ingredients
+    results) and the CLIP ranking ([(recipe_id, similarity)]). Ingredient fields
+    are None for recipes only CLIP found, similarity is None for recipes only the
+    ingredients found. Ties keep the ingredient order.
+    """
+    fused = {}
+    for rank, match in enumerate(ingredient_matches, start=1):
+        fused[match["id"]] = {**match, "similarity": None, "score": 1.0 / (RRF_K + rank)}
+    for rank, (recipe_id, similarity) in enumerate(similar_hits, start=1):
+        entry = fused.setdefault(recipe_id, {
+            "id": recipe_id, "matched_ingredients": None, "all_ingredients": None,
+            "coverage": None, "missing_count": None, "score": 0.0,
+        })
+        entry["similarity"] = similarity
+        entry["score"] += 1.0 / (RRF_K + rank)
+    return sorted(fused.values(), key=lambda e: -e["score"])[:top_k]
+
+
+def _describe(recipe_index: RecipeIngredientIndex, candidate: dict, terms: List[str]) -> None:
+    # ingredient fields for a recipe only CLIP found (its weighted coverage isn't computed)
+    ingredients = recipe_index.ingredients_of(candidate["id"])
+    if ingredients is None:
+        return
+    wanted = set(terms)
+    candidate["matched_ingredients"] = [t for t in ingredients if t in wanted]
+    candidate["all_ingredients"] = ingredients
+    candidate["missing_count"] = len(ingredients) - len(candidate["matched_ingredients"])
+
+
+async def _hydrate(request: Request, candidates: List[dict]) -> List[dict]:
+    """Recipe details merged with each candidate's search fields, ranking order kept"""
+    by_id = {c["id"]: c for c in candidates}
+    details = await run_in_threadpool(get_recipes_details, list(by_id), request)
+    recipe_index = request.app.state.recipe_ingredients
+    for gone in by_id.keys() - {d["id"] for d in details}:
+        recipe_index.remove_recipe(gone)  # deleted by another worker
+    return [{**d, **{k: v for k, v in by_id[d["id"]].items() if k not in ("id", "score")}} for d in details]
+
+
+async def photo_search_events(
+    request: Request,
+    image_bytes: bytes,
+    top_k: int,
+    mode: str = "overlap",
+    similar: bool = True,
+) -> AsyncIterator[Tuple[str, dict]]:
+    """
+    Run the pipeline for one upload, yielding (event, payload) as each part is ready:
+      similar      {"results"}: visually similar recipes (CLIP), usually first
+      ingredients  {"detected_ingredients", "mapped_ingredients"}
+      results      {"results"}: the fused ranking
+    Similar recipes are skipped when similar=False or CLIP / the similarity index
+    aren't loaded. Raises ValueError for an invalid image, or when neither
+    source finds anything.
+    """
+    app = request.app
+    decoded: Optional[asyncio.Future] = None
+    n_candidates = top_k * CANDIDATE_FACTOR
+
+    def load_image() -> "asyncio.Future[Image.Image]":
+        # decoded once, on first use, for whichever branch needs it
+        nonlocal decoded
+        if decoded is None:
+            decoded = asyncio.ensure_future(decode_for_gemini(image_bytes))
+        return decoded
+
+    async def by_ingredients():
+        ingredients = await extract_ingredients_cached(image_bytes, load_image)
+        if not ingredients:
+            return [], {}, []
+        mapping = await run_cpu(map_ingredients, app, ingredients)
+        matches = await run_cpu(search_recipes_by_ingredients, app.state.recipe_ingredients,
+                                ingredients, n_candidates, mapping, mode)
+        return ingredients, mapping, matches
+
+    async def by_similarity():
+        try:
+            return await search_similar(request, n_candidates, upload_cache_key(image_bytes), load_image)
+        except ValueError:
+            return []  # invalid image: the ingredient branch reports it
+        except Exception as e:
+            logger.warning(f"Similar recipe retrieval failed, ranking by ingredients only: {e}")
+            return []
+
+    ingredient_task = asyncio.create_task(by_ingredients())
+    tasks = {ingredient_task}
+    if similar and is_ready(app, "clip") and is_ready(app, "recipe_index"):
+        tasks.add(asyncio.create_task(by_similarity()))
+
+    try:
+        similar_hits, ingredients, mapping, matches = [], [], {}, []
+        pending = tasks
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task is ingredient_task:
+                    ingredients, mapping, matches = task.result()
+                    yield "ingredients", {"detected_ingredients": ingredients, "mapped_ingredients": mapping}
+                else:
+                    similar_hits = task.result()
+                    if similar_hits and ingredient_task in pending:
+                        scores = dict(similar_hits[:top_k])
+                        results = await _hydrate(request, [{"id": rid, "similarity": s} for rid, s in scores.items()])
+                        yield "similar", {"results": results}
+
+        if not ingredients and not similar_hits:
+            raise ValueError("No ingredients detected in image")
+
+        fused = fuse_candidates(matches, similar_hits, top_k)
+        terms = query_terms(ingredients, mapping)
+        for candidate in fused:
+            if candidate["matched_ingredients"] is None:
+                _describe(app.state.recipe_ingredients, candidate, terms)
+        yield "results", {"results": await _hydrate(request, fused)}
+    finally:
+        for task in tasks:
+            task.cancel()
+        if decoded is not None:
+            decoded.cancel()
+
+
+def encode_event(event: str, payload: dict, fmt: str) -> str:
+    """One streamed event: an NDJSON line ({"event": ..., **payload}) or a server-sent event"""
+    payload = jsonable_encoder(payload)  # Firestore timestamps etc.
+    if fmt == "sse":
+        return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+    return json.dumps({"event": event, **payload}) + "\n"
@@ -0,0 +1,97 @@
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+
+# Minutes buckets shared by /recipes/search (Firestore query) and filtered
+# similarity search (attribute table): bucket -> (operator, minutes)
+MINUTES_BUCKETS = {
+    "quick": ("<=", 15),
+    "short": ("<=", 30),
+    "medium": ("<=", 45),
+    "long": (">", 60),
+}
+
+MINUTES_BUCKET_PATTERN = f"^({'|'.join(MINUTES_BUCKETS)})$"
+
+
+def normalize_terms(values: Optional[Iterable[str]]) -> tuple:
+    """Stripped, non-empty filter values (same cleanup as search_recipes)"""
+    return tuple(sorted({v.strip() for v in values or () if v and v.strip()}))
+
+
+class AttributeTable:
+    """
+    Filterable recipe attributes (category, area, minutes) stored in numpy
+    arrays indexed by FAISS label, so a filter becomes a boolean mask over
+    labels in a few vectorized ops and can be handed to faiss as an
+    IDSelectorBitmap. Strings are dictionary-encoded; -1 / NaN mean unknown
+    and never match a filter.
+    """
+
+    def __init__(self):
+        self._category = np.full(0, -1, dtype=np.int32)
+        self._area = np.full(0, -1, dtype=np.int32)
+        self._minutes = np.full(0, np.nan, dtype=np.float32)
+        self._vocab: Dict[str, Dict[str, int]] = {"category": {}, "area": {}}
+
+    def __len__(self) -> int:
+        return len(self._category)
+
+    def set(self, label: int, category: Optional[str], area: Optional[str], minutes) -> None:
+        self._grow(label + 1)
+        self._category[label] = self._code("category", category)
+        self._area[label] = self._code("area", area)
+        self._minutes[label] = float(minutes) if isinstance(minutes, (int, float)) else np.nan
+
+    def move(self, old_label: int, new_label: int) -> None:
+        if old_label < len(self):
+            self._grow(new_label + 1)
+            for arr in (self._category, self._area, self._minutes):
+                arr[new_label] = arr[old_label]
+            self.clear(old_label)
+
+    def clear(self, label: int) -> None:
+        if label < len(self):
+            self._category[label] = -1
+            self._area[label] = -1
+            self._minutes[label] = np.nan
+
+    def mask(self, size: int, categories=(), areas=(), minutes_bucket: Optional[str] = None) -> np.ndarray:
+        """Boolean mask over labels [0, size) of recipes matching every given filter (read-only)"""
+        n = min(size, len(self))  # labels past the table have no attributes: no match
+        mask = np.zeros(size, dtype=bool)
+        known = mask[:n]
+        known[:] = True
+        if categories:
+            known &= self._matches("category", self._category[:n], categories)
+        if areas:
+            known &= self._matches("area", self._area[:n], areas)
+        if minutes_bucket:
+            op, limit = MINUTES_BUCKETS[minutes_bucket]
+            minutes = self._minutes[:n]
+            with np.errstate(invalid="ignore"):
+                known &= (minutes <= limit) if op == "<=" else (minutes > limit)
+        return mask
+
+    # ------------------------
+    # internals
+    # ------------------------
+
+    def _code(self, field: str, value: Optional[str]) -> int:
+        if not isinstance(value, str) or not value.strip():
+            return -1
+        vocab = self._vocab[field]
+        return vocab.setdefault(value.strip(), len(vocab))
+
+    def _matches(self, field: str, codes: np.ndarray, values) -> np.ndarray:
+        wanted = [self._vocab[field][v] for v in values if v in self._vocab[field]]
+        return np.isin(codes, wanted)
+
+    def _grow(self, size: int) -> None:
+        if size <= len(self):
+            return
+        new_size = max(size, 2 * len(self), 1024)
+        extra = new_size - len(self)
+        self._category = np.concatenate([self._category, np.full(extra, -1, dtype=np.int32)])
+        self._area = np.concatenate([self._area, np.full(extra, -1, dtype=np.int32)])
+        self._minutes = np.concatenate([self._minutes, np.full(extra, np.nan, dtype=np.float32)])
@@ -0,0 +1,83 @@
+import os
+import threading
+from typing import Dict, Iterable, Optional
+
+from app.utils.cache import TTLCache
+from app.utils.metrics import register_metrics
+
+# ------------------------
+# Read-through cache for recipes/{id} documents
+# ------------------------
+# Recipe detail, voice-agent steps and Gemini answers read the same few hot
+# documents over and over. Writes made through this process invalidate the
+# entry right away; writes from other workers are picked up within the TTL.
+# Missing ids are cached too (shorter TTL) so unknown ids don't hit Firestore.
+# Each invalidation bumps the id's generation; a read that started before it
+# returns what it read but doesn't cache it, so the stale copy can't outlive
+# the write by a full TTL.
+
+RECIPE_CACHE_SIZE = int(os.getenv("RECIPE_CACHE_SIZE", "5000"))
+RECIPE_CACHE_TTL = float(os.getenv("RECIPE_CACHE_TTL_SECONDS", "300"))
+RECIPE_CACHE_NEGATIVE_TTL = float(os.getenv("RECIPE_CACHE_NEGATIVE_TTL_SECONDS", "30"))
+
+_MISSING = object()
+
+recipe_cache = TTLCache(RECIPE_CACHE_SIZE, RECIPE_CACHE_TTL)
+register_metrics("recipe_cache", recipe_cache.stats)
+
+_generations: Dict[str, int] = {}  # recipe id -> invalidations so far (ids written by this process)
+_lock = threading.Lock()           # a generation check and the store / bump it guards
+
+
+def _store(recipe_id: str, snap, generation: int) -> Optional[dict]:
+    data = (snap.to_dict() or {}) if snap.exists else None
+    with _lock:
+        if _generations.get(recipe_id, 0) == generation:  # not invalidated while reading
+            if data is None:
+                recipe_cache.set(recipe_id, _MISSING, RECIPE_CACHE_NEGATIVE_TTL)
+            else:
+                recipe_cache.set(recipe_id, data)
+    return dict(data) if data is not None else None
+
+
+def get_recipe_doc(db, recipe_id: str) -> Optional[dict]:
+    """
+    recipes/{recipe_id} as a dict (without "id"), or None if it doesn't exist.
+    Returns a shallow copy: adding keys is fine, don't mutate nested values.
+    """
+    cached = recipe_cache.get(recipe_id)
+    if cached is _MISSING:
+        return None
+    if cached is not None:
+        return dict(cached)
+    generation = _generations.get(recipe_id, 0)
+    return _store(recipe_id, db.collection("recipes").document(recipe_id).get(), generation)
+
+
+def get_recipe_docs(db, recipe_ids: Iterable[str]) -> Dict[str, dict]:
+    """Batched get_recipe_doc: cache first, then one db.get_all for the rest. Missing ids are left out."""
+    found, to_fetch = {}, []
+    for rid in dict.fromkeys(recipe_ids):
+        cached = recipe_cache.get(rid)
+        if cached is _MISSING:
+            continue
+        if cached is not None:
+            found[rid] = dict(cached)
+        else:
+            to_fetch.append(rid)
+
+    if to_fetch:
+        generations = {rid: _generations.get(rid, 0) for rid in to_fetch}
+        refs = [db.collection("recipes").document(rid) for rid in to_fetch]
+        for snap in db.get_all(refs):
+            data = _store(snap.id, snap, generations[snap.id])
+            if data is not None:
+                found[snap.id] = data
+    return found
+
+
+def invalidate_recipe(recipe_id: str) -> None:
+    """Call after any write to recipes/{recipe_id}"""
+    with _lock:
+        _generations[recipe_id] = _generations.get(recipe_id, 0) + 1
+        recipe_cache.pop(recipe_id)
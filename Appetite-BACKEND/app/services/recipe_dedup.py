@@ -0,0 +1,75 @@
+from typing import List, Tuple
+
+import numpy as np
+
+# ------------------------
+# Near-duplicate recipe images (db_init/deduplicate_by_embedding.py)
+# ------------------------
+# Exact cosine self-join of the recipe image embeddings, computed tile by
+# tile over the upper triangle of the similarity matrix (each pair once, a
+# CHUNK x CHUNK float32 tile in memory at a time) with one BLAS matmul per
+# tile, then connected components over the matching pairs with a vectorized
+# union-find. The only Python loop is over tiles, never over vectors.
+
+DEDUP_THRESHOLD = 0.95
+DEDUP_CHUNK_SIZE = 4096
+
+
+def near_duplicate_pairs(embeddings: np.ndarray, threshold: float = DEDUP_THRESHOLD,
+                         chunk_size: int = DEDUP_CHUNK_SIZE) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    (i, j, cosine) arrays of every pair i < j with cosine >= threshold.
+    embeddings need not be normalized; rows are L2-normalized on a copy.
+    """
+    x = np.array(embeddings, dtype="float32", order="C")
+    x /= np.maximum(np.linalg.norm(x, axis=1, keepdims=True), 1e-12)
+
+    left, right, sims = [], [], []
+    for i0 in range(0, len(x), chunk_size):
+        block = x[i0:i0 + chunk_size]
+        for j0 in range(i0, len(x), chunk_size):
+            tile = block @ x[j0:j0 + chunk_size].T
+            rows, cols = np.nonzero(tile >= threshold)
+            keep = cols + j0 > rows + i0  # drops the diagonal and the lower half of diagonal tiles
+            left.append(rows[keep] + i0)
+            right.append(cols[keep] + j0)
+            sims.append(tile[rows[keep], cols[keep]])
+    if not left:
+        return np.empty(0, "int64"), np.empty(0, "int64"), np.empty(0, "float32")
+    return np.concatenate(left), np.concatenate(right), np.concatenate(sims)
+
+
+def union_find(n: int, left: np.ndarray, right: np.ndarray) -> np.ndarray:
+    """
+    Component root of each of the n nodes given the edges (left[k], right[k]).
+    Union = hook each edge's larger root onto the smaller one (np.minimum.at);
+    find = pointer jumping until every node points at its root. Rounds are
+    O(log n) in practice, each one vectorized over all edges.
+    """
+    parent = np.arange(n)
+    if len(left) == 0:
+        return parent
+    while True:
+        a, b = parent[left], parent[right]
+        if np.array_equal(a, b):
+            return parent
+        low, high = np.minimum(a, b), np.maximum(a, b)
+        np.minimum.at(parent, high, low)
+        while True:  # path compression
+            grand = parent[parent]
+            if np.array_equal(grand, parent):
+                break
+            parent = grand
+
+
+def duplicate_clusters(embeddings: np.ndarray, threshold: float = DEDUP_THRESHOLD,
+                       chunk_size: int = DEDUP_CHUNK_SIZE) -> List[np.ndarray]:
+    """Row indices of every group of two or more near-duplicate embeddings, largest group first"""
+    left, right, _ = near_duplicate_pairs(embeddings, threshold, chunk_size)
+    roots = union_find(len(embeddings), left, right)
+
+    order = np.argsort(roots, kind="stable")
+    _, starts, counts = np.unique(roots[order], return_index=True, return_counts=True)
+    groups = [order[s:s + c] for s, c in zip(starts, counts) if c > 1]
+    groups.sort(key=len, reverse=True)
+    return groups
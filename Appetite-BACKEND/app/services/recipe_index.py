@@ -0,0 +1,341 @@
+import itertools
+import os
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from loguru import logger
+
+from app.services.index_snapshot import save_snapshot
+from app.services.recipe_attributes import AttributeTable
+from app.utils.lazy import lazy_import
+from app.utils.rwlock import ReadWriteLock
+
+faiss = lazy_import("faiss")
+
+EMBEDDING_DIM = 512  # CLIP ViT-B/32
+
+# ------------------------
+# Index type configuration
+# ------------------------
+# flat    exact brute-force inner product (default)
+# hnsw    graph index, tune FAISS_EF_SEARCH (higher = better recall, slower)
+# ivfflat inverted lists over full vectors, tune FAISS_NPROBE
+# ivfpq   inverted lists over PQ codes (~FAISS_PQ_M bytes/vector), tune FAISS_NPROBE
+INDEX_TYPES = ("flat", "hnsw", "ivfflat", "ivfpq")
+
+FAISS_INDEX_TYPE = os.getenv("FAISS_INDEX_TYPE", "flat").lower()
+FAISS_HNSW_M = int(os.getenv("FAISS_HNSW_M", "32"))
+FAISS_EF_CONSTRUCTION = int(os.getenv("FAISS_EF_CONSTRUCTION", "80"))
+FAISS_EF_SEARCH = int(os.getenv("FAISS_EF_SEARCH", "64"))
+FAISS_IVF_NLIST = int(os.getenv("FAISS_IVF_NLIST", "0"))      # 0 = ~4*sqrt(n)
+FAISS_NPROBE = int(os.getenv("FAISS_NPROBE", "16"))
+FAISS_PQ_M = int(os.getenv("FAISS_PQ_M", "64"))               # must divide the dimension
+
+PQ_NBITS = 8
+MIN_POINTS_PER_CENTROID = 39  # faiss warns below this
+
+_versions = itertools.count(1)  # process-wide, so a replaced index never reuses a version
+
+
+def _as_query(vec) -> np.ndarray:
+    q = np.asarray(vec, dtype="float32").reshape(1, -1).copy()
+    faiss.normalize_L2(q)
+    return q
+
+
+def _ivf_nlist(n: int) -> int:
+    nlist = FAISS_IVF_NLIST or int(4 * np.sqrt(n))
+    return max(1, min(nlist, n // MIN_POINTS_PER_CENTROID))
+
+
+def make_index(index_type: str, dim: int, n: int):
+    """
+    Create an empty (untrained) base index of the given type for n vectors.
+    Falls back to flat when there is not enough data to train an IVF variant.
+    Returns (index, effective index type).
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown FAISS_INDEX_TYPE '{index_type}', expected one of {INDEX_TYPES}")
+
+    if index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, FAISS_HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = FAISS_EF_CONSTRUCTION
+        index.hnsw.efSearch = FAISS_EF_SEARCH
+        return index, index_type
+
+    if index_type in ("ivfflat", "ivfpq"):
+        min_train = MIN_POINTS_PER_CENTROID * 2
+        if index_type == "ivfpq":
+            # every sub-quantizer trains a 2**PQ_NBITS-entry codebook
+            min_train = MIN_POINTS_PER_CENTROID * 2 ** PQ_NBITS
+        if n < min_train:
+            logger.warning(f"Only {n} vectors, too few to train {index_type}; using flat")
+            return faiss.IndexFlatIP(dim), "flat"
+
+        quantizer = faiss.IndexFlatIP(dim)
+        nlist = _ivf_nlist(n)
+        if index_type == "ivfflat":
+            index = faiss.IndexIVFFlat(quantizer, dim, nlist, faiss.METRIC_INNER_PRODUCT)
+        else:
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, FAISS_PQ_M, PQ_NBITS, faiss.METRIC_INNER_PRODUCT)
+        index.nprobe = min(FAISS_NPROBE, nlist)
+        return index, index_type
+
+    return faiss.IndexFlatIP(dim), "flat"
+
+
+def train_index(index, embeddings: np.ndarray) -> None:
+    """IVF variants learn their coarse centroids (and PQ codebooks) from the data"""
+    if not index.is_trained:
+        logger.info(f"Training {type(index).__name__} on {len(embeddings)} vectors...")
+        index.train(embeddings)
+
+
+def with_ids(base):
+    """
+    Give a base index add_with_ids/remove_ids over our labels.
+    IVF indexes store ids natively (and IndexIDMap cannot remove from them);
+    flat and HNSW get an IndexIDMap2 wrapper.
+    """
+    if isinstance(base, faiss.IndexIVF):
+        base.set_direct_map_type(faiss.DirectMap.Hashtable)  # O(1) remove_ids
+        return base
+    return faiss.IndexIDMap2(base)
+
+
+def index_type_of(index) -> str:
+    base = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else faiss.downcast_index(index)
+    if isinstance(base, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(base, faiss.IndexIVFPQ):
+        return "ivfpq"
+    if isinstance(base, faiss.IndexIVF):
+        return "ivfflat"
+    return "flat"
+
+
+class RecipeIndex:
+    """
+    Recipe image similarity index.
+    Wraps a faiss index with int64 labels (IndexIDMap2, or native ids for IVF)
+    that map to recipe ids, so single
+    recipes can be added or removed without rebuilding. Searches take the read
+    side of the lock, add/remove take the write side.
+
+    HNSW cannot delete vectors: removed labels are kept as tombstones and
+    excluded at search time with an IDSelector until the next full build.
+
+    Category / area / minutes live in an AttributeTable aligned to the labels;
+    filtered searches pass the matching labels to faiss as an IDSelectorBitmap,
+    so filtering happens inside the search instead of after it.
+
+    A background rebuild (index_rebuild.py) replaces the whole object: live
+    writes are journaled while it builds, replayed onto the new index by
+    hand_over(), and writes that still reach the old one are forwarded.
+    """
+
+    def __init__(self, index, id_mapping: Dict[int, str], owned: bool = True,
+                 removed: Optional[Iterable[int]] = None):
+        self._index = index
+        self._ids = dict(id_mapping)                               # label -> recipe id
+        self._labels = {rid: label for label, rid in self._ids.items()}
+        self._removed = set(removed or ())                         # tombstoned labels (hnsw)
+        self._next_label = max([*self._ids, *self._removed], default=-1) + 1
+        self._owned = owned                                        # False while memory-mapped
+        self._lock = ReadWriteLock()
+        self.index_type = index_type_of(index)
+        self.dirty = False
+        self.watermark = None                                      # Firestore changes before this are included
+        self.built_at = None                                       # start of the full build this descends from
+        self.version = next(_versions)                             # changes on every add/remove
+        self.attributes = AttributeTable()                         # label -> category / area / minutes
+        self._journal: Optional[list] = None                       # live writes while a rebuild runs
+        self._successor: Optional["RecipeIndex"] = None            # the rebuilt index that replaced this one
+
+    @classmethod
+    def empty(cls, dim: int = EMBEDDING_DIM) -> "RecipeIndex":
+        return cls(faiss.IndexIDMap2(faiss.IndexFlatIP(dim)), {})
+
+    @classmethod
+    def from_embeddings(cls, recipe_ids: List[str], embeddings: np.ndarray,
+                        index_type: Optional[str] = None) -> "RecipeIndex":
+        embeddings = np.ascontiguousarray(embeddings, dtype="float32")
+        faiss.normalize_L2(embeddings)
+        base, index_type = make_index(index_type or FAISS_INDEX_TYPE, embeddings.shape[1], len(embeddings))
+        train_index(base, embeddings)
+        index = with_ids(base)
+        labels = np.arange(len(recipe_ids), dtype="int64")
+        index.add_with_ids(embeddings, labels)
+        logger.info(f"Built {index_type} index with {index.ntotal} vectors")
+        return cls(index, dict(zip(labels.tolist(), recipe_ids)))
+
+    @property
+    def ntotal(self) -> int:
+        return len(self._ids)
+
+    @property
+    def dim(self) -> int:
+        return self._index.d
+
+    @property
+    def supports_remove(self) -> bool:
+        return self.index_type != "hnsw"
+
+    def __contains__(self, recipe_id: str) -> bool:
+        return recipe_id in self._labels
+
+    def search(self, query_vec, top_k: int, filters: Optional[dict] = None) -> List[Tuple[str, float]]:
+        """
+        Return [(recipe_id, cosine similarity)] best first.
+        filters: optional categories / areas / minutes_bucket; only matching recipes are returned.
+        """
+        q = _as_query(query_vec)
+        with self._lock.read():
+            if not self._ids:
+                return []
+            bitmap = self._filter_bitmap(filters) if filters else None
+            if bitmap is not None and not bitmap.any():
+                return []
+            sims, labels = self._index.search(q, top_k, params=self._search_params(bitmap))
+            return [
+                (self._ids[label], float(score))
+                for score, label in zip(sims[0], labels[0])
+                if label != -1 and label in self._ids
+            ]
+
+    def upsert(self, recipe_id: str, embedding, attributes: Optional[dict] = None) -> None:
+        """Add or replace a recipe; attributes (category / area / minutes) enable filtered search"""
+        vec = _as_query(embedding)
+        with self._lock.write():
+            successor = self._successor
+            if successor is None:
+                self._upsert(recipe_id, vec, attributes)
+                if self._journal is not None:
+                    self._journal.append(("upsert", recipe_id, vec, attributes))
+                return
+        successor.upsert(recipe_id, vec, attributes)  # swapped out while the caller held this object
+
+    def remove(self, recipe_id: str) -> bool:
+        with self._lock.write():
+            successor = self._successor
+            if successor is None:
+                if self._journal is not None:
+                    self._journal.append(("remove", recipe_id, None, None))
+                return self._remove(recipe_id)
+        return successor.remove(recipe_id)
+
+    def start_journal(self) -> None:
+        """Record upserts / removes from now on, for hand_over() to a rebuilt index"""
+        with self._lock.write():
+            self._journal = []
+
+    def stop_journal(self) -> None:
+        with self._lock.write():
+            self._journal = None
+
+    def hand_over(self, successor: "RecipeIndex") -> int:
+        """
+        Replay the journaled writes onto successor and forward every later write to it.
+        Call right before swapping the reference; returns the number of replayed writes.
+        """
+        with self._lock.write():
+            journal, self._journal = self._journal or [], None
+            for op, recipe_id, vec, attributes in journal:
+                if op == "upsert":
+                    successor.upsert(recipe_id, vec, attributes)
+                else:
+                    successor.remove(recipe_id)
+            self._successor = successor
+        return len(journal)
+
+    def set_attributes(self, rows: Iterable[Tuple[str, Optional[str], Optional[str], Optional[float]]]) -> int:
+        """Bulk-load (recipe_id, category, area, minutes); ids not in the index are ignored"""
+        count = 0
+        with self._lock.write():
+            for recipe_id, category, area, minutes in rows:
+                label = self._labels.get(recipe_id)
+                if label is not None:
+                    self.attributes.set(label, category, area, minutes)
+                    count += 1
+            self.version = next(_versions)
+        return count
+
+    def persist(self) -> None:
+        """Write the index to the local snapshot (blocks writers, not searches)"""
+        with self._lock.read():
+            save_snapshot(self._index, self._ids, self.watermark, FAISS_INDEX_TYPE,
+                          removed=self._removed, built_at=self.built_at)
+            self.dirty = False
+
+    # ------------------------
+    # internals (caller holds the write lock)
+    # ------------------------
+
+    def _upsert(self, recipe_id: str, vec: np.ndarray, attributes: Optional[dict]) -> None:
+        self._ensure_owned()
+        old_label = label = self._labels.get(recipe_id)
+        if label is not None:
+            self._drop_label(label)
+        if label is None or not self.supports_remove:
+            label = self._next_label
+            self._next_label += 1
+        if old_label is not None and old_label != label:
+            self.attributes.move(old_label, label)
+        if attributes is not None:
+            self.attributes.set(label, attributes.get("category"), attributes.get("area"), attributes.get("minutes"))
+        self._index.add_with_ids(vec, np.array([label], dtype="int64"))
+        self._ids[label] = recipe_id
+        self._labels[recipe_id] = label
+        self.dirty = True
+        self.version = next(_versions)
+
+    def _remove(self, recipe_id: str) -> bool:
+        label = self._labels.pop(recipe_id, None)
+        if label is None:
+            return False
+        self._ensure_owned()
+        self._drop_label(label)
+        self.attributes.clear(label)
+        self.dirty = True
+        self.version = next(_versions)
+        return True
+
+    def _drop_label(self, label: int) -> None:
+        del self._ids[label]
+        if self.supports_remove:
+            self._index.remove_ids(np.array([label], dtype="int64"))
+        else:
+            self._removed.add(label)
+
+    def _filter_bitmap(self, filters: dict) -> Optional[np.ndarray]:
+        mask = self.attributes.mask(
+            self._next_label,
+            categories=filters.get("categories"),
+            areas=filters.get("areas"),
+            minutes_bucket=filters.get("minutes_bucket"),
+        )
+        if self._removed:
+            mask[np.fromiter(self._removed, dtype="int64")] = False
+        return mask
+
+    def _search_params(self, bitmap: Optional[np.ndarray] = None):
+        sel = None
+        if bitmap is not None:
+            # Bit i of the packed mask = label i; the mask already excludes tombstones
+            packed = np.packbits(bitmap, bitorder="little")
+            sel = faiss.IDSelectorBitmap(len(bitmap), faiss.swig_ptr(packed))
+            sel.referenced_bitmap = packed  # keep the buffer alive as long as the selector
+        elif self._removed:
+            removed = np.fromiter(self._removed, dtype="int64")
+            sel = faiss.IDSelectorNot(faiss.IDSelectorBatch(removed))
+        if self.index_type == "hnsw":
+            return faiss.SearchParametersHNSW(efSearch=FAISS_EF_SEARCH, sel=sel)
+        if self.index_type in ("ivfflat", "ivfpq"):
+            return faiss.SearchParametersIVF(nprobe=FAISS_NPROBE, sel=sel)
+        return faiss.SearchParameters(sel=sel) if sel is not None else None
+
+    def _ensure_owned(self) -> None:
+        # Memory-mapped indexes are read-only; take a private copy before the first write
+        if not self._owned:
+            self._index = faiss.deserialize_index(faiss.serialize_index(self._index))
+            self._owned = True
@@ -0,0 +1,282 @@
+import asyncio
+import os
+from array import array
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from fastapi import FastAPI
+from loguru import logger
+
+from app.resources import is_ready
+from app.services.index_snapshot import new_watermark
+from app.services.ingredient_index import normalize_ingredient
+from app.utils.lazy import lazy_import
+from app.utils.rwlock import ReadWriteLock
+
+sparse = lazy_import("scipy.sparse")
+
+# ------------------------
+# Inverted ingredient index (ingredient search)
+# ------------------------
+# A recipe x ingredient sparse matrix, built from one projected scan of
+# recipes (name + ingredient_names) at startup. A query scores every recipe
+# in one vectorized pass and keeps the top k, with no Firestore reads; the
+# router then hydrates just those k. Ingredients are weighted by IDF, so
+# staples that half the catalog uses (salt, oil, ...) count less than the
+# ingredients that actually tell recipes apart. Recipe create / delete in this process update it
+# directly; recipes other workers wrote (updatedAt after the watermark) are
+# picked up every RECIPE_INGREDIENTS_REFRESH_SECONDS. A deleted recipe leaves
+# no document to find, so deletions come from the recipe_embeddings tombstone
+# (deleted=True) the delete route writes for the similarity index.
+
+RECIPE_INGREDIENTS_REFRESH_SECONDS = float(os.getenv("RECIPE_INGREDIENTS_REFRESH_SECONDS", "300"))  # 0 = off
+
+INDEX_FIELDS = ["name", "ingredient_names"]
+SCORE_MODES = ("overlap", "coverage")
+
+
+def normalize_ingredient_names(names: Optional[Iterable[str]]) -> List[str]:
+    """Normalized, de-duplicated ingredient names (order kept), as stored in ingredient_names"""
+    return list(dict.fromkeys(normalize_ingredient(n) for n in names or () if isinstance(n, str) and n.strip()))
+
+
+class _Compiled(NamedTuple):
+    by_term: "sparse.csc_matrix"   # recipe rows x ingredient columns, 1 = recipe uses it
+    idf: np.ndarray                # per ingredient column
+    row_weight: np.ndarray         # sum of idf over each recipe's ingredients
+    row_len: np.ndarray            # ingredients per recipe
+    alive: np.ndarray              # False for removed / replaced rows
+    entries: list                  # row -> (id, name, ingredients) / None, as numbered in this snapshot
+
+
+class RecipeIngredientIndex:
+    """
+    Recipe x ingredient incidence matrix for ingredient search. Writes only
+    append (row label, ingredient column) pairs or mark a row dead; the first
+    search after a write compiles them into a scipy sparse matrix (dropping
+    dead rows once they outnumber live ones) plus per-ingredient IDF weights.
+    A search is then one sparse mat-vec over the query columns for all
+    recipes at once and an argpartition for the top k.
+    """
+
+    def __init__(self):
+        self._cols: Dict[str, int] = {}                  # ingredient -> column
+        self._row_of: Dict[str, int] = {}                # live recipe id -> row
+        self._rows: List[Optional[Tuple[str, str, Tuple[str, ...]]]] = []  # row -> (id, name, ingredients) / None
+        self._pair_rows = array("i")                     # (row, column) pairs of the matrix
+        self._pair_cols = array("i")
+        self._compiled: Optional[_Compiled] = None       # None after a write
+        self._lock = ReadWriteLock()
+        self.watermark = None                            # recipes updated before this are included
+
+    def __len__(self) -> int:
+        return len(self._row_of)
+
+    def __contains__(self, recipe_id: str) -> bool:
+        return recipe_id in self._row_of
+
+    @property
+    def vocabulary_size(self) -> int:
+        return len(self._cols)
+
+    def set_recipe(self, recipe_id: str, name: Optional[str], ingredient_names: Optional[Iterable[str]]) -> None:
+        """Add or replace a recipe (a recipe without ingredients is dropped)"""
+        terms = tuple(normalize_ingredient_names(ingredient_names))
+        with self._lock.write():
+            self._drop(recipe_id)
+            if not terms:
+                return
+            row = len(self._rows)
+            self._rows.append((recipe_id, name or "Unknown", terms))
+            self._row_of[recipe_id] = row
+            self._pair_rows.extend([row] * len(terms))
+            self._pair_cols.extend(self._cols.setdefault(t, len(self._cols)) for t in terms)
+            self._compiled = None
+
+    def ingredients_of(self, recipe_id: str) -> Optional[List[str]]:
+        with self._lock.read():
+            row = self._row_of.get(recipe_id)
+            return list(self._rows[row][2]) if row is not None else None
+
+    def remove_recipe(self, recipe_id: str) -> bool:
+        with self._lock.write():
+            return self._drop(recipe_id)
+
+    def search(self, terms: Iterable[str], top_k: int, mode: str = "overlap") -> List[dict]:
+        """
+        Top-k recipes sharing at least one of terms, best first.
+          overlap:  IDF-weighted sum of the shared ingredients (rare ingredients count more)
+          coverage: that sum over the recipe's own weighted total, i.e. the share of
+                    the recipe the pantry covers; ties go to the larger overlap
+        Both break remaining ties by fewer missing ingredients.
+        """
+        if mode not in SCORE_MODES:
+            raise ValueError(f"Unknown mode '{mode}', expected one of {SCORE_MODES}")
+        query = list(dict.fromkeys(terms))
+        while True:
+            compiled = self._compiled or self._compile()
+            with self._lock.read():
+                # a write between compiling and here would leave rows dead that the snapshot counts alive
+                if self._compiled is compiled:
+                    return self._rank(compiled, query, top_k, mode)
+
+    # ------------------------
+    # internals
+    # ------------------------
+
+    def _rank(self, compiled: _Compiled, query: List[str], top_k: int, mode: str) -> List[dict]:
+        # caller holds the read lock and compiled is current: every alive row has its entry
+        n_cols = compiled.by_term.shape[1]
+        cols = [c for c in (self._cols.get(t) for t in query) if c is not None and c < n_cols]
+        if not cols or not compiled.alive.any():
+            return []
+
+        # One sparse product over every recipe: weighted overlap and number of shared ingredients
+        sub = compiled.by_term[:, cols]
+        overlap = sub @ compiled.idf[cols]
+        matched = sub @ np.ones(len(cols))
+        missing = compiled.row_len - matched
+        candidates = np.flatnonzero((matched > 0) & compiled.alive)
+        if not len(candidates):
+            return []
+
+        if mode == "coverage":
+            primary = overlap[candidates] / compiled.row_weight[candidates]
+            secondary = overlap[candidates]
+        else:
+            primary = overlap[candidates]
+            secondary = matched[candidates]
+
+        # argpartition for the k-th best score, then order only the rows at or above it
+        k = min(top_k, len(candidates))
+        kth = np.partition(primary, len(primary) - k)[len(primary) - k]
+        top = np.flatnonzero(primary >= kth)
+        order = np.lexsort((candidates[top], missing[candidates[top]], -secondary[top], -primary[top]))[:k]
+
+        wanted = set(query)
+        results = []
+        for i in top[order]:
+            row = candidates[i]
+            recipe_id, name, ingredients = compiled.entries[row]
+            results.append({
+                "id": recipe_id,
+                "name": name,
+                "matched_ingredients": [t for t in ingredients if t in wanted],
+                "all_ingredients": list(ingredients),
+                "score": round(float(primary[i]), 4),
+                "coverage": round(float(overlap[row] / compiled.row_weight[row]), 4),
+                "missing_count": int(missing[row]),
+            })
+        return results
+
+    def _drop(self, recipe_id: str) -> bool:
+        # caller holds the write lock
+        row = self._row_of.pop(recipe_id, None)
+        if row is None:
+            return False
+        self._rows[row] = None
+        self._compiled = None
+        return True
+
+    def _compile(self) -> _Compiled:
+        with self._lock.write():
+            if self._compiled is not None:
+                return self._compiled
+            if len(self._rows) > 2 * len(self._row_of):
+                self._compact()
+            n_rows, n_cols = len(self._rows), max(len(self._cols), 1)
+            rows = np.array(self._pair_rows, dtype=np.int32)  # copies: the arrays keep growing
+            cols = np.array(self._pair_cols, dtype=np.int32)
+            alive = np.array([entry is not None for entry in self._rows], dtype=bool)
+
+            live = alive[rows]
+            df = np.bincount(cols[live], minlength=n_cols)
+            idf = np.log((1 + len(self._row_of)) / (1 + df)) + 1.0  # smoothed IDF, >= 1
+
+            by_row = sparse.csr_matrix((np.ones(len(rows), dtype=np.float32), (rows, cols)), shape=(n_rows, n_cols))
+            row_weight = by_row @ idf
+            row_len = np.diff(by_row.indptr).astype(np.float64)
+            self._compiled = _Compiled(by_row.tocsc(), idf, row_weight, row_len, alive, self._rows)
+            return self._compiled
+
+    def _compact(self) -> None:
+        # Renumber live rows densely (caller holds the write lock)
+        live = [entry for entry in self._rows if entry is not None]
+        self._rows = live
+        self._row_of = {entry[0]: row for row, entry in enumerate(live)}
+        self._pair_rows = array("i", (row for row, entry in enumerate(live) for _ in entry[2]))
+        self._pair_cols = array("i", (self._cols[t] for entry in live for t in entry[2]))
+
+
+# ------------------------
+# Loading / keeping it current
+# ------------------------
+
+def _add_docs(recipe_index: RecipeIngredientIndex, docs) -> int:
+    count = 0
+    for doc in docs:
+        data = doc.to_dict() or {}
+        recipe_index.set_recipe(doc.id, data.get("name"), data.get("ingredient_names"))
+        count += 1
+    return count
+
+
+def load_recipe_ingredient_index(app: FastAPI) -> None:
+    recipe_index = RecipeIngredientIndex()
+    recipe_index.watermark = new_watermark()
+    _add_docs(recipe_index, app.state.db.collection("recipes").select(INDEX_FIELDS).stream())
+    app.state.recipe_ingredients = recipe_index
+    logger.info(f"Recipe ingredient index ready: {len(recipe_index)} recipes, "
+                f"{recipe_index.vocabulary_size} ingredients")
+
+
+def refresh_recipe_ingredient_index(app: FastAPI) -> int:
+    """Apply recipes updated or deleted since the watermark (by other workers); returns how many"""
+    recipe_index: RecipeIngredientIndex = app.state.recipe_ingredients
+    db = app.state.db
+    next_watermark = new_watermark()
+    docs = (db.collection("recipes")
+              .where("updatedAt", ">", recipe_index.watermark)
+              .select(INDEX_FIELDS)
+              .stream())
+    count = _add_docs(recipe_index, docs)
+    tombstones = (db.collection("recipe_embeddings")
+                    .where("updatedAt", ">", recipe_index.watermark)
+                    .select(["deleted"])
+                    .stream())
+    for doc in tombstones:
+        if (doc.to_dict() or {}).get("deleted") and recipe_index.remove_recipe(doc.id):
+            count += 1
+    recipe_index.watermark = next_watermark
+    return count
+
+
+def start_recipe_ingredient_refresh(app: FastAPI) -> Optional[asyncio.Task]:
+    if RECIPE_INGREDIENTS_REFRESH_SECONDS <= 0:
+        return None
+
+    async def _loop():
+        while True:
+            await asyncio.sleep(RECIPE_INGREDIENTS_REFRESH_SECONDS)
+            if not is_ready(app, "recipe_ingredients"):
+                continue
+            try:
+                count = await asyncio.to_thread(refresh_recipe_ingredient_index, app)
+            except Exception as e:
+                logger.warning(f"Recipe ingredient index refresh failed: {e}")
+                continue
+            if count:
+                logger.info(f"Recipe ingredient index: {count} recipes updated")
+
+    return asyncio.create_task(_loop(), name="refresh-recipe-ingredients")
+
+
+def index_recipe_ingredients(app: FastAPI, recipe: dict) -> None:
+    """Make a just-created recipe findable by ingredient search"""
+    if is_ready(app, "recipe_ingredients"):
+        app.state.recipe_ingredients.set_recipe(recipe["id"], recipe.get("name"), recipe.get("ingredient_names"))
+
+
+def remove_recipe_ingredients(app: FastAPI, recipe_id: str) -> None:
+    if is_ready(app, "recipe_ingredients"):
+        app.state.recipe_ingredients.remove_recipe(recipe_id)
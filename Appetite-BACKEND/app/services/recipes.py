@@ -2,6 +2,9 @@ import uuid
 from typing import Any, Dict, List, Optional
 from firebase_admin import firestore, storage
 from app.db.firestore import db
+from app.services.recipe_attributes import MINUTES_BUCKETS
+from app.services.recipe_cache import get_recipe_doc, get_recipe_docs, invalidate_recipe
+from app.services.recipe_ingredient_index import normalize_ingredient_names
 from app.schemas.recipes import RecipeCreate
 from app.utils.search import fuzzy_filter, make_keywords  # ensure make_keywords exists
 from app.utils.users import get_user_public
@@ -47,8 +50,11 @@ def list_by_contributor(uid: str, limit: int, page_token: Optional[str]) -> Dict
     return {"items": items, "nextPageToken": next_token}
 
 def get_recipe_by_id(id: str) -> Optional[Dict[str, Any]]:
-    snap = db.collection("recipes").document(id).get()
-    return _doc_to_public_recipe(snap) if snap.exists else None
+    data = get_recipe_doc(db, id)
+    if data is None:
+        return None
+    data["id"] = id
+    return data
 
 
 def search_recipes(
@@ -85,15 +91,9 @@ def search_recipes(
         if ars:
             q = q.where("area", "==", ars[0]) if len(ars) == 1 else q.where("area", "in", ars[:10])
 
-    if minutes_bucket:
-        if minutes_bucket == "quick":
-            q = q.where("minutes", "<=", 15)
-        elif minutes_bucket == "short":
-            q = q.where("minutes", "<=", 30)
-        elif minutes_bucket == "medium":
-            q = q.where("minutes", "<=", 45)
-        elif minutes_bucket == "long":
-            q = q.where("minutes", ">", 60)
+    if minutes_bucket in MINUTES_BUCKETS:
+        op, minutes = MINUTES_BUCKETS[minutes_bucket]
+        q = q.where("minutes", op, minutes)
 
     ordered = False
     if minutes_bucket:
@@ -146,6 +146,7 @@ def save_recipe_for_user(user_id: str, recipe_id: str):
 
     # 2. Increment saveCount atomically
     recipe_ref.update({"saveCount": firestore.Increment(1)})
+    invalidate_recipe(recipe_id)
 
     return {
         "message": "Recipe saved successfully",
@@ -178,6 +179,7 @@ def unsave_recipe_for_user(user_id: str, recipe_id: str):
         current_count = recipe_snapshot.to_dict().get("saveCount", 0)
         if current_count > 0:
             recipe_ref.update({"saveCount": firestore.Increment(-1)})
+            invalidate_recipe(recipe_id)
 
     return {
         "message": "Recipe unsaved successfully",
@@ -194,12 +196,12 @@ def get_saved_recipes_for_user(user_id: str):
 
     saved_ids = doc.to_dict().get("savedrecipes", [])
     print("Saved recipe IDs:", saved_ids)
+    docs = get_recipe_docs(db, saved_ids)
     recipes = []
     for rid in saved_ids:
-        rec_doc = db.collection("recipes").document(rid).get()
-        if rec_doc.exists:
-            recipe_data = rec_doc.to_dict()
-            recipe_data["id"] = rec_doc.id
+        if rid in docs:
+            recipe_data = docs[rid]
+            recipe_data["id"] = rid
             recipes.append(recipe_data)
     for r in recipes:
         print("Recipe:", r.get("name"))
@@ -305,6 +307,7 @@ async def create_recipe(uid: str, file, body: RecipeCreate) -> Dict[str, Any]:
         "tags": [t for t in (body.tags or []) if t and str(t).strip()],  # keep original casing like DB
         "thumbnail": thumbnail,
         "ingredients": norm_ingredients,
+        "ingredient_names": normalize_ingredient_names(i["ingredient"] for i in norm_ingredients),  # ingredient search
         "steps": steps,
         "contributorId": uid,
         "contributorName": get_user_public(uid)["name"],
@@ -324,6 +327,7 @@ async def create_recipe(uid: str, file, body: RecipeCreate) -> Dict[str, Any]:
 
     ref = coll.document()  # auto-ID
     ref.set(data)
+    invalidate_recipe(ref.id)
     snap = ref.get()
     if not snap.exists:
         raise RuntimeError("Failed to create recipe.")
@@ -335,8 +339,7 @@ async def create_recipe(uid: str, file, body: RecipeCreate) -> Dict[str, Any]:
 # ---------------------------
 
 def get_step(recipe_id: str, step_index: int) -> str:
-    doc = db.collection("recipes").document(recipe_id).get()
-    data = doc.to_dict()
+    data = get_recipe_doc(db, recipe_id) or {}
     steps = data.get("steps", [])
     if 0 <= step_index < len(steps):
         return steps[step_index]
@@ -350,7 +353,6 @@ def get_previous_step(recipe_id: str, step_index: int) -> str:
     return get_step(recipe_id, step_index - 1)
 
 def get_step_count(recipe_id: str) -> int:
-    doc = db.collection("recipes").document(recipe_id).get()
-    data = doc.to_dict() or {}
+    data = get_recipe_doc(db, recipe_id) or {}
     steps = data.get("steps", [])
     return len(steps)
@@ -1,54 +1,22 @@
-from app.db.firestore import db
+from app.services.ingredient_index import normalize_ingredient
+from app.services.recipe_ingredient_index import RecipeIngredientIndex
 
-def search_recipes_by_ingredients(ingredients: list[str], top_k: int = 8):
+def search_recipes_by_ingredients(recipe_index: RecipeIngredientIndex, ingredients: list[str], top_k: int = 8,
+                                  term_mapping: dict[str, list[str]] | None = None, mode: str = "overlap"):
     """
     Find recipes that contain any of the provided ingredients.
-    Uses weighted overlap: generic/common ingredients count less.
+    mode="overlap" ranks by IDF-weighted overlap (common ingredients count less),
+    mode="coverage" by how much of each recipe the ingredients cover.
+    term_mapping (from map_ingredients) expands each detected ingredient
+    into the canonical recipe ingredient names it matches.
+    Answered from the in-memory ingredient matrix; no Firestore reads.
     """
+    return recipe_index.search(query_terms(ingredients, term_mapping), top_k, mode)
 
-    # Low-weight "generic" ingredients
-    GENERIC_KEYWORDS = ["salt", "pepper", "oil", "water", "sugar", "onion", "garlic","sauce", "butter", "sugar"]
-
-    results = []
-
-    recipes_ref = db.collection("recipes").order_by("name")
-    recipes = list(recipes_ref.stream())  
-
-    query_ingredients = [ing.strip().lower() for ing in ingredients]
-
-    for doc in recipes:
-        data = doc.to_dict()
-        recipe_ingredients = [ri.lower() for ri in data.get("ingredient_names", [])]
-
-        # Calculate overlap
-        overlap = set(recipe_ingredients) & set(query_ingredients)
-
-        if not overlap:
-            continue  # skip recipes with no matches
-
-        # Weighted score
-        score = 0.0
-        for ing in overlap:
-            if any(keyword in ing for keyword in GENERIC_KEYWORDS):
-                score += 0.5  # low importance
-            else:
-                score += 2.0  # high importance
-
-        results.append({
-            "id": doc.id,
-            "name": data.get("name", "Unknown"),
-            "matched_ingredients": list(overlap),
-            "all_ingredients": recipe_ingredients,
-            "score": score
-        })
-
-    # Sort by weighted score, then by number of matches as fallback
-    results = sorted(
-        results,
-        key=lambda r: (r["score"], len(r["matched_ingredients"]), r["name"]),
-        reverse=True
-    )
-
-
-    return results[:top_k]
 
+def query_terms(ingredients: list[str], term_mapping: dict[str, list[str]] | None = None) -> list[str]:
+    """Normalized detected ingredients, each expanded through term_mapping"""
+    query_ingredients = [normalize_ingredient(ing) for ing in ingredients if ing and ing.strip()]
+    if term_mapping:
+        query_ingredients = [c for ing in query_ingredients for c in term_mapping.get(ing, [ing])]
+    return query_ingredients
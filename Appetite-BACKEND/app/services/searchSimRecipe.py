@@ -1,17 +1,88 @@
-import clip
-import torch
+import asyncio
+import hashlib
+import os
+from typing import Awaitable, Callable, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
 import numpy as np
-from io import BytesIO
 from PIL import Image
 from fastapi import Request
 from firebase_admin import firestore
-import faiss
 from fastapi import FastAPI
+from loguru import logger
+
+from app.resources import is_ready, wait_resource
+from app.services.index_snapshot import load_snapshot, new_watermark
+from app.services.recipe_attributes import normalize_terms
+from app.services.recipe_cache import get_recipe_doc, get_recipe_docs
+from app.services.recipe_index import RecipeIndex, FAISS_INDEX_TYPE
+from app.utils.cache import TTLCache
+from app.utils.embedding_codec import EMBEDDING_FIELDS, decode_embedding, encode_embedding
+from app.utils.executors import run_cpu, TORCH_THREADS
+from app.utils.images import decode_image
+from app.utils.lazy import lazy_import
+from app.utils.metrics import register_metrics
+
+# Heavy ML deps are imported on first use, not when the router is mounted
+clip = lazy_import("clip")
+torch = lazy_import("torch")
+
+ATTRIBUTE_FIELDS = ("category", "area", "minutes")  # filterable in similarity search
 
 # ------------------------
 # Setup
 # ------------------------
 
+_preloaded_clip = None  # (model, preprocess) loaded by the gunicorn master, see preload_clip_model
+
+def preload_clip_model() -> bool:
+    """
+    Load the CLIP weights in the (gunicorn) master before workers fork, so
+    every worker maps the same copy-on-write pages instead of loading its own.
+    CPU only: a CUDA context does not survive fork. No forward pass here:
+    an OpenMP thread pool started in the parent hangs forked children.
+    """
+    global _preloaded_clip
+    if torch.cuda.is_available():
+        logger.info("CUDA available, skipping CLIP preload (each worker loads its own)")
+        return False
+    torch.set_num_threads(1)
+    _preloaded_clip = clip.load("ViT-B/32", device="cpu")
+    return True
+
+def load_clip_model(app: FastAPI):
+    """Load CLIP ViT-B/32 onto app.state (or adopt the preloaded one) and run one dummy forward pass"""
+    torch.set_num_threads(TORCH_THREADS)  # pinned so the CPU pool's workers don't oversubscribe cores
+    if _preloaded_clip is not None:
+        app.state.device = "cpu"
+        model, preprocess = _preloaded_clip
+    else:
+        app.state.device = "cuda" if torch.cuda.is_available() else "cpu"
+        model, preprocess = clip.load("ViT-B/32", device=app.state.device)
+
+    # Warmup: the first forward pass pays for lazy kernel / allocator setup
+    dummy = preprocess(Image.new("RGB", (224, 224))).unsqueeze(0).to(app.state.device)
+    with torch.no_grad():
+        model.encode_image(dummy)
+
+    app.state.model = model
+    app.state.preprocess = preprocess
+
+def load_recipe_index(app: FastAPI):
+    recipe_index = load_or_build_faiss_index(app)
+    load_recipe_attributes(app, recipe_index)
+    app.state.recipe_index = recipe_index
+
+def load_recipe_attributes(app: FastAPI, recipe_index: RecipeIndex) -> None:
+    """Fill the index's filter attributes from one projected scan of recipes"""
+    docs = app.state.db.collection("recipes").select(list(ATTRIBUTE_FIELDS)).stream()
+    rows = []
+    for doc in docs:
+        data = doc.to_dict() or {}
+        rows.append((doc.id, *(data.get(f) for f in ATTRIBUTE_FIELDS)))
+    count = recipe_index.set_attributes(rows)
+    logger.info(f"Loaded filter attributes for {count}/{recipe_index.ntotal} indexed recipes")
+
 def encode_image(pil_image: Image.Image, request: Request):
     """Encode a PIL image into CLIP embedding"""
     preprocess = request.app.state.preprocess
@@ -23,42 +94,259 @@ def encode_image(pil_image: Image.Image, request: Request):
         features = model.encode_image(image)
     return features.cpu().numpy().flatten()
 
+async def encode_image_batched(pil_image: Image.Image, request: Request):
+    """Encode through the shared micro-batching queue (concurrent requests share one forward pass)"""
+    image = await run_cpu(request.app.state.preprocess, pil_image)
+    return await request.app.state.clip_batcher.encode(image)
+
 def get_all_recipe_embeddings(app: FastAPI):
     db = app.state.db
     """Fetch all recipe embeddings from Firestore"""
-    docs = db.collection("recipe_embeddings").stream()
+    docs = db.collection("recipe_embeddings").select(EMBEDDING_FIELDS).stream()
     recipes = []
     for doc in docs:
-        data = doc.to_dict()
-        if "embedding" in data:
-            recipes.append({
-                "id": doc.id,
-                "embedding": np.array(data["embedding"], dtype=np.float32)
-            })
+        embedding = decode_embedding(doc.to_dict())
+        if embedding is not None:
+            recipes.append({"id": doc.id, "embedding": embedding})
     return recipes
 
+def get_recipe_embeddings_since(app: FastAPI, watermark):
+    """Fetch embeddings written (or tombstoned) after the snapshot watermark"""
+    db = app.state.db
+    docs = (db.collection("recipe_embeddings")
+              .where("updatedAt", ">", watermark)
+              .select([*EMBEDDING_FIELDS, "deleted"])
+              .stream())
+    changes = []
+    for doc in docs:
+        data = doc.to_dict()
+        if data.get("deleted"):
+            changes.append({"id": doc.id, "deleted": True})
+            continue
+        embedding = decode_embedding(data)
+        if embedding is not None:
+            changes.append({"id": doc.id, "embedding": embedding})
+    return changes
+
 
 def get_recipe_details(recipe_id: str, request: Request):
     """Fetch recipe metadata (name, thumbnail, etc.)"""
-    db = request.app.state.db
-    doc = db.collection("recipes").document(recipe_id).get()
-    if not doc.exists:
+    data = get_recipe_doc(request.app.state.db, recipe_id)
+    if data is None:
         return None
-    data = doc.to_dict()
-        
-    data = doc.to_dict()
     data["id"] = recipe_id  # always include the id
     return data
 
-def build_faiss_index(request: Request):
-    global faiss_index, id_mapping
-    recipes = get_all_recipe_embeddings(request)
+def get_recipes_details(recipe_ids: List[str], request: Request) -> List[dict]:
+    """
+    Batched get_recipe_details: cached recipes plus one Firestore round trip for the rest.
+    Keeps the order of recipe_ids and drops ids that no longer exist.
+    """
+    if not recipe_ids:
+        return []
+    docs = get_recipe_docs(request.app.state.db, recipe_ids)
+
+    results = []
+    for rid in recipe_ids:
+        if rid not in docs:
+            continue
+        data = dict(docs[rid])
+        data["id"] = rid
+        results.append(data)
+    return results
+
+def build_faiss_index(app: FastAPI) -> RecipeIndex:
+    recipes = get_all_recipe_embeddings(app)
     if not recipes:
-        return
-    embeddings = np.vstack([r["embedding"] for r in recipes]).astype("float32")
-    faiss.normalize_L2(embeddings)
-    dim = embeddings.shape[1]
-    faiss_index = faiss.IndexFlatIP(dim)
-    faiss_index.add(embeddings)
-    id_mapping = [r["id"] for r in recipes]
-    return faiss_index, id_mapping
\ No newline at end of file
+        return RecipeIndex.empty()
+    embeddings = np.vstack([r["embedding"] for r in recipes]).astype("float32")  # float16 rows upcast here
+    return RecipeIndex.from_embeddings([r["id"] for r in recipes], embeddings)
+
+def apply_index_changes(recipe_index: RecipeIndex, changes: List[dict]) -> None:
+    """Apply get_recipe_embeddings_since() output (upserts and tombstones)"""
+    for change in changes:
+        if change.get("deleted"):
+            recipe_index.remove(change["id"])
+        else:
+            recipe_index.upsert(change["id"], change["embedding"])
+
+def load_or_build_faiss_index(app: FastAPI) -> RecipeIndex:
+    """
+    Start from the local snapshot and only fetch embeddings changed since its watermark.
+    Falls back to a full Firestore scan when there is no usable snapshot.
+    """
+    snapshot = load_snapshot(FAISS_INDEX_TYPE)
+    if snapshot is not None:
+        index, id_mapping, removed, watermark, built_at = snapshot
+        next_watermark = new_watermark()
+        changes = get_recipe_embeddings_since(app, watermark)
+        logger.info(f"Loaded FAISS snapshot ({index.ntotal} vectors), {len(changes)} changed since {watermark}")
+
+        recipe_index = RecipeIndex(index, id_mapping, owned=False, removed=removed)
+        apply_index_changes(recipe_index, changes)
+        recipe_index.watermark = next_watermark
+        recipe_index.built_at = built_at  # a delta save keeps the age of the last full build
+        if changes:
+            recipe_index.persist()
+        return recipe_index
+
+    watermark = new_watermark()
+    recipe_index = build_faiss_index(app)
+    recipe_index.watermark = recipe_index.built_at = watermark
+    recipe_index.persist()
+    return recipe_index
+
+
+# ------------------------
+# Query cache (repeat searches for the same photo)
+# ------------------------
+# Keyed by sha256 of the uploaded bytes, or by normalized URL + ETag.
+# An entry holds the normalized CLIP embedding and, per filter combination,
+# the top-k hits; the hits are only reused while the index version they were
+# computed against is current, after that the embedding alone saves the CLIP
+# forward pass.
+
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "1024"))
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL_SECONDS", "3600"))
+
+query_cache = TTLCache(QUERY_CACHE_SIZE, QUERY_CACHE_TTL)
+_query_counts = {"result_hits": 0, "embedding_hits": 0, "encodes": 0}
+
+def _query_cache_stats() -> dict:
+    return {**query_cache.stats(), **_query_counts}
+
+register_metrics("similarity_query_cache", _query_cache_stats)
+
+MAX_FILTER_RESULTS_PER_QUERY = 8
+
+def make_filters(categories=None, areas=None, minutes_bucket: Optional[str] = None) -> Optional[dict]:
+    """Normalized similarity filters, or None when nothing is filtered"""
+    filters = {
+        "categories": normalize_terms(categories),
+        "areas": normalize_terms(areas),
+        "minutes_bucket": minutes_bucket or None,
+    }
+    return filters if any(filters.values()) else None
+
+def _filters_key(filters: Optional[dict]) -> tuple:
+    return tuple(sorted(filters.items())) if filters else ()
+
+def upload_cache_key(image_bytes: bytes) -> str:
+    return "upload:" + hashlib.sha256(image_bytes).hexdigest()
+
+def normalize_url(url: str) -> str:
+    """Lowercase scheme/host, drop default ports and fragments, sort query params"""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and (scheme, parts.port) not in (("http", 80), ("https", 443)):
+        host = f"{host}:{parts.port}"
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, host, parts.path or "/", query, ""))
+
+def url_cache_key(url: str, etag: str) -> str:
+    return "url:" + hashlib.sha256(f"{normalize_url(url)}\n{etag}".encode()).hexdigest()
+
+async def search_similar(
+    request: Request,
+    top_k: int,
+    cache_key: Optional[str],
+    load_image: Callable[[], Awaitable[Image.Image]],
+    filters: Optional[dict] = None,
+) -> List[Tuple[str, float]]:
+    """
+    [(recipe_id, similarity)] for a query image, going through the query cache.
+    load_image is only awaited on a cache miss. filters come from make_filters().
+    """
+    recipe_index = request.app.state.recipe_index
+    fkey = _filters_key(filters)
+    entry = query_cache.get(cache_key) if cache_key else None
+
+    cached = entry["results"].get(fkey) if entry is not None else None
+    if cached is not None and cached["index_version"] == recipe_index.version and cached["top_k"] >= top_k:
+        _query_counts["result_hits"] += 1
+        return cached["hits"][:top_k]
+
+    if entry is not None:
+        _query_counts["embedding_hits"] += 1  # index changed, new filters or a larger top_k: search again
+        embedding = entry["embedding"]
+    else:
+        _query_counts["encodes"] += 1
+        embedding = await encode_image_batched(await load_image(), request)
+        embedding = embedding.astype("float32") / max(np.linalg.norm(embedding), 1e-12)
+
+    version = recipe_index.version  # read before searching so a concurrent write makes it stale
+    hits = await run_cpu(recipe_index.search, embedding, top_k, filters)
+    if cache_key:
+        if entry is None:
+            entry = {"embedding": embedding, "results": {}}
+        results = entry["results"]
+        results.pop(fkey, None)
+        results[fkey] = {"index_version": version, "top_k": top_k, "hits": hits}
+        while len(results) > MAX_FILTER_RESULTS_PER_QUERY:
+            results.pop(next(iter(results)))  # oldest filter combination
+        query_cache.set(cache_key, entry)
+    return hits
+
+
+# ------------------------
+# Live index updates (recipe create / delete)
+# ------------------------
+
+_deferred_indexing = set()  # recipes created before CLIP loaded, waiting for it
+
+def _embed_upload(image_bytes: bytes, request: Request) -> np.ndarray:
+    return encode_image(decode_image(image_bytes), request)
+
+async def index_recipe_image(request: Request, recipe_id: str, image_bytes: bytes,
+                             recipe: Optional[dict] = None) -> bool:
+    """
+    Embed a newly created recipe's image, add it to the live index and store the embedding.
+    recipe (the created document) supplies the filter attributes. Only the decode
+    and the forward pass use the CPU pool; the Firestore write runs in a plain thread.
+    Before CLIP has loaded, the work is deferred until it has (returns False).
+    """
+    if not is_ready(request.app, "clip"):
+        logger.info(f"CLIP not ready, recipe {recipe_id} will be indexed once it is")
+        task = asyncio.create_task(_index_when_ready(request, recipe_id, image_bytes, recipe),
+                                   name=f"index-recipe-{recipe_id}")
+        _deferred_indexing.add(task)
+        task.add_done_callback(_deferred_indexing.discard)
+        return False
+    try:
+        embedding = await run_cpu(_embed_upload, image_bytes, request)
+        doc = request.app.state.db.collection("recipe_embeddings").document(recipe_id)
+        await asyncio.to_thread(doc.set, {
+            **encode_embedding(embedding),
+            "updatedAt": firestore.SERVER_TIMESTAMP,
+        })
+        if is_ready(request.app, "recipe_index"):
+            attributes = {f: recipe.get(f) for f in ATTRIBUTE_FIELDS} if recipe else None
+            request.app.state.recipe_index.upsert(recipe_id, embedding, attributes)
+        return True
+    except Exception as e:
+        logger.warning(f"Failed to index image for recipe {recipe_id}: {e}")
+        return False
+
+async def _index_when_ready(request: Request, recipe_id: str, image_bytes: bytes,
+                            recipe: Optional[dict]) -> None:
+    if await wait_resource(request.app, "clip"):
+        await index_recipe_image(request, recipe_id, image_bytes, recipe)
+    else:
+        logger.warning(f"CLIP failed to load, recipe {recipe_id} not indexed "
+                       f"(db_init/addRecipeEmbeddings.py embeds it from its thumbnail)")
+
+def remove_recipe_from_index(request: Request, recipe_id: str) -> bool:
+    """Drop a deleted recipe from the live index and tombstone its stored embedding"""
+    removed = False
+    if is_ready(request.app, "recipe_index"):
+        removed = request.app.state.recipe_index.remove(recipe_id)
+    try:
+        # Tombstone (not delete) so other workers' snapshot deltas see the removal
+        request.app.state.db.collection("recipe_embeddings").document(recipe_id).set({
+            "deleted": True,
+            "updatedAt": firestore.SERVER_TIMESTAMP,
+        })
+    except Exception as e:
+        logger.warning(f"Failed to tombstone embedding for recipe {recipe_id}: {e}")
+    return removed
@@ -10,12 +10,14 @@ from app.services.recipes import (
     get_next_step, get_previous_step, get_step, get_step_count
 )
 import numpy as np
-from pydub import AudioSegment
 import io
-import webrtcvad
 import wave
+from functools import lru_cache
+from app.utils.lazy import lazy_import
 
-vad = webrtcvad.Vad(3)  # aggressiveness: 0-3 (3 = most aggressive)
+# Audio deps are imported on first voice request
+pydub = lazy_import("pydub")
+webrtcvad = lazy_import("webrtcvad")
 
 DEBUG_DIR = Path("audio_debug")
 DEBUG_DIR.mkdir(parents=True, exist_ok=True)  # ensure folder exists
@@ -78,7 +80,10 @@ async def voice_agent_inference(request, recipe_id: str, current_step: int, file
     logger.info(f"Delay: {time.time() - elapsed_time}s")
     return res
 
-VAD = webrtcvad.Vad(3)   # 0..3 (2 is a good default)
+@lru_cache(maxsize=1)
+def get_vad():
+    return webrtcvad.Vad(3)   # 0..3 (2 is a good default)
+
 FRAME_MS = 20
 SR = 16000
 BYTES_PER_SAMPLE = 2
@@ -92,7 +97,7 @@ MIN_DURATION_MS = 400    # ignore very short clips
 async def is_voice_present(data: bytes) -> bool:
     try:
         # Decode m4a → PCM16 16kHz mono
-        seg = AudioSegment.from_file(io.BytesIO(data), format="wav")
+        seg = pydub.AudioSegment.from_file(io.BytesIO(data), format="wav")
         seg = seg.set_frame_rate(SR).set_channels(1).set_sample_width(BYTES_PER_SAMPLE)
         pcm = seg.raw_data
 
@@ -113,7 +118,7 @@ async def is_voice_present(data: bytes) -> bool:
             frame = pcm[i:i+FRAME_SIZE]
             if len(frame) < FRAME_SIZE:
                 break
-            if VAD.is_speech(frame, SR):
+            if get_vad().is_speech(frame, SR):
                 voiced_frames += 1
 
         voiced_ms = voiced_frames * FRAME_MS
@@ -148,7 +153,7 @@ async def is_voice_present_pcm(pcm: bytes) -> bool:
             frame = pcm[i:i+FRAME_SIZE]
             if len(frame) < FRAME_SIZE:
                 break
-            if VAD.is_speech(frame, SR):
+            if get_vad().is_speech(frame, SR):
                 voiced_frames += 1
 
         voiced_ms = voiced_frames * FRAME_MS
@@ -0,0 +1,66 @@
+import os
+from typing import Optional
+
+import numpy as np
+from loguru import logger
+
+# ------------------------
+# Stored embedding format (recipe_embeddings, ingredient_embeddings)
+# ------------------------
+# v1 (legacy): "embedding": [512 doubles]          -> ~10 KB per doc on the wire
+# v2:          "embedding_bin":   little-endian float16/float32 bytes (Firestore bytes field)
+#              "embedding_dtype": "float16" | "float32"
+#              "embedding_dim":   512
+#              "embedding_model": "ViT-B/32"        -> 1 KB (float16) per doc
+# Readers accept both; db_init/migrateEmbeddingFormat.py rewrites v1 docs to v2.
+
+EMBEDDING_MODEL = "ViT-B/32"
+EMBEDDING_STORE_DTYPE = os.getenv("EMBEDDING_STORE_DTYPE", "float16")
+
+_WIRE_DTYPES = {"float16": "<f2", "float32": "<f4"}
+
+# Fields a reader needs; pass to query.select() to skip the rest of the document
+EMBEDDING_FIELDS = ["embedding", "embedding_bin", "embedding_dtype", "embedding_dim", "embedding_model"]
+
+
+def encode_embedding(vec, dtype: str = EMBEDDING_STORE_DTYPE, model: str = EMBEDDING_MODEL) -> dict:
+    """Firestore fields for one embedding in the binary format"""
+    if dtype not in _WIRE_DTYPES:
+        raise ValueError(f"Unsupported embedding dtype '{dtype}', expected one of {list(_WIRE_DTYPES)}")
+    arr = np.asarray(vec, dtype=_WIRE_DTYPES[dtype]).ravel()
+    return {
+        "embedding_bin": arr.tobytes(),
+        "embedding_dtype": dtype,
+        "embedding_dim": int(arr.shape[0]),
+        "embedding_model": model,
+    }
+
+
+def decode_embedding(data: dict, model: Optional[str] = EMBEDDING_MODEL) -> Optional[np.ndarray]:
+    """
+    The embedding stored in a document, or None if it has none (or was made
+    by a different model). Binary embeddings are a read-only np.frombuffer
+    view over the document bytes (no copy); legacy lists are converted to float32.
+    """
+    blob = data.get("embedding_bin")
+    if blob is not None:
+        if model and data.get("embedding_model", model) != model:
+            logger.warning(f"Skipping embedding from model {data.get('embedding_model')} (expected {model})")
+            return None
+        dtype = _WIRE_DTYPES.get(data.get("embedding_dtype", "float32"))
+        if dtype is None:
+            raise ValueError(f"Unsupported embedding dtype '{data.get('embedding_dtype')}'")
+        vec = np.frombuffer(blob, dtype=dtype)
+        dim = data.get("embedding_dim")
+        if dim is not None and vec.shape[0] != dim:
+            raise ValueError(f"Embedding has {vec.shape[0]} values, header says {dim}")
+        return vec
+
+    legacy = data.get("embedding")
+    if legacy is not None:
+        return np.asarray(legacy, dtype=np.float32)
+    return None
+
+
+def is_legacy_embedding(data: dict) -> bool:
+    return "embedding" in data and "embedding_bin" not in data
@@ -0,0 +1,46 @@
+import asyncio
+import os
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+# CPU-bound work (image decode, CLIP preprocess / forward, FAISS search) runs
+# here instead of on the event loop. The pool is small and the number of
+# queued jobs is capped, so a burst of similarity queries cannot starve the
+# loop or pile up unbounded work.
+
+CPU_WORKERS = int(os.getenv("CPU_WORKERS", "2"))
+CPU_MAX_PENDING = int(os.getenv("CPU_MAX_PENDING", str(CPU_WORKERS * 8)))
+# Server processes sharing the machine (gunicorn reads the same variable)
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+# torch intra-op threads; WEB_CONCURRENCY * CPU_WORKERS * TORCH_THREADS should not exceed the core count
+TORCH_THREADS = int(os.getenv(
+    "TORCH_THREADS", str(max(1, (os.cpu_count() or 2) // (CPU_WORKERS * WEB_CONCURRENCY)))))
+
+_executor = None
+_pending = weakref.WeakKeyDictionary()  # event loop -> semaphore capping queued + running jobs
+
+
+def cpu_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=CPU_WORKERS, thread_name_prefix="cpu")
+    return _executor
+
+
+async def run_cpu(fn, *args, **kwargs):
+    """Run a blocking CPU-bound call in the shared pool and await its result"""
+    loop = asyncio.get_running_loop()
+    slots = _pending.get(loop)
+    if slots is None:
+        slots = _pending[loop] = asyncio.Semaphore(CPU_MAX_PENDING)
+    async with slots:
+        return await loop.run_in_executor(cpu_executor(), partial(fn, *args, **kwargs))
+
+
+def shutdown_cpu_executor() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+    _pending.clear()
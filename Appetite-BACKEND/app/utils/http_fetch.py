@@ -0,0 +1,106 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, TypeVar
+
+import httpx
+from fastapi import Request
+
+# Remote image fetching for /api/v1/similarity/by-url.
+# One pooled AsyncClient per app (app.state.http); bodies are streamed with a
+# hard byte cap and the Content-Type is checked before any of it is read.
+
+IMAGE_FETCH_MAX_BYTES = int(os.getenv("IMAGE_FETCH_MAX_BYTES", str(10 * 1024 * 1024)))
+IMAGE_FETCH_TIMEOUT = float(os.getenv("IMAGE_FETCH_TIMEOUT_SECONDS", "10"))
+IMAGE_FETCH_MAX_CONNECTIONS = int(os.getenv("IMAGE_FETCH_MAX_CONNECTIONS", "50"))
+DISCONNECT_POLL_SECONDS = 0.25
+
+T = TypeVar("T")
+
+
+class ImageFetchError(ValueError):
+    """Remote image could not be used; status_code is what the API should answer"""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def create_http_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(IMAGE_FETCH_TIMEOUT, connect=5.0),
+        limits=httpx.Limits(
+            max_connections=IMAGE_FETCH_MAX_CONNECTIONS,
+            max_keepalive_connections=IMAGE_FETCH_MAX_CONNECTIONS // 2,
+        ),
+        follow_redirects=True,
+        max_redirects=5,
+    )
+
+
+@asynccontextmanager
+async def open_image(client: httpx.AsyncClient, url: str,
+                     max_bytes: int = IMAGE_FETCH_MAX_BYTES) -> AsyncIterator[httpx.Response]:
+    """
+    Start a GET and hand back the response once the headers are in and look
+    like an image no larger than max_bytes. The body is not read; use
+    read_capped(). Leaving the block early closes the connection.
+    """
+    if not url.lower().startswith(("http://", "https://")):
+        raise ImageFetchError("Only http(s) image URLs are supported")
+    try:
+        async with client.stream("GET", url) as response:
+            if response.status_code >= 400:
+                raise ImageFetchError(f"Image URL returned {response.status_code}", 400)
+
+            content_type = response.headers.get("Content-Type", "").split(";")[0].strip().lower()
+            if not content_type.startswith("image/"):
+                raise ImageFetchError(f"URL is not an image (Content-Type '{content_type or 'missing'}')", 415)
+
+            length = response.headers.get("Content-Length")
+            if length and length.isdigit() and int(length) > max_bytes:
+                raise ImageFetchError(f"Image is larger than {max_bytes} bytes", 413)
+
+            yield response
+    except httpx.TimeoutException:
+        raise ImageFetchError("Timed out fetching image URL", 504)
+    except httpx.HTTPError as e:
+        raise ImageFetchError(f"Could not fetch image URL: {e}", 400)
+
+
+async def read_capped(response: httpx.Response, max_bytes: int = IMAGE_FETCH_MAX_BYTES) -> bytes:
+    """Read the body, aborting as soon as it grows past max_bytes (covers missing / lying Content-Length)"""
+    chunks = []
+    size = 0
+    async for chunk in response.aiter_bytes():
+        size += len(chunk)
+        if size > max_bytes:
+            raise ImageFetchError(f"Image is larger than {max_bytes} bytes", 413)
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+async def fetch_image_bytes(client: httpx.AsyncClient, url: str,
+                            max_bytes: int = IMAGE_FETCH_MAX_BYTES) -> bytes:
+    async with open_image(client, url, max_bytes) as response:
+        return await read_capped(response, max_bytes)
+
+
+async def cancel_on_disconnect(request: Request, work: Awaitable[T],
+                               poll_seconds: float = DISCONNECT_POLL_SECONDS) -> T:
+    """
+    Await work, cancelling it if the client goes away in the meantime
+    (raises ImageFetchError 499 in that case).
+    """
+    task = asyncio.ensure_future(work)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=poll_seconds)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                task.cancel()
+                raise ImageFetchError("Client disconnected", 499)
+    finally:
+        if not task.done():
+            task.cancel()
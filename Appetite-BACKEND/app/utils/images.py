@@ -0,0 +1,50 @@
+import os
+from io import BytesIO
+
+from PIL import Image, ImageOps
+
+# Image ingest for uploads and fetched images.
+# Phone photos are often 12 MP while CLIP looks at 224 px and Gemini at a few
+# hundred, so images are decoded straight to about the size the consumer needs:
+# JPEGs through libjpeg's DCT scaling (draft mode, never decoded at full size),
+# other formats decoded and then shrunk with a cheap integer box reduce().
+# EXIF orientation is applied so portrait photos reach every consumer upright.
+
+CLIP_MIN_SIDE = int(os.getenv("CLIP_DECODE_MIN_SIDE", "224"))        # CLIP preprocess resizes to 224
+GEMINI_MIN_SIDE = int(os.getenv("GEMINI_DECODE_MIN_SIDE", "768"))    # Gemini tiles images at 768
+
+_REDUCE_MODES = ("RGB", "RGBA", "L", "LA")
+
+
+def decode_image(data: bytes, min_side: int = CLIP_MIN_SIDE) -> Image.Image:
+    """
+    Decode image bytes to an upright RGB image whose shorter side is at least
+    min_side (or the original size if smaller). Raises PIL.UnidentifiedImageError
+    / OSError for data that isn't a readable image.
+    """
+    img = Image.open(BytesIO(data))
+    if img.format == "JPEG":
+        img.draft("RGB", (min_side, min_side))  # picks the largest 1/2, 1/4, 1/8 scale that stays >= min_side
+    factor = min(img.size) // min_side
+    if factor >= 2:
+        if img.mode not in _REDUCE_MODES:  # palette / bilevel / CMYK can't be box-averaged as is
+            img = img.convert("RGB")  # keeps img.info (EXIF)
+        img = img.reduce(factor)
+    img = ImageOps.exif_transpose(img)  # after the reduce: rotating the small image is cheaper
+    return img if img.mode == "RGB" else img.convert("RGB")
+
+
+def dhash(image: Image.Image, size: int = 8) -> int:
+    """
+    size*size-bit difference hash: whether each pixel of a (size+1) x size
+    grayscale thumbnail is brighter than its left neighbour. Re-encodes,
+    resizes and small crops of a photo land within a few bits of each other.
+    """
+    small = image.convert("L").resize((size + 1, size), Image.BOX)
+    px = small.tobytes()
+    bits = 0
+    for y in range(size):
+        row = px[y * (size + 1):(y + 1) * (size + 1)]
+        for x in range(size):
+            bits = (bits << 1) | (row[x + 1] > row[x])
+    return bits
@@ -0,0 +1,34 @@
+import importlib
+import types
+
+
+class LazyModule(types.ModuleType):
+    """
+    Stand-in for a heavy module (torch, clip, faiss, ...).
+    The real import happens on first attribute access, so API-only workers
+    that never touch the feature never pay for it.
+    """
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self._lazy_name = name
+        self._module = None
+
+    def _load(self):
+        if self._module is None:
+            self._module = importlib.import_module(self._lazy_name)  # import lock makes this thread-safe
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module '{self._lazy_name}' ({state})>"
+
+
+def lazy_import(name: str) -> LazyModule:
+    return LazyModule(name)
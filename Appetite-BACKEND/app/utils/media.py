@@ -0,0 +1,207 @@
+import io
+import os
+import shutil
+import wave
+from functools import lru_cache
+from math import gcd
+from typing import Dict, Optional, Union
+
+import numpy as np
+from loguru import logger
+from PIL import Image, ImageOps
+
+from app.utils.images import GEMINI_MIN_SIDE, decode_image
+from app.utils.lazy import lazy_import
+from app.utils.metrics import register_metrics
+
+pydub = lazy_import("pydub")
+signal = lazy_import("scipy.signal")
+
+# Media preparation for LLM calls.
+# Handed a PIL image, the Gemini SDK uploads it as lossless WebP (slow to
+# encode, several times the size of a good JPEG), and the voice agent sends
+# 16-bit PCM WAV. Images are instead sent as the original upload when it is
+# already a small upright JPEG / WebP, otherwise downscaled to
+# LLM_IMAGE_MAX_EDGE and re-encoded once. WAV audio is downmixed to mono and
+# resampled to LLM_AUDIO_SAMPLE_RATE (Gemini works on 16 kHz audio).
+# LLM_AUDIO_CODEC=opus also encodes it as Opus through ffmpeg: a tenth of the
+# bytes, but starting ffmpeg costs a few hundred ms, which only pays off on
+# an uplink below ~5 Mbit/s (benchmarks/llm_payload.py). Every request's
+# payload size is logged and counted under llm_requests in /debug/metrics.
+
+LLM_IMAGE_MAX_EDGE = int(os.getenv("LLM_IMAGE_MAX_EDGE", "1024"))
+LLM_IMAGE_FORMAT = os.getenv("LLM_IMAGE_FORMAT", "jpeg").lower()   # jpeg | webp
+LLM_IMAGE_QUALITY = int(os.getenv("LLM_IMAGE_QUALITY", "80"))
+LLM_AUDIO_SAMPLE_RATE = int(os.getenv("LLM_AUDIO_SAMPLE_RATE", "16000"))
+LLM_AUDIO_CODEC = os.getenv("LLM_AUDIO_CODEC", "wav").lower()      # wav | opus (needs ffmpeg)
+LLM_AUDIO_BITRATE = os.getenv("LLM_AUDIO_BITRATE", "24k")
+
+IMAGE_MIME = {"jpeg": "image/jpeg", "webp": "image/webp"}
+PASSTHROUGH_MAX_BYTES_PER_PIXEL = 0.25  # a q80 photo is ~0.1-0.2; more means a needlessly heavy encode
+
+Blob = Dict[str, Union[str, bytes]]  # {"mime_type", "data"}: an inline part for generate_content
+
+
+# ------------------------
+# Images
+# ------------------------
+
+def _passthrough_mime(source: bytes) -> Optional[str]:
+    """Mime type if the upload can be sent as is (reads the header only, no decode)"""
+    try:
+        img = Image.open(io.BytesIO(source))
+    except Exception:
+        return None
+    fmt = (img.format or "").lower()
+    w, h = img.size
+    if fmt not in IMAGE_MIME or img.mode not in ("RGB", "L") or max(w, h) > LLM_IMAGE_MAX_EDGE:
+        return None
+    if len(source) > PASSTHROUGH_MAX_BYTES_PER_PIXEL * w * h:
+        return None
+    if img.getexif().get(0x0112, 1) != 1:  # needs an EXIF rotation: send it upright instead
+        return None
+    return IMAGE_MIME[fmt]
+
+
+def prepare_image(image: Optional[Image.Image] = None, source: Optional[bytes] = None) -> Blob:
+    """
+    Inline image part for an LLM call. source (the original upload) goes as is
+    when it is a small enough upright JPEG / WebP; otherwise image (decoded from
+    source if not given) is shrunk to LLM_IMAGE_MAX_EDGE and encoded once as
+    LLM_IMAGE_FORMAT at LLM_IMAGE_QUALITY.
+    """
+    if source is not None:
+        mime = _passthrough_mime(source)
+        if mime:
+            return {"mime_type": mime, "data": source}
+    if image is None:
+        image = decode_image(source, GEMINI_MIN_SIDE)
+    if max(image.size) > LLM_IMAGE_MAX_EDGE:
+        image = ImageOps.contain(image, (LLM_IMAGE_MAX_EDGE, LLM_IMAGE_MAX_EDGE), Image.BICUBIC)
+    if image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+
+    fmt = LLM_IMAGE_FORMAT if LLM_IMAGE_FORMAT in IMAGE_MIME else "jpeg"
+    out = io.BytesIO()
+    if fmt == "webp":
+        image.save(out, "WEBP", quality=LLM_IMAGE_QUALITY, method=4)
+    else:
+        image.save(out, "JPEG", quality=LLM_IMAGE_QUALITY)
+    return {"mime_type": IMAGE_MIME[fmt], "data": out.getvalue()}
+
+
+# ------------------------
+# Audio
+# ------------------------
+
+def sniff_audio_mime(data: bytes) -> str:
+    if data[:4] == b"RIFF" and data[8:12] == b"WAVE":
+        return "audio/wav"
+    if data[:4] == b"OggS":
+        return "audio/ogg"
+    if data[:4] == b"fLaC":
+        return "audio/flac"
+    if data[:3] == b"ID3" or data[:2] in (b"\xff\xfb", b"\xff\xf3", b"\xff\xf2"):
+        return "audio/mp3"
+    return "audio/mp4"  # m4a from the mobile recorder (what every call used to claim)
+
+
+def _read_wav(data: bytes, rate: int) -> np.ndarray:
+    """WAV bytes -> mono int16 samples at rate"""
+    with wave.open(io.BytesIO(data), "rb") as wf:
+        channels, width, src_rate = wf.getnchannels(), wf.getsampwidth(), wf.getframerate()
+        frames = wf.readframes(wf.getnframes())
+    if width == 1:
+        samples = (np.frombuffer(frames, dtype=np.uint8).astype(np.float32) - 128) * 256
+    elif width == 2:
+        samples = np.frombuffer(frames, dtype="<i2").astype(np.float32)
+    elif width == 4:
+        samples = np.frombuffer(frames, dtype="<i4").astype(np.float32) / 65536
+    else:
+        raise ValueError(f"unsupported WAV sample width {width}")
+    samples = samples[:len(samples) - len(samples) % channels].reshape(-1, channels).mean(axis=1)
+    if src_rate != rate:
+        g = gcd(src_rate, rate)
+        samples = signal.resample_poly(samples, rate // g, src_rate // g)  # low-passed, no aliasing
+    return np.clip(samples, -32768, 32767).astype(np.int16)
+
+
+def _wav_bytes(samples: np.ndarray, rate: int) -> bytes:
+    out = io.BytesIO()
+    with wave.open(out, "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(rate)
+        wf.writeframes(samples.tobytes())
+    return out.getvalue()
+
+
+@lru_cache(maxsize=1)
+def ffmpeg_available() -> bool:
+    found = shutil.which("ffmpeg") is not None
+    if not found and LLM_AUDIO_CODEC == "opus":
+        logger.warning("LLM_AUDIO_CODEC=opus but ffmpeg is not installed: sending WAV")
+    return found
+
+
+def prepare_audio(data: bytes) -> Blob:
+    """
+    Inline audio part for an LLM call. WAV becomes LLM_AUDIO_SAMPLE_RATE mono
+    WAV, or Opus in Ogg (LLM_AUDIO_BITRATE) with LLM_AUDIO_CODEC=opus and ffmpeg.
+    Already compressed formats are sent as is, under their real mime type.
+    """
+    mime = sniff_audio_mime(data)
+    if mime != "audio/wav":
+        return {"mime_type": mime, "data": data}
+    try:
+        samples = _read_wav(data, LLM_AUDIO_SAMPLE_RATE)
+    except (wave.Error, EOFError, ValueError) as e:
+        logger.warning(f"Unreadable WAV, sending it unchanged: {e}")
+        return {"mime_type": mime, "data": data}
+
+    if LLM_AUDIO_CODEC == "opus" and ffmpeg_available():
+        try:
+            segment = pydub.AudioSegment(data=samples.tobytes(), sample_width=2,
+                                         frame_rate=LLM_AUDIO_SAMPLE_RATE, channels=1)
+            out = io.BytesIO()
+            segment.export(out, format="ogg", codec="libopus", bitrate=LLM_AUDIO_BITRATE)
+            return {"mime_type": "audio/ogg", "data": out.getvalue()}
+        except Exception as e:
+            logger.warning(f"Opus encoding failed, sending WAV: {e}")
+    return {"mime_type": "audio/wav", "data": _wav_bytes(samples, LLM_AUDIO_SAMPLE_RATE)}
+
+
+# ------------------------
+# Request size metric
+# ------------------------
+
+_requests: Dict[str, dict] = {}  # call name -> counters
+
+register_metrics("llm_requests", lambda: {
+    call: {**c, "avg_bytes": round(c["bytes"] / c["calls"]) if c["calls"] else 0}
+    for call, c in _requests.items()
+})
+
+
+def payload_bytes(contents) -> int:
+    """Bytes of prompt text plus inline media in generate_content contents"""
+    parts = contents if isinstance(contents, (list, tuple)) else [contents]
+    total = 0
+    for part in parts:
+        if isinstance(part, str):
+            total += len(part.encode())
+        elif isinstance(part, dict) and "data" in part:
+            total += len(part["data"])
+    return total
+
+
+def record_request(call: str, contents) -> int:
+    """Log and count the payload size of one LLM request; returns it"""
+    size = payload_bytes(contents)
+    counters = _requests.setdefault(call, {"calls": 0, "bytes": 0, "max_bytes": 0, "last_bytes": 0})
+    counters["calls"] += 1
+    counters["bytes"] += size
+    counters["max_bytes"] = max(counters["max_bytes"], size)
+    counters["last_bytes"] = size
+    logger.info(f"LLM request {call}: {size} bytes")
+    return size
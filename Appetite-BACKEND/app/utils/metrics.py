@@ -0,0 +1,14 @@
+from typing import Callable, Dict
+
+# In-process metrics: components register a callable returning a dict of
+# current values; GET /api/v1/debug/metrics returns all of them.
+
+_sources: Dict[str, Callable[[], dict]] = {}
+
+
+def register_metrics(name: str, source: Callable[[], dict]) -> None:
+    _sources[name] = source
+
+
+def collect_metrics() -> Dict[str, dict]:
+    return {name: source() for name, source in _sources.items()}
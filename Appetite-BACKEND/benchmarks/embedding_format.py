@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Size and decode cost of the stored embedding formats (app/utils/embedding_codec.py).
+
+Encodes synthetic CLIP-sized vectors as Firestore protobuf Values the way the
+client library sends them, then times the client-side decode path the index
+build uses (protobuf -> Python -> numpy) for:
+
+  list     legacy "embedding": [doubles]
+  float32  embedding_bin, little-endian float32
+  float16  embedding_bin, little-endian float16
+
+  python -m benchmarks.embedding_format --n 5000 --dim 512
+
+No Firestore access needed; network time scales with the wire bytes column.
+"""
+import argparse
+import time
+
+import numpy as np
+from google.cloud.firestore_v1 import _helpers
+
+from app.utils.embedding_codec import decode_embedding, encode_embedding
+
+
+def encode_docs(vectors: np.ndarray, fmt: str):
+    if fmt == "list":
+        return [_helpers.encode_dict({"embedding": v.tolist()}) for v in vectors]
+    return [_helpers.encode_dict(encode_embedding(v, dtype=fmt)) for v in vectors]
+
+
+def build_matrix(encoded) -> np.ndarray:
+    rows = [decode_embedding(_helpers.decode_dict(fields, None)) for fields in encoded]
+    return np.vstack(rows).astype("float32")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=5000)
+    parser.add_argument("--dim", type=int, default=512)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(args.n, args.dim)).astype("float32")
+    reference = None
+
+    print(f"{args.n} vectors, dim={args.dim}\n")
+    print(f"{'format':<8} {'wire KB/doc':>11} {'total MB':>9} {'decode s':>9} {'us/doc':>7} {'max abs err':>12}")
+    for fmt in ("list", "float32", "float16"):
+        encoded = encode_docs(vectors, fmt)
+        wire = sum(sum(v._pb.ByteSize() for v in fields.values()) for fields in encoded)
+
+        t0 = time.perf_counter()
+        matrix = build_matrix(encoded)
+        took = time.perf_counter() - t0
+
+        if reference is None:
+            reference = matrix
+        err = float(np.abs(matrix - reference).max())
+        print(f"{fmt:<8} {wire / args.n / 1024:>11.2f} {wire / 1e6:>9.1f} {took:>9.2f} "
+              f"{took / args.n * 1e6:>7.0f} {err:>12.2e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Decode time and peak memory of uploaded photos: full decode vs decode_image.
+
+  full      Image.open(...).convert("RGB")   (what the endpoints used to do)
+  clip      decode_image(data)                shorter side >= CLIP_MIN_SIDE
+  gemini    decode_image(data, GEMINI_MIN_SIDE)
+
+over synthetic photo-like images (smooth gradients + sensor noise) at common
+phone resolutions, saved as JPEG / PNG / WebP. "+resize ms" adds the bicubic
+resize to 224 px that CLIP's preprocess does next, which also gets cheaper when
+the decoded image is small:
+
+  python -m benchmarks.image_decode --repeat 5
+
+Peak memory is the rise of the high-water mark (VmHWM) during one decode in a
+fresh process, so freed buffers of earlier runs can't be reused (Linux only).
+Pillow allocates image buffers outside the Python heap, so tracemalloc would
+not see them.
+"""
+import argparse
+import multiprocessing as mp
+import time
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+
+from app.utils.images import CLIP_MIN_SIDE, GEMINI_MIN_SIDE, decode_image
+
+SIZES = {"12MP": (4032, 3024), "3MP": (2016, 1512), "1MP": (1280, 960)}
+FORMATS = {"JPEG": {"quality": 90}, "PNG": {}, "WEBP": {"quality": 85}}
+DECODERS = {
+    "full": lambda data: Image.open(BytesIO(data)).convert("RGB"),
+    "clip": lambda data: decode_image(data, CLIP_MIN_SIDE),
+    "gemini": lambda data: decode_image(data, GEMINI_MIN_SIDE),
+}
+
+
+def photo_like(width: int, height: int) -> Image.Image:
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[0:height, 0:width].astype("float32")
+    base = np.stack([x / width, y / height, (x + y) / (width + height)], axis=-1) * 200
+    noise = rng.normal(scale=6, size=(height, width, 3)).astype("float32")
+    return Image.fromarray(np.clip(base + noise + 20, 0, 255).astype("uint8"))
+
+
+def clip_resize(img: Image.Image) -> Image.Image:
+    scale = 224 / min(img.size)
+    return img.resize((round(img.width * scale), round(img.height * scale)), Image.BICUBIC)
+
+
+def _status_kb(field: str) -> int:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1])
+    return 0
+
+
+def peak_mb(decoder: str, data: bytes) -> float:
+    with open("/proc/self/clear_refs", "w") as f:
+        f.write("5")  # reset VmHWM to the current RSS
+    before = _status_kb("VmRSS")
+    DECODERS[decoder](data)
+    return (_status_kb("VmHWM") - before) / 1024
+
+
+def fresh_peak_mb(decoder: str, data: bytes) -> float:
+    with ProcessPoolExecutor(1, mp_context=mp.get_context("spawn"), max_tasks_per_child=1) as pool:
+        return pool.submit(peak_mb, decoder, data).result()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'image':<12} {'KB':>6} {'decoder':<7} {'output':>10} {'ms':>7} {'+resize ms':>10} {'peak MB':>8}")
+    for size_name, (w, h) in SIZES.items():
+        source = photo_like(w, h)
+        for fmt, options in FORMATS.items():
+            buf = BytesIO()
+            source.save(buf, fmt, **options)
+            data = buf.getvalue()
+            for name, decode in DECODERS.items():
+                decode(data)  # warm up codec tables
+                t0 = time.perf_counter()
+                for _ in range(args.repeat):
+                    out = decode(data)
+                took = (time.perf_counter() - t0) / args.repeat
+                t0 = time.perf_counter()
+                for _ in range(args.repeat):
+                    clip_resize(out)
+                resize = (time.perf_counter() - t0) / args.repeat
+                size = f"{out.width}x{out.height}"
+                del out
+                print(f"{size_name + ' ' + fmt:<12} {len(data) // 1024:>6} {name:<7} {size:>10} "
+                      f"{took * 1000:>7.1f} {(took + resize) * 1000:>10.1f} {fresh_peak_mb(name, data):>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
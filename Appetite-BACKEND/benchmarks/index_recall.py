@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Recall@k vs latency report for the recipe similarity index types.
+
+Loads the stored CLIP embeddings (Firestore `recipe_embeddings`, or an .npy
+file with --npy), builds every FAISS_INDEX_TYPE the server supports and
+compares each against exact Flat search:
+
+  python -m benchmarks.index_recall --k 8 --queries 500
+  python -m benchmarks.index_recall --npy embeddings.npy
+
+Queries are sampled from the stored vectors with a little noise added, so the
+report reflects "photo of a dish we already have" lookups.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from app.services import recipe_index as ri
+from app.utils.embedding_codec import EMBEDDING_FIELDS, decode_embedding
+from app.utils.lazy import lazy_import
+
+faiss = lazy_import("faiss")
+
+HNSW_EF_SEARCH = [16, 32, 64, 128]
+IVF_NPROBE = [1, 4, 16, 64]
+
+
+def load_firestore_embeddings() -> np.ndarray:
+    import os
+    import firebase_admin
+    from firebase_admin import credentials, firestore
+
+    if not firebase_admin._apps:
+        cred_path = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
+        if cred_path and os.path.isfile(cred_path):
+            firebase_admin.initialize_app(credentials.Certificate(cred_path))
+        else:
+            firebase_admin.initialize_app()
+    db = firestore.client()
+    docs = db.collection("recipe_embeddings").select(EMBEDDING_FIELDS).stream()
+    rows = [decode_embedding(d.to_dict()) for d in docs]
+    return np.vstack([r for r in rows if r is not None]).astype("float32")
+
+
+def timed_search(index, queries: np.ndarray, k: int, params=None):
+    """Search one query at a time (like the API does); returns labels and per-query latency in us"""
+    labels = np.empty((len(queries), k), dtype="int64")
+    lat = np.empty(len(queries))
+    for i, q in enumerate(queries):
+        t0 = time.perf_counter()
+        _, lab = index.search(q[None, :], k, params=params)
+        lat[i] = (time.perf_counter() - t0) * 1e6
+        labels[i] = lab[0]
+    return labels, lat
+
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    hits = sum(len(np.intersect1d(f[f >= 0], t)) for f, t in zip(found, truth))
+    return hits / truth.size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--npy", help="load embeddings from an .npy file instead of Firestore")
+    parser.add_argument("--k", type=int, default=8)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--noise", type=float, default=0.05, help="query noise (fraction of vector norm)")
+    args = parser.parse_args()
+
+    xb = np.load(args.npy).astype("float32") if args.npy else load_firestore_embeddings()
+    faiss.normalize_L2(xb)
+    n, dim = xb.shape
+
+    rng = np.random.default_rng(0)
+    xq = xb[rng.choice(n, size=min(args.queries, n), replace=False)].copy()
+    xq += rng.normal(scale=args.noise / np.sqrt(dim), size=xq.shape).astype("float32")
+    faiss.normalize_L2(xq)
+
+    print(f"{n} vectors, dim={dim}, {len(xq)} queries, k={args.k}\n")
+    print(f"{'index':<10} {'param':<13} {'build s':>8} {'size MB':>8} {'recall@k':>9} {'p50 us':>8} {'p99 us':>8}")
+
+    truth = None
+    for index_type in ri.INDEX_TYPES:
+        t0 = time.perf_counter()
+        index, effective = ri.make_index(index_type, dim, n)
+        if effective != index_type:
+            print(f"{index_type:<10} skipped: not enough vectors to train")
+            continue
+        ri.train_index(index, xb)
+        index.add(xb)
+        build_s = time.perf_counter() - t0
+        size_mb = len(faiss.serialize_index(index)) / 1e6
+
+        if index_type == "hnsw":
+            sweep = [(f"efSearch={ef}", faiss.SearchParametersHNSW(efSearch=ef)) for ef in HNSW_EF_SEARCH]
+        elif index_type in ("ivfflat", "ivfpq"):
+            sweep = [(f"nprobe={p}", faiss.SearchParametersIVF(nprobe=p)) for p in IVF_NPROBE if p <= index.nlist]
+        else:
+            sweep = [("exact", None)]
+
+        for label, params in sweep:
+            found, lat = timed_search(index, xq, args.k, params)
+            if truth is None:
+                truth = found  # flat runs first
+            print(f"{index_type:<10} {label:<13} {build_s:>8.2f} {size_mb:>8.1f} "
+                  f"{recall_at_k(found, truth):>9.3f} {np.percentile(lat, 50):>8.0f} {np.percentile(lat, 99):>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
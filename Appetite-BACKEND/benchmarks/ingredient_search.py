@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Ingredient search latency on a synthetic catalog.
+
+Builds a catalog of --recipes recipes over a --vocab ingredient vocabulary with
+Zipf-like ingredient popularity (a few staples in most recipes, a long tail of
+rare ones), then times pantry queries against:
+
+  scan    the previous per-recipe loop (set intersection + score for every recipe)
+  overlap RecipeIngredientIndex, IDF-weighted overlap
+  coverage RecipeIngredientIndex, share of each recipe the pantry covers
+
+  python -m benchmarks.ingredient_search --recipes 100000 --queries 200
+
+The scan runs over in-memory dicts, so its numbers leave out the Firestore
+stream the old endpoint paid for on top.
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+
+from app.services.recipe_ingredient_index import RecipeIngredientIndex
+
+
+def make_catalog(n_recipes: int, n_vocab: int, seed: int):
+    rng = random.Random(seed)
+    vocab = [f"ingredient {i}" for i in range(n_vocab)]
+    weights = [1.0 / (rank + 1) ** 1.1 for rank in range(n_vocab)]
+    recipes = {}
+    for i in range(n_recipes):
+        size = rng.randint(4, 14)
+        recipes[f"r{i}"] = (f"Recipe {i}", list(dict.fromkeys(rng.choices(vocab, weights=weights, k=size))))
+    return vocab, weights, recipes
+
+
+def make_pantries(vocab, weights, n_queries: int, seed: int):
+    rng = random.Random(seed + 1)
+    return [list(dict.fromkeys(rng.choices(vocab, weights=weights, k=rng.randint(3, 12)))) for _ in range(n_queries)]
+
+
+def scan(recipes, query, top_k):
+    """Shape of the old search: every recipe, set intersection, Python scoring"""
+    query = set(query)
+    results = []
+    for rid, (name, ingredients) in recipes.items():
+        overlap = set(ingredients) & query
+        if overlap:
+            results.append((2.0 * len(overlap), len(overlap), name, rid))
+    results.sort(reverse=True)
+    return results[:top_k]
+
+
+def timed(fn, queries):
+    samples = []
+    for q in queries:
+        t0 = time.perf_counter()
+        fn(q)
+        samples.append((time.perf_counter() - t0) * 1000)
+    return np.percentile(samples, 50), np.percentile(samples, 95)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--recipes", type=int, default=100_000)
+    parser.add_argument("--vocab", type=int, default=3_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    vocab, weights, recipes = make_catalog(args.recipes, args.vocab, args.seed)
+    pantries = make_pantries(vocab, weights, args.queries, args.seed)
+    nnz = sum(len(ingredients) for _, ingredients in recipes.values())
+    print(f"{args.recipes} recipes, {args.vocab} ingredients, {nnz} recipe-ingredient pairs, {args.queries} pantries")
+
+    index = RecipeIngredientIndex()
+    t0 = time.perf_counter()
+    for rid, (name, ingredients) in recipes.items():
+        index.set_recipe(rid, name, ingredients)
+    t1 = time.perf_counter()
+    index.search(["ingredient 0"], 1)  # first search compiles the matrix
+    t2 = time.perf_counter()
+    print(f"index build {t1 - t0:.2f} s, matrix compile {(t2 - t1) * 1000:.0f} ms")
+
+    # Recompile after a single write (what the first search after a recipe create pays)
+    index.set_recipe("new", "New", ["ingredient 1", "ingredient 2"])
+    t0 = time.perf_counter()
+    index.search(["ingredient 0"], 1)
+    print(f"recompile after one write {(time.perf_counter() - t0) * 1000:.0f} ms")
+
+    print(f"\n{'method':<10} {'p50 ms':>8} {'p95 ms':>8}")
+    scan_queries = pantries[:max(1, len(pantries) // 10)]  # the scan is slow; a sample is enough
+    for name, fn, queries in [
+        ("scan", lambda q: scan(recipes, q, args.top_k), scan_queries),
+        ("overlap", lambda q: index.search(q, args.top_k, "overlap"), pantries),
+        ("coverage", lambda q: index.search(q, args.top_k, "coverage"), pantries),
+    ]:
+        p50, p95 = timed(fn, queries)
+        print(f"{name:<10} {p50:>8.2f} {p95:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
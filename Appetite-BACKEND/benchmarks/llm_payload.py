@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Payload size and end-to-end latency of Gemini requests, before / after media
+preparation (app.utils.media), against a local stub endpoint.
+
+The stub speaks just enough of the REST generateContent API: it reads the
+request, waits as long as --uplink-mbps would take to upload it, and returns a
+canned answer. Requests are JSON with base64 inline data, as the SDK's REST
+transport sends them.
+
+  image  a --image photo (default: a synthetic 4032x3024 JPEG)
+           before  decoded at GEMINI_MIN_SIDE and sent as a PIL image, which the
+                   SDK encodes as lossless WebP
+           after   prepare_image(decoded image, upload bytes)
+  audio  a 5 s 16 kHz mono WAV (the voice websocket) and a 44.1 kHz stereo WAV
+           before  the WAV as is
+           after   prepare_audio: 16 kHz mono WAV
+           opus    prepare_audio with LLM_AUDIO_CODEC=opus (only when ffmpeg is installed)
+
+  python -m benchmarks.llm_payload --uplink-mbps 20 --repeat 5
+
+"e2e" is preparation + request + response, i.e. what the caller waits for
+beyond the model's own processing time.
+"""
+import argparse
+import base64
+import io
+import json
+import threading
+import time
+import wave
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import numpy as np
+from PIL import Image
+
+from app.utils.images import GEMINI_MIN_SIDE, decode_image
+from app.utils import media
+from app.utils.media import ffmpeg_available, prepare_audio, prepare_image
+
+PROMPT = "Extract a clean JSON array of ingredients visible in this image."
+REPLY = json.dumps({"candidates": [{"content": {"parts": [{"text": "[\"tomato\"]"}]}}]}).encode()
+
+
+def start_stub(uplink_mbps: float) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers["Content-Length"]))
+            if uplink_mbps > 0:
+                time.sleep(len(body) * 8 / (uplink_mbps * 1e6))
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(REPLY)))
+            self.end_headers()
+            self.wfile.write(REPLY)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def request_body(blob: dict) -> bytes:
+    return json.dumps({"contents": [{"parts": [
+        {"text": PROMPT},
+        {"inline_data": {"mime_type": blob["mime_type"], "data": base64.b64encode(blob["data"]).decode()}},
+    ]}]}).encode()
+
+
+def synthetic_photo(size=(4032, 3024), seed=0) -> bytes:
+    # smooth regions plus sensor-like noise: compresses about like a phone photo
+    rng = np.random.default_rng(seed)
+    base = Image.fromarray(rng.integers(0, 256, (36, 48, 3), dtype=np.uint8)).resize(size, Image.BICUBIC)
+    pixels = np.asarray(base, dtype=np.int16) + rng.normal(0, 6, (size[1], size[0], 3)).astype(np.int16)
+    out = io.BytesIO()
+    Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8)).save(out, "JPEG", quality=90)
+    return out.getvalue()
+
+
+def synthetic_wav(seconds: float, rate: int, channels: int, seed=0) -> bytes:
+    # a few harmonics with a syllable-rate envelope plus background noise
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * rate)) / rate
+    voice = sum(np.sin(2 * np.pi * f * t) / (i + 1) for i, f in enumerate((180, 360, 720, 1440)))
+    voice *= 0.5 + 0.5 * np.sin(2 * np.pi * 4 * t)
+    samples = (0.2 * voice + 0.02 * rng.normal(size=len(t))) * 32767 / 2
+    out = io.BytesIO()
+    with wave.open(out, "wb") as wf:
+        wf.setnchannels(channels)
+        wf.setsampwidth(2)
+        wf.setframerate(rate)
+        wf.writeframes(np.repeat(samples.astype("<i2"), channels).tobytes())
+    return out.getvalue()
+
+
+def lossless_webp(img: Image.Image) -> dict:
+    out = io.BytesIO()
+    img.save(out, "WEBP", lossless=True)  # what the SDK does with a PIL image
+    return {"mime_type": "image/webp", "data": out.getvalue()}
+
+
+def opus(wav: bytes) -> dict:
+    media.LLM_AUDIO_CODEC = "opus"
+    try:
+        return prepare_audio(wav)
+    finally:
+        media.LLM_AUDIO_CODEC = "wav"
+
+
+def measure(client: httpx.Client, url: str, prepare, repeat: int):
+    prep_ms, e2e_ms, blob = [], [], None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        blob = prepare()
+        t1 = time.perf_counter()
+        client.post(url, content=request_body(blob), headers={"Content-Type": "application/json"}).raise_for_status()
+        t2 = time.perf_counter()
+        prep_ms.append((t1 - t0) * 1000)
+        e2e_ms.append((t2 - t0) * 1000)
+    return blob, float(np.median(prep_ms)), float(np.median(e2e_ms))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--image", help="photo to send (default: synthetic 4032x3024 JPEG)")
+    parser.add_argument("--uplink-mbps", type=float, default=20.0, help="simulated upload bandwidth, 0 = unlimited")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    photo = open(args.image, "rb").read() if args.image else synthetic_photo()
+    cases = [
+        ("image", "before", lambda: lossless_webp(decode_image(photo, GEMINI_MIN_SIDE))),
+        ("image", "after", lambda: prepare_image(decode_image(photo, GEMINI_MIN_SIDE), photo)),
+    ]
+    for label, wav in [("audio 16k mono", synthetic_wav(5, 16000, 1)), ("audio 44k stereo", synthetic_wav(5, 44100, 2))]:
+        cases += [
+            (label, "before", lambda wav=wav: {"mime_type": "audio/wav", "data": wav}),
+            (label, "after", lambda wav=wav: prepare_audio(wav)),
+        ]
+        if ffmpeg_available():
+            cases.append((label, "opus", lambda wav=wav: opus(wav)))
+
+    server = start_stub(args.uplink_mbps)
+    url = f"http://127.0.0.1:{server.server_address[1]}/v1beta/models/gemini-2.5-flash:generateContent"
+    print(f"upload {len(photo) / 1024:.0f} KB photo, uplink {args.uplink_mbps or 'unlimited'} Mbit/s, "
+          f"ffmpeg {'found' if ffmpeg_available() else 'missing (no opus rows)'}, median of {args.repeat}\n")
+    print(f"{'case':<18} {'variant':<7} {'mime':<11} {'payload KB':>10} {'request KB':>10} {'prep ms':>8} {'e2e ms':>8}")
+    with httpx.Client(timeout=120) as client:
+        for label, variant, prepare in cases:
+            blob, prep, e2e = measure(client, url, prepare, args.repeat)
+            print(f"{label:<18} {variant:<7} {blob['mime_type']:<11} {len(blob['data']) / 1024:>10.1f} "
+                  f"{len(request_body(blob)) / 1024:>10.1f} {prep:>8.1f} {e2e:>8.1f}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
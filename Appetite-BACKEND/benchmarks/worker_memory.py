@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Per-worker memory with and without preload-then-fork (gunicorn.conf.py).
+
+Forks --workers processes the way gunicorn does and has each one load CLIP
+and a flat recipe index of --n synthetic vectors, then run a search and one
+CLIP forward pass:
+
+  independent  every worker loads its own CLIP weights and builds its index
+               in memory (what N plain uvicorn/gunicorn workers do)
+  preload      the parent loads CLIP (preload_clip_model) and writes the FAISS
+               snapshot; workers adopt the weights and mmap the snapshot
+
+  python -m benchmarks.worker_memory --workers 4 --n 20000
+
+Reads /proc/<pid>/smaps_rollup (Linux). RSS counts shared pages in full in
+every process; PSS splits them between the processes mapping them, so the
+PSS sum is the real footprint of the whole server.
+"""
+import argparse
+import gc
+import multiprocessing as mp
+import os
+import tempfile
+from types import SimpleNamespace
+
+import numpy as np
+
+os.environ.setdefault("FAISS_SNAPSHOT_DIR", tempfile.mkdtemp(prefix="worker-memory-"))
+
+from app.services import searchSimRecipe as ssr  # noqa: E402
+from app.services.index_snapshot import load_snapshot, new_watermark  # noqa: E402
+from app.services.recipe_index import FAISS_INDEX_TYPE, RecipeIndex  # noqa: E402
+
+FIELDS = ("Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty")
+
+
+def memory_mb(pid: str = "self") -> dict:
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            key, _, rest = line.partition(":")
+            if key in FIELDS:
+                values[key] = int(rest.split()[0]) / 1024
+    return values
+
+
+def synthetic(n: int, dim: int = 512):
+    rng = np.random.default_rng(0)
+    return [f"r{i}" for i in range(n)], rng.normal(size=(n, dim)).astype("float32")
+
+
+def worker(mode: str, n: int, ready, measure, results):
+    app = SimpleNamespace(state=SimpleNamespace())
+    ssr.load_clip_model(app)  # adopts the preloaded weights if the parent has them
+    if mode == "preload":
+        index, id_mapping, removed, _ = load_snapshot(FAISS_INDEX_TYPE)
+        recipe_index = RecipeIndex(index, id_mapping, owned=False, removed=removed)
+    else:
+        recipe_index = RecipeIndex.from_embeddings(*synthetic(n))  # stands in for the Firestore scan
+    recipe_index.search(np.ones(recipe_index.dim, dtype="float32"), 10)
+
+    ready.wait()
+    measure.wait()  # measure while every worker is alive: PSS depends on who shares the pages
+    results.put((os.getpid(), memory_mb()))
+    ready.wait()
+
+
+def run(mode: str, workers: int, n: int) -> None:
+    if mode == "preload":
+        ids, embeddings = synthetic(n)
+        recipe_index = RecipeIndex.from_embeddings(ids, embeddings)
+        recipe_index.watermark = new_watermark()
+        recipe_index.persist()
+        del ids, embeddings, recipe_index
+        ssr.preload_clip_model()
+        gc.freeze()
+
+    ctx = mp.get_context("fork")
+    ready, measure = ctx.Barrier(workers + 1), ctx.Barrier(workers + 1)
+    results = ctx.Queue()
+    procs = [ctx.Process(target=worker, args=(mode, n, ready, measure, results)) for _ in range(workers)]
+    for p in procs:
+        p.start()
+    ready.wait()
+    measure.wait()
+    rows = [results.get() for _ in procs]
+    parent = memory_mb()
+    ready.wait()
+    for p in procs:
+        p.join()
+
+    print(f"\n{mode}: {workers} workers, {n} vectors")
+    print(f"{'process':<10} " + " ".join(f"{f:>13}" for f in FIELDS))
+    print(f"{'parent':<10} " + " ".join(f"{parent[f]:>13.0f}" for f in FIELDS))
+    for pid, mem in rows:
+        print(f"{pid:<10} " + " ".join(f"{mem[f]:>13.0f}" for f in FIELDS))
+    total = parent["Pss"] + sum(mem["Pss"] for _, mem in rows)
+    print(f"total PSS (parent + workers): {total:.0f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--n", type=int, default=20000)
+    parser.add_argument("--mode", choices=["independent", "preload", "both"], default="both")
+    args = parser.parse_args()
+
+    # Each mode runs in a fresh interpreter so the first can't leave weights behind for the second
+    if args.mode == "both":
+        for mode in ("independent", "preload"):
+            ctx = mp.get_context("spawn")
+            p = ctx.Process(target=run, args=(mode, args.workers, args.n))
+            p.start()
+            p.join()
+    else:
+        run(args.mode, args.workers, args.n)
+
+
+if __name__ == "__main__":
+    main()
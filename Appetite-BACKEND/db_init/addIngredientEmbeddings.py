@@ -1,44 +1,130 @@
-import torch
-import clip
+#!/usr/bin/env python3
+"""
+Embed the ingredient vocabulary with CLIP into ingredient_embeddings.
+
+The vocabulary is every distinct ingredient_names entry across recipes
+(read with a projection, not whole documents), normalized the way the server
+matches them (app/services/ingredient_index.normalize_ingredient). Only terms
+without an embedding from the current model are encoded, BATCH_SIZE texts
+per CLIP forward pass, and written through a BulkWriter. A refresh after an
+import therefore only pays for the new terms.
+
+Run from Appetite-BACKEND:
+  python db_init/addIngredientEmbeddings.py
+Set FORCE = True to re-embed the whole vocabulary.
+"""
+
+import os
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Callable, Iterable, List, Set
+
 import firebase_admin
+import numpy as np
 from firebase_admin import credentials, firestore
 
-# --- Init Firebase ---
-cred = credentials.Certificate("D:/MobileFinal/Appetite-BACKEND/app/serviceAccount.json")
-firebase_admin.initialize_app(cred)
-db = firestore.client()
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))  # for app.*
+from app.services.ingredient_index import encode_texts, normalize_ingredient
+from app.utils.embedding_codec import EMBEDDING_MODEL, encode_embedding
 
-# --- Load CLIP ---
-device = "cuda" if torch.cuda.is_available() else "cpu"
-model, preprocess = clip.load("ViT-B/32", device=device)
+# -------- CONFIG --------
+BATCH_SIZE = 256            # texts per CLIP forward pass
+FORCE = False               # True: re-embed terms that already have an embedding
+WRITE_ATTEMPTS = 5          # BulkWriter retries per write
+# ------------------------
 
-def encode_text(text: str):
-    """Encode a single ingredient name into CLIP embedding"""
-    tokens = clip.tokenize([text]).to(device)
-    with torch.no_grad():
-        features = model.encode_text(tokens)
-    return features.cpu().numpy().flatten()
+def ensure_app():
+    if not firebase_admin._apps:
+        cred_path = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
+        if cred_path and os.path.isfile(cred_path):
+            firebase_admin.initialize_app(credentials.Certificate(cred_path))
+        else:
+            firebase_admin.initialize_app()  # ADC / Emulator
+    return firestore.client()
 
-def embed_all_ingredients():
+def collect_vocabulary(recipes: Iterable[dict]) -> Set[str]:
     vocab = set()
+    for data in recipes:
+        for name in data.get("ingredient_names") or []:
+            if isinstance(name, str) and name.strip():
+                vocab.add(normalize_ingredient(name))
+    return vocab
+
+def embedded_terms(db) -> Set[str]:
+    """Terms that already have an embedding from EMBEDDING_MODEL (legacy list docs count as ViT-B/32)"""
+    docs = db.collection("ingredient_embeddings").select(["embedding_model"]).stream()
+    return {
+        normalize_ingredient(doc.id) for doc in docs
+        if (doc.to_dict() or {}).get("embedding_model", EMBEDDING_MODEL) == EMBEDDING_MODEL
+    }
+
+def missing_terms(vocab: Set[str], existing: Set[str]) -> List[str]:
+    todo = []
+    for term in sorted(vocab if FORCE else vocab - existing):
+        if "/" in term or term in (".", ".."):  # not a valid document id
+            print(f"⚠️ Skipping '{term}' (cannot be a document id)")
+            continue
+        todo.append(term)
+    return todo
+
+def encode_in_batches(terms: List[str], encode: Callable[[List[str]], np.ndarray],
+                      write: Callable[[str, np.ndarray], None]) -> int:
+    """encode BATCH_SIZE terms at a time and hand each row to write; returns terms encoded"""
+    done = 0
+    for start in range(0, len(terms), BATCH_SIZE):
+        batch = terms[start:start + BATCH_SIZE]
+        for term, embedding in zip(batch, encode(batch)):
+            write(term, embedding)
+        done += len(batch)
+        print(f"  … {done}/{len(terms)} encoded")
+    return done
+
+def load_clip() -> Callable[[List[str]], np.ndarray]:
+    import clip
+    import torch
+
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    model, _ = clip.load(EMBEDDING_MODEL, device=device)
+    # Same tokenization (truncate=True) as query-time mapping in the server
+    app = SimpleNamespace(state=SimpleNamespace(model=model, device=device))
+    return lambda texts: encode_texts(app, texts)
+
+def embed_missing_ingredients(db) -> int:
+    recipes = db.collection("recipes").select(["ingredient_names"]).stream()
+    vocab = collect_vocabulary(doc.to_dict() or {} for doc in recipes)
+    existing = embedded_terms(db)
+    todo = missing_terms(vocab, existing)
+    print(f"📦 {len(vocab)} unique ingredients, {len(existing)} already embedded, {len(todo)} to encode")
+    if not todo:
+        return 0
+
+    failed = []
+
+    def on_error(error, _writer) -> bool:
+        if error.attempts < WRITE_ATTEMPTS:
+            return True  # retried with backoff
+        failed.append(error)
+        return False
 
-    # Step 1: Collect all ingredient names from recipes
-    recipes_ref = db.collection("recipes").stream()
-    for recipe in recipes_ref:
-        data = recipe.to_dict()
-        ingredients = data.get("ingredient_names", [])
-        vocab.update(ing.strip().lower() for ing in ingredients)
+    writer = db.bulk_writer()
+    writer.on_write_error(on_error)
+    coll = db.collection("ingredient_embeddings")
+    encode = load_clip()
+    encoded = encode_in_batches(todo, encode, lambda term, emb: writer.set(coll.document(term), encode_embedding(emb)))
+    writer.close()  # flushes and waits for every write
 
-    print(f"📦 Found {len(vocab)} unique ingredients")
+    for error in failed:
+        print(f"❌ {error.operation.reference.path}: {error.message}")
+    return encoded - len(failed)
 
-    # Step 2: Encode and save
-    for ing in vocab:
-        print(f"➡️ Processing {ing} ...")
-        embedding = encode_text(ing)
-        db.collection("ingredient_embeddings").document(ing).set({
-            "embedding": embedding.tolist()
-        })
-        print(f"✅ Saved embedding for {ing}")
+def main():
+    db = ensure_app()
+    t0 = time.perf_counter()
+    saved = embed_missing_ingredients(db)
+    print("---- DONE ----")
+    print(f"Ingredient embeddings saved: {saved} in {time.perf_counter() - t0:.1f}s")
 
 if __name__ == "__main__":
-    embed_all_ingredients()
+    main()
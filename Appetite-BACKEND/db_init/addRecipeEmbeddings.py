@@ -1,53 +1,321 @@
-import torch
-import clip
-from PIL import Image
-import requests
-import numpy as np
+#!/usr/bin/env python3
+"""
+Embed recipe thumbnails with CLIP into recipe_embeddings.
+
+Pipeline (asyncio, stages overlap):
+  recipes (thumbnail field only) -> DOWNLOADS concurrent fetches on one pooled httpx client
+  -> decode + CLIP preprocess in the CPU pool -> BATCH_SIZE images per CLIP forward pass
+  -> Firestore BulkWriter
+
+Nothing is re-embedded without a reason: a recipe is skipped when its stored
+embedding was made by the current model (EMBEDDING_MODEL) from the same
+thumbnail URL, or from the same image bytes (sha256, for local files and
+moved URLs). Every confirmed write or permanent failure is appended to
+CHECKPOINT_PATH, so an interrupted run resumes without touching finished
+recipes again.
+
+Run from Appetite-BACKEND:
+  python db_init/addRecipeEmbeddings.py              # thumbnails of the Firestore recipes
+  python db_init/addRecipeEmbeddings.py thumbnails/  # local <recipe_id>.<ext> files of existing recipes instead
+Set FORCE = True to re-embed everything regardless.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set
+
 import firebase_admin
+import numpy as np
 from firebase_admin import credentials, firestore
 
-# --- Init Firebase ---
-cred = credentials.Certificate("D:/MobileFinal/Appetite-BACKEND/app/serviceAccount.json")
-firebase_admin.initialize_app(cred)
-db = firestore.client()
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))  # for app.utils
+from app.utils.embedding_codec import EMBEDDING_MODEL, encode_embedding
+from app.utils.executors import run_cpu
+from app.utils.http_fetch import create_http_client, fetch_image_bytes
+from app.utils.images import decode_image
 
-# --- Load CLIP ---
-device = "cuda" if torch.cuda.is_available() else "cpu"
-model, preprocess = clip.load("ViT-B/32", device=device)
+# -------- CONFIG --------
+DOWNLOADS = 32              # concurrent thumbnail downloads
+BATCH_SIZE = 64             # images per CLIP forward pass
+BATCH_WAIT_SECONDS = 0.5    # how long a partial batch waits for more images
+CHECKPOINT_PATH = "recipe_embeddings.checkpoint.jsonl"
+FORCE = False
+RETRY_FAILED = False        # True: retry recipes the checkpoint marks as permanently failed
+WRITE_ATTEMPTS = 5          # BulkWriter retries per write
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp"}
+PROGRESS_EVERY = 500
+# ------------------------
 
-def encode_image_from_url(url):
-    try:
-        response = requests.get(url, stream=True, timeout=10)
-        image = preprocess(Image.open(response.raw).convert("RGB")).unsqueeze(0).to(device)
-        with torch.no_grad():
-            features = model.encode_image(image)
-        return features.cpu().numpy().flatten()
-    except Exception as e:
-        print(f"❌ Failed to process {url}: {e}")
-        return None
-
-def embed_all_recipes():
-    recipes_ref = db.collection("recipes").stream()
-    for recipe in recipes_ref:
-        data = recipe.to_dict()
-        recipe_id = recipe.id
-        thumbnail_url = data.get("thumbnail")
-
-        if not thumbnail_url:
-            print(f"⚠️ No thumbnail for {recipe_id}")
-            continue
-
-        print(f"➡️ Processing {recipe_id} ...")
-
-        embedding = encode_image_from_url(thumbnail_url)
-        if embedding is not None:
-            # Save embedding to Firestore
-            db.collection("recipe_embeddings").document(recipe_id).set({
-                "embedding": embedding.tolist()
-            })
-            print(f"✅ Saved embedding for {recipe_id}")
+STATE_FIELDS = ["embedding_model", "source", "source_sha256", "deleted"]
+
+def ensure_app():
+    if not firebase_admin._apps:
+        cred_path = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
+        if cred_path and os.path.isfile(cred_path):
+            firebase_admin.initialize_app(credentials.Certificate(cred_path))
+        else:
+            firebase_admin.initialize_app()  # ADC / Emulator
+    return firestore.client()
+
+# ------------------------
+# Sources: {"id", "source", ["path"]}
+# ------------------------
+
+def firestore_items(db) -> Iterable[dict]:
+    for doc in db.collection("recipes").select(["thumbnail"]).stream():
+        url = (doc.to_dict() or {}).get("thumbnail")
+        if url:
+            yield {"id": doc.id, "source": url}
+        else:
+            print(f"⚠️ No thumbnail for {doc.id}")
+
+def recipe_ids(db) -> Set[str]:
+    """Ids of every recipe (one projected scan, no fields read)"""
+    return {doc.id for doc in db.collection("recipes").select([]).stream()}
+
+def directory_items(images_dir: str, known_ids: Optional[Set[str]] = None) -> Iterable[dict]:
+    for path in sorted(Path(images_dir).iterdir()):
+        if path.suffix.lower() in IMAGE_EXTENSIONS:
+            if known_ids is not None and path.stem not in known_ids:
+                print(f"⚠️ No recipe {path.stem}, skipping {path.name}")
+                continue
+            # mtime in the source key: a replaced file doesn't match its old checkpoint entry
+            yield {"id": path.stem, "source": f"file:{path.name}@{path.stat().st_mtime_ns}", "path": path}
+
+async def read_source(client, item: dict) -> bytes:
+    if "path" in item:
+        return await asyncio.to_thread(item["path"].read_bytes)
+    return await fetch_image_bytes(client, item["source"])
+
+# ------------------------
+# Skip / resume state
+# ------------------------
+
+def stored_state(db) -> Dict[str, dict]:
+    """Model + source of every stored embedding (one projected scan)"""
+    docs = db.collection("recipe_embeddings").select(STATE_FIELDS).stream()
+    return {doc.id: doc.to_dict() or {} for doc in docs}
+
+def unchanged(state: Optional[dict], source: str, sha256: Optional[str] = None) -> bool:
+    """Whether the stored embedding already covers this source (by URL before download, by hash after)"""
+    if FORCE or not state or state.get("deleted") or state.get("embedding_model") != EMBEDDING_MODEL:
+        return False
+    if sha256 is not None:
+        return state.get("source_sha256") == sha256
+    return not source.startswith("file:") and state.get("source") == source  # local files: hash only
+
+class Checkpoint:
+    """Append-only JSONL of finished recipes; written from BulkWriter threads, hence the lock"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries: Dict[str, dict] = {}
+        if os.path.isfile(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.entries[entry["id"]] = entry
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8")
+
+    def done(self, item: dict) -> bool:
+        entry = self.entries.get(item["id"])
+        if FORCE or not entry or entry["source"] != item["source"] or entry["model"] != EMBEDDING_MODEL:
+            return False
+        return entry["status"] == "done" or not RETRY_FAILED
+
+    def record(self, recipe_id: str, source: str, status: str, error: str = None) -> None:
+        entry = {"id": recipe_id, "source": source, "model": EMBEDDING_MODEL, "status": status}
+        if error:
+            entry["error"] = error
+        with self._lock:
+            self.entries[recipe_id] = entry
+            self._file.write(json.dumps(entry) + "\n")
+            self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+# ------------------------
+# Pipeline
+# ------------------------
+
+async def embed_items(
+    items: Iterable[dict],
+    state: Dict[str, dict],
+    checkpoint: Checkpoint,
+    load: Callable[[dict], Awaitable[bytes]],
+    prepare: Callable[[bytes], object],
+    encode: Callable[[List[object]], np.ndarray],
+    write: Callable[[dict, str, np.ndarray], None],
+    stats: Counter,
+    relabel: Optional[Callable[[dict], None]] = None,
+) -> Counter:
+    """
+    Run every item through load -> prepare (CPU pool) -> batched encode (CPU pool) -> write.
+    write(item, sha256, embedding) must record the checkpoint once the write is durable.
+    relabel(item) stores a new source for an embedding whose bytes didn't change
+    (same contract); without it only the checkpoint is recorded.
+    """
+    todo: asyncio.Queue = asyncio.Queue()
+    for item in items:
+        stats["recipes"] += 1
+        if checkpoint.done(item):
+            stats["skipped_checkpoint"] += 1
+        elif unchanged(state.get(item["id"]), item["source"]):
+            stats["skipped_unchanged"] += 1
         else:
-            print(f"❌ Skipped {recipe_id}")
+            todo.put_nowait(item)
+
+    ready: asyncio.Queue = asyncio.Queue(maxsize=BATCH_SIZE * 4)  # backpressure on the downloaders
+    started = time.perf_counter()
+
+    async def downloader():
+        while not todo.empty():
+            item = todo.get_nowait()
+            try:
+                data = await load(item)
+                sha256 = hashlib.sha256(data).hexdigest()
+                stored = state.get(item["id"])
+                if unchanged(stored, item["source"], sha256):
+                    stats["skipped_unchanged"] += 1
+                    if relabel and stored.get("source") != item["source"]:
+                        relabel(item)  # moved URL / touched file: the next run skips it before fetching
+                    else:
+                        checkpoint.record(item["id"], item["source"], "done")  # same bytes: don't fetch again
+                    continue
+                tensor = await run_cpu(prepare, data)
+            except Exception as e:  # dead link, not an image, ...: skipped on resume unless RETRY_FAILED
+                stats["failed"] += 1
+                checkpoint.record(item["id"], item["source"], "failed", str(e))
+                print(f"❌ {item['id']}: {e}")
+                continue
+            await ready.put((item, sha256, tensor))
+
+    async def encoder():
+        loop = asyncio.get_running_loop()
+        finished = False
+        while not finished:
+            first = await ready.get()
+            if first is None:
+                break
+            batch = [first]
+            deadline = loop.time() + BATCH_WAIT_SECONDS
+            while len(batch) < BATCH_SIZE:
+                try:
+                    nxt = ready.get_nowait()
+                except asyncio.QueueEmpty:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        nxt = await asyncio.wait_for(ready.get(), remaining)
+                    except asyncio.TimeoutError:
+                        break
+                if nxt is None:
+                    finished = True
+                    break
+                batch.append(nxt)
+
+            try:
+                features = await run_cpu(encode, [tensor for _, _, tensor in batch])
+            except Exception as e:  # not checkpointed: the next run retries these
+                stats["failed"] += len(batch)
+                print(f"❌ CLIP batch of {len(batch)} failed: {e}")
+                continue
+            for (item, sha256, _), embedding in zip(batch, features):
+                write(item, sha256, embedding)
+            stats["encoded"] += len(batch)
+            stats["batches"] += 1
+            if stats["encoded"] // PROGRESS_EVERY != (stats["encoded"] - len(batch)) // PROGRESS_EVERY:
+                rate = stats["encoded"] / (time.perf_counter() - started)
+                print(f"  … {stats['encoded']} encoded ({rate:.1f}/s), {todo.qsize()} left to fetch")
+
+    encoding = asyncio.create_task(encoder())
+    await asyncio.gather(*(downloader() for _ in range(DOWNLOADS)))
+    await ready.put(None)
+    await encoding
+    return stats
+
+def load_clip():
+    import clip
+    import torch
+
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    model, preprocess = clip.load(EMBEDDING_MODEL, device=device)
+
+    def encode(tensors):
+        with torch.no_grad():
+            features = model.encode_image(torch.stack(tensors).to(device))
+        return features.float().cpu().numpy()
+
+    return (lambda data: preprocess(decode_image(data))), encode
+
+def bulk_writer(db, checkpoint: Checkpoint, stats: Counter):
+    """BulkWriter that checkpoints each recipe once its write is acknowledged"""
+    pending: Dict[str, str] = {}  # recipe id -> source, until acknowledged
+
+    def on_result(reference, _result, _writer):
+        stats["written"] += 1
+        checkpoint.record(reference.id, pending.pop(reference.id), "done")
+
+    def on_error(error, _writer) -> bool:
+        if error.attempts < WRITE_ATTEMPTS:
+            return True
+        stats["write_failed"] += 1
+        print(f"❌ write {error.operation.reference.path}: {error.message}")  # not checkpointed: retried next run
+        return False
+
+    writer = db.bulk_writer()
+    writer.on_write_result(on_result)
+    writer.on_write_error(on_error)
+
+    def write(item: dict, sha256: str, embedding: np.ndarray) -> None:
+        pending[item["id"]] = item["source"]
+        writer.set(db.collection("recipe_embeddings").document(item["id"]), {
+            **encode_embedding(embedding),
+            "source": item["source"],
+            "source_sha256": sha256,
+            "updatedAt": firestore.SERVER_TIMESTAMP,  # watermark for server snapshot deltas
+        })
+
+    def relabel(item: dict) -> None:
+        # vector unchanged, so no updatedAt bump: the server has nothing to reload
+        pending[item["id"]] = item["source"]
+        writer.update(db.collection("recipe_embeddings").document(item["id"]), {"source": item["source"]})
+
+    return writer, write, relabel
+
+async def main_async(images_dir: Optional[str]):
+    db = ensure_app()
+    state = stored_state(db)
+    items = directory_items(images_dir, recipe_ids(db)) if images_dir else firestore_items(db)
+    print(f"📦 {len(state)} stored embeddings; embedding {'files in ' + images_dir if images_dir else 'recipe thumbnails'}")
+
+    prepare, encode = load_clip()
+    checkpoint = Checkpoint(CHECKPOINT_PATH)
+    stats = Counter()
+    writer, write, relabel = bulk_writer(db, checkpoint, stats)
+    client = create_http_client()
+    started = time.perf_counter()
+    try:
+        await embed_items(items, state, checkpoint, lambda item: read_source(client, item),
+                          prepare, encode, write, stats, relabel)
+        writer.close()  # flushes and waits for every write
+    finally:
+        await client.aclose()
+        checkpoint.close()
+
+    print("---- DONE ----")
+    print(f"{dict(stats)} in {time.perf_counter() - started:.0f}s")
 
 if __name__ == "__main__":
-    embed_all_recipes()
+    asyncio.run(main_async(sys.argv[1] if len(sys.argv) > 1 else None))
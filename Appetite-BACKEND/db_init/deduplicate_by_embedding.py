@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Find near-duplicate recipes by image embedding (re-posts of the same dish).
+
+deduplicate_recipe.py only catches duplicates sharing a mealDbId; user-created
+recipes have none. This job loads every stored recipe image embedding
+(recipe_embeddings, embedding fields only), self-joins them on cosine
+similarity >= THRESHOLD (app/services/recipe_dedup.py) and groups matching
+pairs into clusters.
+
+Per cluster one recipe is kept:
+  1) prefer an imported recipe (has mealDbId)
+  2) then the most engaged one (saveCount + ratingCount)
+  3) then the oldest createdAt (the original post)
+
+Candidate clusters are always written to OUTPUT_PATH for review. With
+DRY_RUN = False the other recipes are deleted through a BulkWriter, and
+their embeddings are tombstoned the way DELETE /recipes/id/{id} does, so
+running servers drop them on their next delta.
+
+Run from Appetite-BACKEND:
+  python db_init/deduplicate_by_embedding.py
+"""
+
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import firebase_admin
+import numpy as np
+from firebase_admin import credentials, firestore
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))  # for app.*
+from app.services.recipe_dedup import duplicate_clusters
+from app.utils.embedding_codec import EMBEDDING_FIELDS, decode_embedding
+
+# -------- CONFIG --------
+THRESHOLD = 0.95          # cosine similarity of CLIP image embeddings
+CHUNK_SIZE = 4096         # rows per similarity tile (a tile is CHUNK_SIZE^2 float32)
+DRY_RUN = True            # only write the clusters; set to False to delete
+OUTPUT_PATH = "dedup_clusters.json"
+GET_ALL_CHUNK = 300       # recipe docs per get_all round trip
+WRITE_ATTEMPTS = 5        # BulkWriter retries per write before giving up on it
+KEEPER_FIELDS = ["mealDbId", "saveCount", "ratingCount", "createdAt", "name", "contributorId"]
+# ------------------------
+
+def ensure_app():
+    if not firebase_admin._apps:
+        cred_path = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
+        if cred_path and os.path.isfile(cred_path):
+            firebase_admin.initialize_app(credentials.Certificate(cred_path))
+        else:
+            firebase_admin.initialize_app()  # ADC / Emulator
+    return firestore.client()
+
+def load_embeddings(db):
+    ids, rows = [], []
+    docs = db.collection("recipe_embeddings").select([*EMBEDDING_FIELDS, "deleted"]).stream()
+    for doc in docs:
+        data = doc.to_dict() or {}
+        if data.get("deleted"):
+            continue
+        embedding = decode_embedding(data)
+        if embedding is not None:
+            ids.append(doc.id)
+            rows.append(embedding)
+    if not rows:
+        return ids, np.empty((0, 0), dtype="float32")
+    return ids, np.vstack(rows).astype("float32")
+
+def load_recipes(db, recipe_ids: List[str]) -> Dict[str, dict]:
+    """Keeper fields of the clustered recipes only (missing recipes are left out)"""
+    coll = db.collection("recipes")
+    recipes = {}
+    for start in range(0, len(recipe_ids), GET_ALL_CHUNK):
+        refs = [coll.document(rid) for rid in recipe_ids[start:start + GET_ALL_CHUNK]]
+        for snap in db.get_all(refs, field_paths=KEEPER_FIELDS):
+            if snap.exists:
+                recipes[snap.id] = snap.to_dict() or {}
+    return recipes
+
+def keeper_key(recipe: dict):
+    created = recipe.get("createdAt")
+    engagement = (recipe.get("saveCount") or 0) + (recipe.get("ratingCount") or 0)
+    # max() wins: imported first, then engagement, then oldest (no createdAt sorts last)
+    return (bool(recipe.get("mealDbId")), engagement, created is not None,
+            -created.timestamp() if created is not None else 0)
+
+def plan_clusters(ids: List[str], embeddings: np.ndarray, groups, recipes: Dict[str, dict]) -> List[dict]:
+    clusters = []
+    for group in groups:
+        members = [int(i) for i in group if ids[i] in recipes]  # embedding left over from a deleted recipe
+        if len(members) < 2:
+            continue
+        keep = max(members, key=lambda i: keeper_key(recipes[ids[i]]))
+        unit = embeddings[members] / np.linalg.norm(embeddings[members], axis=1, keepdims=True)
+        sims = unit @ unit[members.index(keep)]
+        clusters.append({
+            "keep": ids[keep],
+            "delete": [ids[i] for i in members if i != keep],
+            "members": [
+                {"id": ids[i], "name": recipes[ids[i]].get("name"),
+                 "contributorId": recipes[ids[i]].get("contributorId"),
+                 "similarity_to_keep": round(float(s), 4)}
+                for i, s in zip(members, sims)
+            ],
+        })
+    return clusters
+
+def delete_duplicates(db, recipe_ids: List[str]) -> int:
+    """Delete recipes + tombstone their embeddings through one BulkWriter; returns recipes deleted"""
+    failed = []
+
+    def on_error(error, _writer) -> bool:
+        if error.attempts < WRITE_ATTEMPTS:
+            return True  # retried with backoff
+        failed.append(error)
+        return False
+
+    writer = db.bulk_writer()
+    writer.on_write_error(on_error)
+    for rid in recipe_ids:
+        writer.delete(db.collection("recipes").document(rid))
+        writer.set(db.collection("recipe_embeddings").document(rid), {
+            "deleted": True,
+            "updatedAt": firestore.SERVER_TIMESTAMP,
+        })
+    writer.close()  # flushes and waits for every write
+
+    for error in failed:
+        print(f"❌ {error.operation.reference.path}: {error.message}")
+    not_deleted = {e.operation.reference.id for e in failed if e.operation.reference.parent.id == "recipes"}
+    return len(recipe_ids) - len(not_deleted)
+
+def main():
+    db = ensure_app()
+
+    t0 = time.perf_counter()
+    ids, embeddings = load_embeddings(db)
+    print(f"Loaded {len(ids)} embeddings in {time.perf_counter() - t0:.1f}s")
+    if len(ids) < 2:
+        print("Nothing to compare. Done.")
+        return
+
+    t0 = time.perf_counter()
+    groups = duplicate_clusters(embeddings, THRESHOLD, CHUNK_SIZE)
+    print(f"Found {len(groups)} candidate clusters (cosine >= {THRESHOLD}) in {time.perf_counter() - t0:.1f}s")
+
+    recipes = load_recipes(db, [ids[i] for group in groups for i in group])
+    clusters = plan_clusters(ids, embeddings, groups, recipes)
+    to_delete = [rid for c in clusters for rid in c["delete"]]
+
+    with open(OUTPUT_PATH, "w", encoding="utf-8") as f:
+        json.dump({"threshold": THRESHOLD, "clusters": clusters}, f, ensure_ascii=False, indent=2, default=str)
+    print(f"Wrote {len(clusters)} clusters ({len(to_delete)} recipes to delete) to {OUTPUT_PATH}")
+
+    if DRY_RUN:
+        print(f"[DRY-RUN] Would delete {len(to_delete)} recipes.")
+        return
+
+    deleted = delete_duplicates(db, to_delete)
+    print("---- DONE ----")
+    print(f"Duplicates deleted: {deleted}/{len(to_delete)}")
+
+if __name__ == "__main__":
+    main()
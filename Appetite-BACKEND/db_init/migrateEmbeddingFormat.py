@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Rewrite embeddings stored as Firestore arrays of doubles ("embedding": [...])
+into the binary format (embedding_bin + dtype/dim/model tags, see
+app/utils/embedding_codec.py).
+
+Pages through the collection by document id and commits in batches, so it can
+be stopped and re-run: documents already in the binary format are skipped.
+updatedAt is left alone (the vectors don't change, servers need no delta).
+
+Run from Appetite-BACKEND:
+  python db_init/migrateEmbeddingFormat.py [recipe_embeddings|ingredient_embeddings ...]
+Set DRY_RUN = True to only count.
+"""
+
+import os
+import sys
+from pathlib import Path
+
+import firebase_admin
+from firebase_admin import credentials, firestore
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))  # for app.utils
+from app.utils.embedding_codec import EMBEDDING_STORE_DTYPE, decode_embedding, encode_embedding, is_legacy_embedding
+
+# -------- CONFIG --------
+COLLECTIONS = ["recipe_embeddings", "ingredient_embeddings"]
+DRY_RUN = False
+KEEP_LEGACY_FIELD = False   # True during a rolling deploy while old servers still read "embedding"
+PAGE_SIZE = 500
+BATCH_SIZE = 400            # < 500 (Firestore limit)
+# ------------------------
+
+def ensure_app():
+    if not firebase_admin._apps:
+        cred_path = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
+        if cred_path and os.path.isfile(cred_path):
+            firebase_admin.initialize_app(credentials.Certificate(cred_path))
+        else:
+            firebase_admin.initialize_app()  # ADC / Emulator
+    return firestore.client()
+
+def migrate_collection(db, name: str):
+    coll = db.collection(name)
+    scanned = migrated = 0
+    batch, in_batch = db.batch(), 0
+    last = None
+
+    while True:
+        q = coll.order_by("__name__").limit(PAGE_SIZE)
+        if last is not None:
+            q = q.start_after(last)
+        page = list(q.stream())
+        if not page:
+            break
+        last = page[-1]
+
+        for snap in page:
+            scanned += 1
+            data = snap.to_dict() or {}
+            if not is_legacy_embedding(data):
+                continue
+            update = encode_embedding(decode_embedding(data))
+            if not KEEP_LEGACY_FIELD:
+                update["embedding"] = firestore.DELETE_FIELD
+            migrated += 1
+            if DRY_RUN:
+                continue
+            batch.update(snap.reference, update)
+            in_batch += 1
+            if in_batch >= BATCH_SIZE:
+                batch.commit()
+                batch, in_batch = db.batch(), 0
+
+        print(f"  {name}: scanned {scanned}, {'to migrate' if DRY_RUN else 'migrated'} {migrated}")
+
+    if in_batch:
+        batch.commit()
+    return scanned, migrated
+
+def main():
+    db = ensure_app()
+    names = sys.argv[1:] or COLLECTIONS
+    print(f"Migrating {names} to {EMBEDDING_STORE_DTYPE} bytes{' (dry run)' if DRY_RUN else ''} ...")
+    for name in names:
+        scanned, migrated = migrate_collection(db, name)
+        print(f"✅ {name}: {migrated}/{scanned} documents rewritten")
+
+if __name__ == "__main__":
+    main()
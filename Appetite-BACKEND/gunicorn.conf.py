@@ -0,0 +1,21 @@
+# Multi-worker serving with shared model weights and index:
+#   gunicorn -c gunicorn.conf.py app.main:app
+# Each worker still runs the FastAPI lifespan, but adopts the CLIP weights the
+# master loaded before forking and memory-maps the FAISS snapshot the master
+# refreshed (see app/preload.py). PRELOAD_MODELS=0 gives plain independent workers.
+import os
+
+os.environ.setdefault("WEB_CONCURRENCY", "2")  # also sizes TORCH_THREADS (app/utils/executors.py)
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.environ["WEB_CONCURRENCY"])
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = os.getenv("PRELOAD_MODELS", "1") != "0"
+timeout = 120
+graceful_timeout = 30
+
+
+def on_starting(server):
+    if preload_app:
+        from app.preload import preload_shared_resources
+        preload_shared_resources()
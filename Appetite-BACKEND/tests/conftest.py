@@ -0,0 +1,102 @@
+"""
+Shared test doubles. FakeFirestore is an in-memory stand-in for the parts of
+the Firestore client the services use: document get / set / update / delete,
+batched get_all, and collection scans with select / where.
+"""
+from datetime import datetime, timezone
+
+import pytest
+
+try:
+    from firebase_admin import firestore as _firestore
+    SERVER_TIMESTAMP = _firestore.SERVER_TIMESTAMP
+except ImportError:  # pragma: no cover - firebase_admin missing: tests that need it skip
+    SERVER_TIMESTAMP = object()
+
+_OPS = {">": lambda a, b: a > b, ">=": lambda a, b: a >= b, "==": lambda a, b: a == b,
+        "<": lambda a, b: a < b, "<=": lambda a, b: a <= b}
+
+
+class FakeSnapshot:
+    def __init__(self, doc_id: str, data):
+        self.id = doc_id
+        self._data = dict(data) if data is not None else None  # as read: later writes don't show
+        self.exists = data is not None
+
+    def to_dict(self):
+        return dict(self._data) if self._data is not None else None
+
+
+class FakeDocument:
+    def __init__(self, db: "FakeFirestore", collection: str, doc_id: str):
+        self._db = db
+        self._docs = db.collections.setdefault(collection, {})
+        self.id = doc_id
+
+    def get(self) -> FakeSnapshot:
+        self._db.reads += 1
+        return FakeSnapshot(self.id, self._docs.get(self.id))
+
+    def set(self, data: dict, merge: bool = False) -> None:
+        data = self._db.resolve(data)
+        self._docs[self.id] = {**self._docs.get(self.id, {}), **data} if merge else data
+
+    def update(self, data: dict) -> None:
+        if self.id not in self._docs:
+            raise KeyError(f"No document to update: {self.id}")
+        self._docs[self.id].update(self._db.resolve(data))
+
+    def delete(self) -> None:
+        self._docs.pop(self.id, None)
+
+
+class FakeQuery:
+    def __init__(self, db: "FakeFirestore", collection: str, filters=()):
+        self._db = db
+        self._name = collection
+        self._filters = list(filters)
+
+    def document(self, doc_id: str) -> FakeDocument:
+        return FakeDocument(self._db, self._name, doc_id)
+
+    def select(self, fields) -> "FakeQuery":
+        return self  # projections don't change what the fakes return
+
+    def where(self, field: str, op: str, value) -> "FakeQuery":
+        return FakeQuery(self._db, self._name, [*self._filters, (field, _OPS[op], value)])
+
+    def stream(self):
+        for doc_id, data in list(self._db.collections.get(self._name, {}).items()):
+            if all(field in data and op(data[field], value) for field, op, value in self._filters):
+                self._db.reads += 1
+                yield FakeSnapshot(doc_id, data)
+
+
+class FakeFirestore:
+    """collections: {name: {doc id: data}}. Counts document reads and get_all round trips."""
+
+    def __init__(self, collections=None):
+        self.collections = {name: dict(docs) for name, docs in (collections or {}).items()}
+        self.reads = 0
+        self.get_all_calls = []
+
+    def collection(self, name: str) -> FakeQuery:
+        return FakeQuery(self, name)
+
+    def get_all(self, refs):
+        refs = list(refs)
+        self.get_all_calls.append([ref.id for ref in refs])
+        self.reads += len(refs)
+        # Firestore returns documents in arbitrary order
+        return [FakeSnapshot(ref.id, ref._docs.get(ref.id)) for ref in reversed(refs)]
+
+    @staticmethod
+    def resolve(data: dict) -> dict:
+        now = datetime.now(timezone.utc)
+        return {k: now if v is SERVER_TIMESTAMP else v for k, v in data.items()}
+
+
+@pytest.fixture
+def fake_db():
+    """Factory: fake_db({"recipes": {"r1": {...}}}) -> FakeFirestore"""
+    return FakeFirestore
@@ -0,0 +1,98 @@
+"""
+CLIP micro-batching: concurrent encode() calls share forward passes of at
+most max_batch images, every caller gets its own row back, a failed forward
+pass reaches every waiting caller, and a caller that went away is left out
+of the batch. The model is a fake whose embedding of image i is 2 * i.
+"""
+import asyncio
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from app.services.clip_batcher import ClipBatcher
+
+
+class _FakeClip:
+    def __init__(self, fail=False, seconds=0.02):
+        self.batches = []
+        self.fail = fail
+        self.seconds = seconds
+
+    def encode_image(self, batch):
+        time.sleep(self.seconds)  # a forward pass: callers pile up meanwhile
+        self.batches.append(batch[:, 0].tolist())
+        if self.fail:
+            raise RuntimeError("CUDA out of memory")
+        return batch * 2
+
+
+def _batcher(model, max_batch=8, max_wait_ms=20):
+    app = SimpleNamespace(state=SimpleNamespace(model=model, device="cpu"))
+    return ClipBatcher(app, max_batch=max_batch, max_wait_ms=max_wait_ms)
+
+
+def _image(i):
+    return torch.tensor([float(i)])
+
+
+def test_concurrent_calls_share_batches():
+    model, n = _FakeClip(), 40
+
+    async def run():
+        batcher = _batcher(model)
+        batcher.start()
+        try:
+            return await asyncio.gather(*(batcher.encode(_image(i)) for i in range(n))), batcher.stats()
+        finally:
+            await batcher.stop()
+
+    results, stats = asyncio.run(run())
+    assert [float(r[0]) for r in results] == [2.0 * i for i in range(n)]  # each caller its own row
+    sizes = [len(b) for b in model.batches]
+    assert max(sizes) <= 8 and len(sizes) < n and sum(sizes) == n
+    assert stats["batches"] == len(sizes) and stats["items"] == n
+    assert sum(size * count for size, count in stats["batch_sizes"].items()) == n
+    assert stats["queue_depth"] == 0
+
+
+def test_queue_depth_and_cancelled_callers():
+    model = _FakeClip()
+
+    async def run():
+        batcher = _batcher(model)
+        callers = [asyncio.create_task(batcher.encode(_image(i))) for i in range(4)]
+        await asyncio.sleep(0)  # all queued, the worker isn't running yet
+        depth = batcher.stats()["queue_depth"]
+        callers[1].cancel()  # client disconnected
+        batcher.start()
+        try:
+            results = await asyncio.gather(*callers, return_exceptions=True)
+        finally:
+            await batcher.stop()
+        return depth, results
+
+    depth, results = asyncio.run(run())
+    assert depth == 4
+    assert isinstance(results[1], asyncio.CancelledError)
+    assert [float(results[i][0]) for i in (0, 2, 3)] == [0.0, 4.0, 6.0]
+    assert model.batches == [[0.0, 2.0, 3.0]]  # the cancelled image was never encoded
+
+
+def test_model_error_reaches_every_caller():
+    model = _FakeClip(fail=True)
+
+    async def run():
+        batcher = _batcher(model)
+        batcher.start()
+        try:
+            return await asyncio.gather(*(batcher.encode(_image(i)) for i in range(5)), return_exceptions=True)
+        finally:
+            await batcher.stop()
+
+    results = asyncio.run(run())
+    assert all(isinstance(r, RuntimeError) and "out of memory" in str(r) for r in results)
+    assert sum(len(b) for b in model.batches) == 5
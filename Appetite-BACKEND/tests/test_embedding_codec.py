@@ -0,0 +1,40 @@
+"""
+Binary embedding format: float16/float32 round trips, zero-copy decode,
+header checks, and backward compatibility with the legacy list format.
+"""
+import numpy as np
+import pytest
+
+from app.utils.embedding_codec import decode_embedding, encode_embedding, is_legacy_embedding
+
+
+@pytest.mark.parametrize("dtype, tol", [("float32", 0), ("float16", 1e-2)])
+def test_round_trip(dtype, tol):
+    vec = np.random.default_rng(0).normal(size=512).astype("float32")
+    fields = encode_embedding(vec, dtype=dtype)
+
+    assert fields["embedding_dim"] == 512 and fields["embedding_dtype"] == dtype
+    assert len(fields["embedding_bin"]) == 512 * np.dtype(dtype).itemsize
+    np.testing.assert_allclose(decode_embedding(fields).astype("float32"), vec, atol=tol)
+
+
+def test_decode_is_zero_copy():
+    fields = encode_embedding(np.arange(8, dtype="float32"), dtype="float32")
+    vec = decode_embedding(fields)
+    assert not vec.flags.owndata and not vec.flags.writeable
+
+
+def test_legacy_list_still_reads():
+    doc = {"embedding": [0.5, 1.5, 2.5]}
+    assert is_legacy_embedding(doc)
+    np.testing.assert_array_equal(decode_embedding(doc), np.array([0.5, 1.5, 2.5], dtype="float32"))
+
+
+def test_missing_wrong_model_and_bad_header():
+    assert decode_embedding({"deleted": True}) is None
+    assert decode_embedding(encode_embedding([1.0, 2.0], model="RN50")) is None
+
+    fields = encode_embedding([1.0, 2.0])
+    fields["embedding_dim"] = 3
+    with pytest.raises(ValueError):
+        decode_embedding(fields)
@@ -0,0 +1,101 @@
+"""
+Gemini ingredient extraction cache: exact repeats and (when enabled) near-
+duplicate photos skip Gemini, the disk tier outlives the memory tier, entries
+expire, and empty results are not kept. A stub model stands in for Gemini
+and counts calls.
+"""
+import asyncio
+import time
+from io import BytesIO
+
+import numpy as np
+import pytest
+
+pytest.importorskip("PIL")
+from PIL import Image
+
+try:
+    from app.services import gemini_api
+except Exception as e:  # pragma: no cover - depends on the server environment
+    pytest.skip(f"app.services.gemini_api is not importable here (Firebase credentials etc.): {e}",
+                allow_module_level=True)
+
+from app.services.extraction_cache import ExtractionCache
+
+
+class _StubModel:
+    def __init__(self, reply='["tomato", "egg"]'):
+        self.reply = reply
+        self.calls = 0
+
+    def generate_content(self, parts):
+        self.calls += 1
+        return type("Response", (), {"text": self.reply})()
+
+
+@pytest.fixture
+def stub(monkeypatch, tmp_path):
+    model = _StubModel()
+    monkeypatch.setattr(gemini_api, "gemini_model", lambda name=None: model)
+    monkeypatch.setattr(gemini_api, "extraction_cache", ExtractionCache(16, 60, str(tmp_path), near_distance=6))
+    return model
+
+
+def _photo(seed: int, size=(1024, 768), quality=92) -> bytes:
+    # coarse random blocks upscaled: structure a dHash can see, like a real scene
+    rng = np.random.default_rng(seed)
+    blocks = rng.integers(0, 256, (12, 16, 3), dtype=np.uint8)
+    img = Image.fromarray(blocks).resize(size, Image.BILINEAR)
+    buf = BytesIO()
+    img.save(buf, "JPEG", quality=quality)
+    return buf.getvalue()
+
+
+def _extract(data: bytes):
+    return asyncio.run(gemini_api.extract_ingredients_cached(data))
+
+
+def test_exact_repeat_skips_gemini_and_decode(stub, monkeypatch):
+    photo = _photo(0)
+    assert _extract(photo) == ["tomato", "egg"]
+    monkeypatch.setattr(gemini_api, "decode_image", lambda *a: pytest.fail("decoded on a cache hit"))
+    assert _extract(photo) == ["tomato", "egg"]
+    assert stub.calls == 1
+    assert gemini_api.extraction_cache.stats()["memory_hits"] == 1
+
+
+def test_near_duplicate_reuses_result(stub):
+    _extract(_photo(0))
+    # the same shot re-encoded smaller by the client
+    assert _extract(_photo(0, size=(800, 600), quality=70)) == ["tomato", "egg"]
+    assert stub.calls == 1 and gemini_api.extraction_cache.counts["near_hits"] == 1
+    _extract(_photo(1))  # a different photo
+    assert stub.calls == 2
+
+
+def test_near_duplicates_off_by_default(stub, monkeypatch):
+    monkeypatch.setattr(gemini_api, "extraction_cache", ExtractionCache(16, 60))
+    monkeypatch.setattr(gemini_api, "dhash", lambda *a: pytest.fail("fingerprinted with near matching off"))
+    _extract(_photo(0))
+    _extract(_photo(0, quality=70))
+    assert stub.calls == 2
+
+
+def test_empty_and_invalid_are_not_cached(stub):
+    stub.reply = "I can't see any food"
+    assert _extract(_photo(2)) == [] and _extract(_photo(2)) == []
+    assert stub.calls == 2
+    with pytest.raises(ValueError):
+        _extract(b"not an image")
+
+
+def test_disk_tier_and_expiry(tmp_path):
+    cache = ExtractionCache(4, ttl_seconds=0.2, disk_dir=str(tmp_path))
+    cache.put("k", ["basil"], fingerprint=123)
+    cache.clear()
+    assert cache.get("k") == ["basil"] and cache.counts["disk_hits"] == 1
+    # a new process (fresh memory tier) reads the same directory
+    assert ExtractionCache(4, 0.2, str(tmp_path)).get("k") == ["basil"]
+    time.sleep(0.25)
+    assert cache.get("k") is None
+    assert not list(tmp_path.glob("*.json"))
@@ -0,0 +1,78 @@
+"""
+Filtered similarity search: category / area / minutes filters applied inside
+the FAISS search through the attribute table, compared with brute force.
+"""
+import numpy as np
+import pytest
+
+pytest.importorskip("faiss")
+
+from app.services.recipe_attributes import AttributeTable
+from app.services.recipe_index import RecipeIndex
+
+N, DIM = 600, 32
+CATEGORIES = ["Beef", "Vegetarian", "Dessert"]
+AREAS = ["Italian", "French"]
+
+
+def _attrs(i):
+    return CATEGORIES[i % 3], AREAS[i % 2], (i % 8) * 10
+
+
+def _matches(i, categories=(), areas=(), minutes_bucket=None):
+    category, area, minutes = _attrs(i)
+    limits = {"quick": minutes <= 15, "short": minutes <= 30, "medium": minutes <= 45, "long": minutes > 60}
+    return ((not categories or category in categories)
+            and (not areas or area in areas)
+            and (minutes_bucket is None or limits[minutes_bucket]))
+
+
+@pytest.fixture(params=["flat", "hnsw"])
+def setup(request):
+    rng = np.random.default_rng(0)
+    xb = rng.normal(size=(N, DIM)).astype("float32")
+    index = RecipeIndex.from_embeddings([f"r{i}" for i in range(N)], xb.copy(), index_type=request.param)
+    index.set_attributes((f"r{i}", *_attrs(i)) for i in range(N))
+    return index, xb / np.linalg.norm(xb, axis=1, keepdims=True)
+
+
+@pytest.mark.parametrize("filters", [
+    {"categories": ("Vegetarian",)},
+    {"categories": ("Beef", "Dessert"), "areas": ("French",)},
+    {"minutes_bucket": "short", "areas": ("Italian",)},
+    {"minutes_bucket": "long"},
+])
+def test_filtered_results_match_brute_force(setup, filters):
+    index, xn = setup
+    q = xn[5]
+    hits = index.search(q, 10, filters)
+
+    assert len(hits) == 10
+    assert all(_matches(int(rid[1:]), **filters) for rid, _ in hits)
+
+    sims = xn @ q
+    allowed = np.array([_matches(i, **filters) for i in range(N)])
+    sims[~allowed] = -np.inf
+    truth = {f"r{i}" for i in np.argsort(-sims)[:10]}
+    found = {rid for rid, _ in hits}
+    assert len(found & truth) >= (10 if index.index_type == "flat" else 8)
+
+
+def test_filters_follow_removes_and_upserts(setup):
+    index, xn = setup
+    veg = {"categories": ("Vegetarian",)}
+    top = index.search(xn[1], 1, veg)[0][0]
+    index.remove(top)
+    assert top not in {rid for rid, _ in index.search(xn[1], 20, veg)}
+
+    index.upsert("new", xn[1], {"category": "Vegetarian", "area": "Thai", "minutes": 5})
+    assert index.search(xn[1], 1, {"areas": ("Thai",)})[0][0] == "new"
+    assert index.search(xn[1], 5, {"categories": ("Nope",)}) == []
+
+
+def test_unknown_attributes_never_match():
+    table = AttributeTable()
+    table.set(0, "Beef", None, None)
+    mask = table.mask(3, categories=("Beef",))
+    assert mask.tolist() == [True, False, False]
+    assert table.mask(3, minutes_bucket="quick").tolist() == [False, False, False]
@@ -0,0 +1,140 @@
+"""
+Remote image fetching (app.utils.http_fetch) against a local stand-in HTTP
+server: pooled client, Content-Type check, byte cap with and without
+Content-Length, and cancellation when the API client disconnects.
+"""
+import asyncio
+import io
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+httpx = pytest.importorskip("httpx")
+Image = pytest.importorskip("PIL.Image")
+
+from app.utils.http_fetch import (
+    ImageFetchError, cancel_on_disconnect, create_http_client, fetch_image_bytes, open_image)
+
+CAP = 64 * 1024
+
+
+def _jpeg() -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", (64, 64), (10, 200, 10)).save(buf, "JPEG")
+    return buf.getvalue()
+
+
+JPEG = _jpeg()
+
+
+class _ImageHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, body: bytes, content_type: str, length: bool = True, headers=None):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        if length:
+            self.send_header("Content-Length", str(len(body)))
+        else:
+            self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/dish.jpg":
+            self._send(JPEG, "image/jpeg", headers={"ETag": '"dish-v1"'})
+        elif self.path == "/page.html":
+            self._send(b"<html></html>", "text/html")
+        elif self.path == "/big.jpg":
+            self._send(b"\0" * (CAP * 2), "image/jpeg")
+        elif self.path == "/no-length.jpg":
+            self._send(b"\0" * (CAP * 2), "image/jpeg", length=False)
+        elif self.path == "/slow.jpg":
+            self.send_response(200)
+            self.send_header("Content-Type", "image/jpeg")
+            self.send_header("Content-Length", str(CAP))
+            self.end_headers()
+            for _ in range(50):
+                time.sleep(0.1)
+                try:
+                    self.wfile.write(b"\0" * 16)
+                    self.wfile.flush()
+                except OSError:
+                    return
+        else:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+
+@pytest.fixture(scope="module")
+def server_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _ImageHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+
+def _run(coro_fn):
+    async def main():
+        async with create_http_client() as client:
+            return await coro_fn(client)
+    return asyncio.run(main())
+
+
+def test_fetch_image_and_etag(server_url):
+    async def go(client):
+        async with open_image(client, f"{server_url}/dish.jpg", CAP) as response:
+            assert response.headers["ETag"] == '"dish-v1"'
+        return await fetch_image_bytes(client, f"{server_url}/dish.jpg", CAP)
+
+    assert _run(go) == JPEG
+
+
+@pytest.mark.parametrize("path, status", [
+    ("/page.html", 415),
+    ("/big.jpg", 413),
+    ("/no-length.jpg", 413),
+    ("/missing.jpg", 400),
+])
+def test_fetch_rejections(server_url, path, status):
+    with pytest.raises(ImageFetchError) as exc:
+        _run(lambda client: fetch_image_bytes(client, server_url + path, CAP))
+    assert exc.value.status_code == status
+
+
+def test_non_http_url_rejected():
+    with pytest.raises(ImageFetchError):
+        _run(lambda client: fetch_image_bytes(client, "file:///etc/passwd", CAP))
+
+
+class _DisconnectingRequest:
+    def __init__(self, after: float):
+        self.deadline = time.monotonic() + after
+
+    async def is_disconnected(self):
+        return time.monotonic() > self.deadline
+
+
+def test_fetch_cancelled_when_client_disconnects(server_url):
+    async def go(client):
+        started = time.monotonic()
+        with pytest.raises(ImageFetchError) as exc:
+            await cancel_on_disconnect(
+                _DisconnectingRequest(after=0.2),
+                fetch_image_bytes(client, f"{server_url}/slow.jpg", CAP),
+                poll_seconds=0.05,
+            )
+        return exc.value.status_code, time.monotonic() - started
+
+    status, took = _run(go)
+    assert status == 499
+    assert took < 1.0  # the slow body would take ~5 s
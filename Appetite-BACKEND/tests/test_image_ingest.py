@@ -0,0 +1,64 @@
+"""
+Image ingest: early downscaling keeps the shorter side >= min_side, EXIF
+orientation is applied, odd modes come out RGB, and bad bytes still raise.
+"""
+from io import BytesIO
+
+import pytest
+from PIL import Image, UnidentifiedImageError
+
+from app.utils.images import decode_image
+
+ORIENTATION = 0x0112
+
+
+def encoded(fmt: str, size=(4000, 3000), mode="RGB", orientation=None) -> bytes:
+    # Left half red, right half blue, so the orientation can be checked from pixels
+    img = Image.new(mode if mode != "P" else "RGB", size, (255, 0, 0))
+    img.paste((0, 0, 255), (size[0] // 2, 0, size[0], size[1]))
+    if mode == "P":
+        img = img.convert("P")
+    exif = Image.Exif()
+    if orientation:
+        exif[ORIENTATION] = orientation
+    buf = BytesIO()
+    img.save(buf, fmt, exif=exif.tobytes())
+    return buf.getvalue()
+
+
+@pytest.mark.parametrize("fmt", ["JPEG", "PNG", "WEBP"])
+@pytest.mark.parametrize("min_side", [224, 768])
+def test_downscaled_but_not_below_min_side(fmt, min_side):
+    img = decode_image(encoded(fmt), min_side)
+    assert img.mode == "RGB"
+    assert min(img.size) >= min_side and max(img.size) < 4000
+
+
+def test_jpeg_uses_dct_scaling():
+    img = decode_image(encoded("JPEG"), 224)
+    assert img.size == (500, 375)  # 1/8 scale straight out of libjpeg
+
+
+def test_small_images_are_left_alone():
+    assert decode_image(encoded("PNG", size=(300, 200)), 224).size == (300, 200)
+
+
+@pytest.mark.parametrize("fmt", ["JPEG", "PNG"])
+def test_exif_orientation_applied(fmt):
+    img = decode_image(encoded(fmt, orientation=6), 224)  # stored landscape, shown rotated 90° cw
+    w, h = img.size
+    assert h > w
+    top, bottom = img.getpixel((w // 2, 5)), img.getpixel((w // 2, h - 5))
+    assert top[0] > 200 and top[2] < 50       # left half (red) ends up on top
+    assert bottom[2] > 200 and bottom[0] < 50
+
+
+def test_palette_image_converted_before_reduce():
+    img = decode_image(encoded("PNG", mode="P"), 224)
+    assert img.mode == "RGB"
+    assert img.getpixel((0, 0))[0] > 200 and img.getpixel((img.width - 1, 0))[2] > 200
+
+
+def test_not_an_image():
+    with pytest.raises(UnidentifiedImageError):
+        decode_image(b"definitely not an image")
@@ -0,0 +1,62 @@
+"""
+Import-time guard for API-only workers.
+
+Imports app.main in a fresh interpreter under `python -X importtime` and fails if
+a heavy ML dependency is pulled in eagerly or the cumulative import time of
+app.main goes over budget (APP_IMPORT_BUDGET_MS, default 3000).
+
+Needs the same environment as the server (Firebase credentials etc.);
+skipped when app.main cannot be imported at all.
+"""
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+HEAVY_MODULES = ["torch", "clip", "whisper", "faiss", "webrtcvad", "pydub", "google.generativeai"]
+IMPORT_BUDGET_MS = float(os.getenv("APP_IMPORT_BUDGET_MS", "3000"))
+
+
+def _import_app_main():
+    code = (
+        "import sys, app.main; "
+        f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=BACKEND_DIR, capture_output=True, text=True, timeout=300,
+    )
+    if proc.returncode != 0:
+        last = (proc.stderr.strip().splitlines() or ["?"])[-1]
+        pytest.skip(f"app.main is not importable here: {last}")
+
+    # stderr lines: "import time: <self us> | <cumulative us> | <indent><module>"
+    cumulative_us = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if cumulative.strip().isdigit():
+            cumulative_us[name.strip()] = int(cumulative)
+
+    eager = [m for m in proc.stdout.strip().split(",") if m]
+    return eager, cumulative_us
+
+
+@pytest.fixture(scope="module")
+def app_import():
+    return _import_app_main()
+
+
+def test_heavy_ml_modules_are_lazy(app_import):
+    eager, _ = app_import
+    assert eager == [], f"imported at startup: {eager}"
+
+
+def test_app_import_time_budget(app_import):
+    _, cumulative_us = app_import
+    took_ms = cumulative_us["app.main"] / 1000
+    assert took_ms <= IMPORT_BUDGET_MS, f"import app.main took {took_ms:.0f} ms (budget {IMPORT_BUDGET_MS:.0f} ms)"
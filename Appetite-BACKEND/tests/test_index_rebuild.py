@@ -0,0 +1,99 @@
+"""
+Background rebuild + swap of the similarity index: searches keep answering
+from the old index during the build, live writes made meanwhile end up in the
+new index, late writes to the old object are forwarded, and a failed build
+leaves the current index serving.
+"""
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+pytest.importorskip("faiss")
+
+from app.resources import READY, ResourceState
+from app.services import index_rebuild
+from app.services.recipe_index import RecipeIndex
+
+N, DIM = 300, 32
+
+
+def _vectors(n, seed):
+    return np.random.default_rng(seed).normal(size=(n, DIM)).astype("float32")
+
+
+@pytest.fixture
+def app(monkeypatch):
+    old = RecipeIndex.from_embeddings([f"r{i}" for i in range(N)], _vectors(N, 0))
+    state = SimpleNamespace(recipe_index=old, resources={"recipe_index": ResourceState("recipe_index")})
+    state.resources["recipe_index"].status = READY
+    monkeypatch.setattr(index_rebuild, "get_recipe_embeddings_since", lambda app, watermark: [])
+    monkeypatch.setattr(index_rebuild, "load_recipe_attributes", lambda app, recipe_index: None)
+    monkeypatch.setattr(RecipeIndex, "persist", lambda self: None)
+    return SimpleNamespace(state=state)
+
+
+def test_swap_keeps_serving_and_replays_live_writes(app, monkeypatch):
+    old = app.state.recipe_index
+    building, release = threading.Event(), threading.Event()
+    rebuilt = _vectors(N + 50, 1)
+
+    def slow_build(_app):
+        building.set()
+        release.wait(5)
+        return RecipeIndex.from_embeddings([f"r{i}" for i in range(N + 50)], rebuilt)
+
+    monkeypatch.setattr(index_rebuild, "build_faiss_index", slow_build)
+    extra = _vectors(2, 2)
+
+    async def scenario():
+        task = index_rebuild.start_rebuild(app, "test")
+        assert index_rebuild.start_rebuild(app, "test") is None  # one at a time
+        await asyncio.to_thread(building.wait, 5)
+
+        # Mid-build: the old index answers, and takes writes
+        assert old.search(_vectors(1, 0)[0], 1)[0][0] == "r0"
+        old.upsert("live-1", extra[0])
+        old.remove("r5")
+        release.set()
+        await task
+
+    asyncio.run(scenario())
+
+    fresh = app.state.recipe_index
+    assert fresh is not old and fresh.version != old.version
+    assert fresh.ntotal == N + 50 + 1 - 1
+    assert "live-1" in fresh and "r5" not in fresh and "r320" in fresh
+    assert fresh.search(rebuilt[320], 1)[0][0] == "r320"
+
+    # A request that still holds the old object writes through to the new one
+    old.upsert("late", extra[1])
+    assert "late" in fresh
+
+    status = index_rebuild.index_status(app)
+    assert status["current"]["vectors"] == fresh.ntotal
+    rebuild = status["rebuild"]
+    assert not rebuild["running"] and rebuild["error"] is None and rebuild["rebuilds"] == 1
+    assert rebuild["vectors"] == N + 50 and rebuild["replayed_writes"] == 2
+    assert rebuild["duration_seconds"] is not None
+
+
+def test_failed_rebuild_keeps_current_index(app, monkeypatch):
+    old = app.state.recipe_index
+
+    def broken_build(_app):
+        raise RuntimeError("firestore unavailable")
+
+    monkeypatch.setattr(index_rebuild, "build_faiss_index", broken_build)
+
+    async def scenario():
+        await index_rebuild.start_rebuild(app, "test")
+
+    asyncio.run(scenario())
+
+    assert app.state.recipe_index is old
+    assert index_rebuild.index_status(app)["rebuild"]["error"] == "firestore unavailable"
+    old.upsert("after", _vectors(1, 3)[0])  # journal is off again, writes still apply
+    assert "after" in old and old._journal is None
@@ -0,0 +1,83 @@
+"""
+Similarity index snapshot: a saved pair loads back, the max age counts from
+the last full build (delta saves don't reset it), concurrent saves never
+leave one writer's index next to another's meta, and an index that doesn't
+match its meta (a torn pair) is rejected so the caller rebuilds.
+"""
+import shutil
+import threading
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+
+faiss = pytest.importorskip("faiss")
+
+from app.services import index_snapshot
+from app.services.index_snapshot import load_snapshot, new_watermark, save_snapshot
+from app.services.recipe_index import FAISS_INDEX_TYPE, RecipeIndex
+
+DIM = 16
+
+
+@pytest.fixture(autouse=True)
+def snapshot_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(index_snapshot, "SNAPSHOT_DIR", tmp_path)
+    return tmp_path
+
+
+def _index(n: int, seed: int = 0):
+    index = faiss.IndexIDMap2(faiss.IndexFlatIP(DIM))
+    index.add_with_ids(np.random.default_rng(seed).normal(size=(n, DIM)).astype("float32"), np.arange(n))
+    return index, {i: f"r{i}" for i in range(n)}
+
+
+def test_round_trip():
+    index, ids = _index(10)
+    del ids[3]  # deleted, still stored (hnsw tombstone)
+    watermark, built_at = new_watermark(), datetime.now(timezone.utc) - timedelta(hours=1)
+    save_snapshot(index, ids, watermark, "flat", removed=[3], built_at=built_at)
+    loaded, id_mapping, removed, loaded_watermark, loaded_built_at = load_snapshot("flat")
+    assert loaded.ntotal == 10 and id_mapping == ids and removed == [3]
+    assert (loaded_watermark, loaded_built_at) == (watermark, built_at)
+    assert load_snapshot("hnsw") is None
+
+
+def test_max_age_counts_from_the_last_full_build(monkeypatch):
+    monkeypatch.setattr(index_snapshot, "SNAPSHOT_MAX_AGE_HOURS", 24)
+    recipe_index = RecipeIndex.from_embeddings([f"r{i}" for i in range(5)],
+                                               np.eye(5, DIM, dtype="float32"), index_type=FAISS_INDEX_TYPE)
+    recipe_index.watermark = new_watermark()
+    recipe_index.built_at = datetime.now(timezone.utc) - timedelta(hours=23)
+    recipe_index.persist()
+    assert load_snapshot(FAISS_INDEX_TYPE) is not None
+
+    # a delta save (shutdown, refresh) a day later keeps the build time: too old now
+    recipe_index.built_at -= timedelta(hours=2)
+    recipe_index.persist()
+    assert load_snapshot(FAISS_INDEX_TYPE) is None
+
+
+def test_concurrent_saves_leave_a_matching_pair():
+    def save(n):
+        index, ids = _index(n)
+        for _ in range(5):
+            save_snapshot(index, ids, new_watermark(), "flat")
+
+    threads = [threading.Thread(target=save, args=(n,)) for n in (20, 30, 40)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    loaded, id_mapping, _, _, _ = load_snapshot("flat")
+    assert loaded.ntotal == len(id_mapping)
+
+
+def test_torn_pair_is_rejected(snapshot_dir):
+    index_path, _ = index_snapshot._snapshot_paths()
+    save_snapshot(*_index(10), new_watermark(), "flat")
+    first = snapshot_dir / "first.index"
+    shutil.copy(index_path, first)
+    save_snapshot(*_index(10, seed=1), new_watermark(), "flat")  # same count, different vectors
+    shutil.copy(first, index_path)  # old index next to the new meta
+    assert load_snapshot("flat") is None
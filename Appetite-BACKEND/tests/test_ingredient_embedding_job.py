@@ -0,0 +1,35 @@
+"""
+Ingredient embedding job (db_init/addIngredientEmbeddings.py): the vocabulary
+is normalized like server-side matching, only terms without an embedding are
+encoded, and encoding happens in batches.
+"""
+import numpy as np
+
+from db_init import addIngredientEmbeddings as job
+
+
+def test_vocabulary_normalized_and_only_missing_terms(monkeypatch):
+    vocab = job.collect_vocabulary([
+        {"ingredient_names": ["  Olive  Oil", "salt", ""]},
+        {"ingredient_names": ["olive oil", "Salt/Pepper", "garlic"]},
+        {},
+    ])
+    assert vocab == {"olive oil", "salt", "salt/pepper", "garlic"}
+
+    assert job.missing_terms(vocab, {"salt"}) == ["garlic", "olive oil"]
+    monkeypatch.setattr(job, "FORCE", True)
+    assert job.missing_terms(vocab, {"salt"}) == ["garlic", "olive oil", "salt"]
+
+
+def test_encodes_in_batches(monkeypatch):
+    monkeypatch.setattr(job, "BATCH_SIZE", 4)
+    calls, written = [], {}
+
+    def encode(texts):
+        calls.append(len(texts))
+        return np.ones((len(texts), 8), dtype="float32")
+
+    terms = [f"t{i}" for i in range(10)]
+    assert job.encode_in_batches(terms, encode, written.__setitem__) == 10
+    assert calls == [4, 4, 2]
+    assert list(written) == terms
@@ -0,0 +1,82 @@
+"""
+Fuzzy ingredient mapping: detected names are mapped onto the canonical
+ingredient vocabulary through the ingredient index, exact hits skip the
+encoder, and mappings are cached per term. A fake text encoder stands in
+for CLIP.
+"""
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+pytest.importorskip("faiss")
+
+from app.resources import READY, ResourceState
+from app.services.ingredient_index import IngredientIndex, load_ingredient_index, map_ingredients, mapping_cache
+
+VOCAB = ["tomato", "egg", "beef", "basil"]
+BASIS = np.eye(8, dtype="float32")[: len(VOCAB)]
+
+# "cherry tomatoes" sits next to tomato, "quail eggs" next to egg, "saffron" near nothing
+QUERIES = {
+    "cherry tomatoes": BASIS[0] + 0.1 * BASIS[3],
+    "quail eggs": BASIS[1] + 0.2 * BASIS[2],
+    "saffron": np.eye(8, dtype="float32")[7],
+}
+
+
+class _Encoder:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, app, texts):
+        self.calls.append(list(texts))
+        return np.vstack([QUERIES[t] for t in texts])
+
+
+def _app():
+    state = SimpleNamespace(
+        ingredient_index=IngredientIndex(VOCAB, BASIS),
+        resources={name: ResourceState(name) for name in ("clip", "ingredient_index")},
+    )
+    for s in state.resources.values():
+        s.status = READY
+    return SimpleNamespace(state=state)
+
+
+def test_maps_to_nearest_canonical_terms():
+    mapping_cache.clear()
+    app, encode = _app(), _Encoder()
+    mapping = map_ingredients(app, ["Cherry Tomatoes", "egg", "quail eggs", "saffron"], encode=encode)
+
+    assert mapping == {
+        "cherry tomatoes": ["tomato"],
+        "egg": ["egg"],
+        "quail eggs": ["egg"],
+        "saffron": ["saffron"],  # nothing above the threshold: kept as is
+    }
+    assert encode.calls == [["cherry tomatoes", "quail eggs", "saffron"]]  # one batch, exact hit skipped
+
+
+def test_mappings_are_cached():
+    mapping_cache.clear()
+    app, encode = _app(), _Encoder()
+    map_ingredients(app, ["cherry tomatoes"], encode=encode)
+    map_ingredients(app, ["cherry tomatoes", "quail eggs"], encode=encode)
+    assert encode.calls == [["cherry tomatoes"], ["quail eggs"]]
+
+
+def test_identity_mapping_until_loaded():
+    app, encode = _app(), _Encoder()
+    app.state.resources["ingredient_index"].status = "loading"
+    assert map_ingredients(app, ["cherry tomatoes"], encode=encode) == {"cherry tomatoes": ["cherry tomatoes"]}
+    assert encode.calls == []
+
+
+def test_empty_vocabulary_is_ready_with_identity_mapping(fake_db):
+    app, encode = _app(), _Encoder()
+    app.state.db = fake_db({"ingredient_embeddings": {}})
+    load_ingredient_index(app)  # no exception: the resource becomes READY
+    assert app.state.ingredient_index is None
+    assert map_ingredients(app, ["cherry tomatoes"], encode=encode) == {"cherry tomatoes": ["cherry tomatoes"]}
+    assert encode.calls == []
@@ -0,0 +1,147 @@
+"""
+Ingredient photo search pipeline: CLIP similarity runs while Gemini is still
+extracting (its results are streamed first), both branches share one decode,
+the two rankings are fused, and the endpoint streams NDJSON / SSE. Gemini is
+a slow stub model; CLIP retrieval is replaced by a fake search_similar.
+"""
+import asyncio
+import json
+import time
+from io import BytesIO
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("scipy")
+pytest.importorskip("PIL")
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from PIL import Image
+
+try:
+    from app.routers import searchIngredients as router_module
+    from app.services import gemini_api
+    from app.services import ingredient_photo_search as pipeline
+except Exception as e:  # pragma: no cover - depends on the server environment
+    pytest.skip(f"app.services.gemini_api is not importable here (Firebase credentials etc.): {e}",
+                allow_module_level=True)
+
+from app.resources import READY, ResourceState
+from app.services.extraction_cache import ExtractionCache
+from app.services.recipe_ingredient_index import RecipeIngredientIndex
+
+GEMINI_SECONDS = 0.3
+
+
+class _SlowModel:
+    def generate_content(self, parts):
+        time.sleep(GEMINI_SECONDS)
+        return SimpleNamespace(text='["tomato", "basil"]')
+
+
+@pytest.fixture
+def app(monkeypatch):
+    monkeypatch.setattr(gemini_api, "gemini_model", lambda name=None: _SlowModel())
+    monkeypatch.setattr(gemini_api, "extraction_cache", ExtractionCache(16, 60))
+    decodes = []
+    real_decode = gemini_api.decode_image
+    monkeypatch.setattr(gemini_api, "decode_image", lambda *a: decodes.append(1) or real_decode(*a))
+
+    async def fake_similar(request, top_k, cache_key, load_image, filters=None):
+        await load_image()
+        return [("soup", 0.9), ("cake", 0.8)]
+
+    monkeypatch.setattr(pipeline, "search_similar", fake_similar)
+    monkeypatch.setattr(pipeline, "map_ingredients", lambda app, ingredients: {})
+    monkeypatch.setattr(pipeline, "get_recipes_details",
+                        lambda ids, request: [{"id": i, "name": i.title()} for i in ids])
+
+    index = RecipeIngredientIndex()
+    index.set_recipe("salad", "Salad", ["tomato", "basil", "lettuce"])
+    index.set_recipe("soup", "Soup", ["tomato", "onion"])
+    index.set_recipe("cake", "Cake", ["flour", "egg"])
+
+    app = FastAPI()
+    app.include_router(router_module.router)
+    app.state.recipe_ingredients = index
+    app.state.resources = {}
+    for name in ("recipe_ingredients", "clip", "recipe_index"):
+        app.state.resources[name] = state = ResourceState(name)
+        state.status = READY
+    app.state.decodes = decodes
+    return app
+
+
+def _photo() -> bytes:
+    buf = BytesIO()
+    Image.new("RGB", (1024, 768), (200, 40, 40)).save(buf, "JPEG")
+    return buf.getvalue()
+
+
+def test_fusion_prefers_recipes_both_sources_find():
+    matches = [{"id": "a", "matched_ingredients": ["x"]}, {"id": "b", "matched_ingredients": ["y"]}]
+    fused = pipeline.fuse_candidates(matches, [("c", 0.9), ("b", 0.8)], top_k=3)
+    assert [f["id"] for f in fused] == ["b", "a", "c"]
+    assert fused[0]["similarity"] == 0.8 and fused[1]["similarity"] is None
+    assert fused[2]["matched_ingredients"] is None
+    # a single source keeps its own order
+    assert [f["id"] for f in pipeline.fuse_candidates(matches, [], 5)] == ["a", "b"]
+
+
+def test_similar_recipes_arrive_before_gemini(app):
+    request = SimpleNamespace(app=app)
+
+    async def run():
+        t0, seen = time.perf_counter(), []
+        async for event, payload in pipeline.photo_search_events(request, _photo(), top_k=3):
+            seen.append((event, time.perf_counter() - t0, payload))
+        return seen
+
+    seen = asyncio.run(run())
+    assert [e for e, _, _ in seen] == ["similar", "ingredients", "results"]
+    assert seen[0][1] < GEMINI_SECONDS / 2  # not held up by the Gemini call
+    assert seen[1][2]["detected_ingredients"] == ["tomato", "basil"]
+    results = seen[2][2]["results"]
+    assert [r["id"] for r in results] == ["soup", "salad", "cake"]
+    # soup: found by both; cake: only by CLIP, ingredient fields filled from the index
+    assert results[0]["similarity"] == 0.9 and results[0]["matched_ingredients"] == ["tomato"]
+    assert results[2]["matched_ingredients"] == [] and results[2]["missing_count"] == 2
+    assert len(app.state.decodes) == 1
+
+
+def test_streams_ndjson_and_sse(app):
+    client = TestClient(app)
+    files = {"file": ("fridge.jpg", _photo(), "image/jpeg")}
+    response = client.post("/api/v1/ingredients/by-upload?top_k=3&stream=ndjson", files=files)
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    events = [json.loads(line) for line in response.text.splitlines()]
+    assert [e["event"] for e in events] == ["similar", "ingredients", "results"]
+
+    response = client.post("/api/v1/ingredients/by-upload?top_k=3&stream=sse", files=files)
+    assert response.text.startswith("event: ")  # the extraction is cached now: ingredients come first
+    assert [line[7:] for line in response.text.splitlines() if line.startswith("event: ")][-1] == "results"
+
+    plain = client.post("/api/v1/ingredients/by-upload?top_k=3&similar=false", files=files).json()
+    assert [r["id"] for r in plain["results"]] == ["salad", "soup"]
+    assert plain["detected_ingredients"] == ["tomato", "basil"]
+
+
+def test_no_ingredients_detected(app, monkeypatch):
+    empty = SimpleNamespace(generate_content=lambda parts: SimpleNamespace(text="[]"))
+    monkeypatch.setattr(gemini_api, "gemini_model", lambda name=None: empty)
+    client = TestClient(app)
+    files = {"file": ("fridge.jpg", _photo(), "image/jpeg")}
+    # similar recipes are still an answer
+    body = client.post("/api/v1/ingredients/by-upload?top_k=3", files=files).json()
+    assert body["detected_ingredients"] == [] and [r["id"] for r in body["results"]] == ["soup", "cake"]
+    # without them there is nothing to return
+    response = client.post("/api/v1/ingredients/by-upload?top_k=3&similar=false", files=files)
+    assert response.status_code == 400 and response.json()["detail"] == "No ingredients detected in image"
+
+
+def test_invalid_image(app):
+    client = TestClient(app)
+    files = {"file": ("x.jpg", b"not an image", "image/jpeg")}
+    assert client.post("/api/v1/ingredients/by-upload", files=files).status_code == 400
+    line = client.post("/api/v1/ingredients/by-upload?stream=ndjson", files=files).text.splitlines()[-1]
+    assert json.loads(line) == {"event": "error", "status": 400, "detail": "Invalid image file"}
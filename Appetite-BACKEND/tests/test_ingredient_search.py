@@ -0,0 +1,160 @@
+"""
+Ingredient search from the recipe x ingredient matrix: overlap / coverage
+rankings match a per-recipe Python reference with the same IDF weights, the
+index follows recipe creates / deletes (other workers' ones on refresh), and
+detected ingredients expand through the vocabulary mapping.
+"""
+import math
+import random
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("scipy")
+
+from app.services.recipe_ingredient_index import RecipeIngredientIndex
+from app.services.searchIngredients import search_recipes_by_ingredients
+
+VOCAB = ["salt", "black pepper", "olive oil", "tomato", "basil", "chicken", "rice", "egg", "flour",
+         "garlic", "lemon", "beef", "onion", "cheese", "milk", "potato"]
+
+
+@pytest.fixture
+def catalog():
+    rng = random.Random(0)
+    # salt / olive oil in most recipes, the rest less often
+    recipes = {}
+    for i in range(500):
+        ingredients = rng.sample(VOCAB[3:], rng.randint(1, 6))
+        ingredients += [s for s in ("salt", "olive oil") if rng.random() < 0.8]
+        recipes[f"r{i:03d}"] = (f"Recipe {i}", ingredients)
+    index = RecipeIngredientIndex()
+    for rid, (name, ingredients) in recipes.items():
+        index.set_recipe(rid, name, ingredients)
+    return index, recipes
+
+
+def reference(recipes, query, top_k, mode):
+    """Per-recipe loop with the same smoothed IDF, ranking and tie-breaks"""
+    df = {}
+    for _, ingredients in recipes.values():
+        for ing in set(ingredients):
+            df[ing] = df.get(ing, 0) + 1
+    idf = {ing: math.log((1 + len(recipes)) / (1 + n)) + 1 for ing, n in df.items()}
+
+    ranked = []
+    for row, (rid, (_, ingredients)) in enumerate(recipes.items()):
+        shared = set(ingredients) & set(query)
+        if not shared:
+            continue
+        overlap = sum(idf[i] for i in shared)
+        coverage = overlap / sum(idf[i] for i in ingredients)
+        missing = len(ingredients) - len(shared)
+        key = (coverage, overlap) if mode == "coverage" else (overlap, len(shared))
+        ranked.append((-key[0], -key[1], missing, row, rid))
+    return [r[-1] for r in sorted(ranked)[:top_k]]
+
+
+@pytest.mark.parametrize("mode", ["overlap", "coverage"])
+@pytest.mark.parametrize("query", [["tomato", "basil"], ["salt", "egg", "flour", "milk"], ["saffron"], ["Olive  Oil "]])
+def test_matches_reference(catalog, query, mode):
+    index, recipes = catalog
+    hits = search_recipes_by_ingredients(index, query, top_k=8, mode=mode)
+    normalized = [" ".join(q.lower().split()) for q in query]
+    expected = reference(recipes, normalized, 8, mode)
+    assert [h["id"] for h in hits] == expected
+    for hit in hits:
+        ingredients = recipes[hit["id"]][1]
+        assert set(hit["matched_ingredients"]) == set(normalized) & set(ingredients)
+        assert hit["all_ingredients"] == ingredients
+        assert hit["missing_count"] == len(ingredients) - len(hit["matched_ingredients"])
+
+
+def test_common_ingredients_weigh_less(catalog):
+    index, recipes = catalog
+    # one rare ingredient outranks two staples
+    index.set_recipe("staples", "Staples", ["salt", "olive oil", "water"])
+    index.set_recipe("rare", "Rare", ["saffron", "water"])
+    hits = search_recipes_by_ingredients(index, ["salt", "olive oil", "saffron"], top_k=len(recipes) + 2)
+    ids = [h["id"] for h in hits]
+    assert ids.index("rare") < ids.index("staples")
+
+
+def test_coverage_prefers_recipes_the_pantry_completes():
+    index = RecipeIngredientIndex()
+    index.set_recipe("toast", "Toast", ["bread", "butter"])
+    index.set_recipe("feast", "Feast", ["bread", "butter", "beef", "wine", "carrot", "thyme"])
+    index.set_recipe("other", "Other", ["beef", "carrot"])
+    pantry = ["bread", "butter", "beef"]
+    assert search_recipes_by_ingredients(index, pantry, mode="overlap")[0]["id"] == "feast"
+    top = search_recipes_by_ingredients(index, pantry, mode="coverage")[0]
+    assert top["id"] == "toast" and top["coverage"] == 1.0 and top["missing_count"] == 0
+    with pytest.raises(ValueError):
+        index.search(pantry, 3, mode="best")
+
+
+def test_follows_creates_and_deletes():
+    index = RecipeIngredientIndex()
+    index.set_recipe("a", "Pesto", ["Basil", "garlic", "basil"])
+    index.set_recipe("b", "Soup", ["tomato", "basil"])
+    assert [h["id"] for h in search_recipes_by_ingredients(index, ["basil", "tomato"])] == ["b", "a"]
+
+    index.set_recipe("b", "Soup", ["tomato"])  # replaced: no longer has basil
+    assert [h["id"] for h in search_recipes_by_ingredients(index, ["basil"])] == ["a"]
+    assert index.remove_recipe("a") and not index.remove_recipe("a")
+    assert search_recipes_by_ingredients(index, ["basil"]) == []
+    assert len(index) == 1
+
+    for i in range(10):  # enough churn to compact the dead rows
+        index.set_recipe("b", "Soup", ["tomato", f"herb {i}"])
+    hits = search_recipes_by_ingredients(index, ["tomato"])
+    assert [h["id"] for h in hits] == ["b"] and hits[0]["all_ingredients"] == ["tomato", "herb 9"]
+
+
+def test_delete_racing_a_search_still_fills_k():
+    index = RecipeIngredientIndex()
+    for i in range(4):
+        index.set_recipe(f"r{i}", f"Recipe {i}", ["tomato", f"spice {i}"])
+    compile_ = index._compile
+
+    def compile_then_delete():
+        compiled = compile_()
+        index.remove_recipe("r0")  # another request, after the snapshot was taken
+        index._compile = compile_
+        return compiled
+
+    index._compile = compile_then_delete
+    hits = index.search(["tomato"], 3)
+    assert len(hits) == 3 and "r0" not in {h["id"] for h in hits}
+
+
+def test_mapping_expands_detected_terms():
+    index = RecipeIngredientIndex()
+    index.set_recipe("a", "Salad", ["tomato", "lettuce"])
+    hits = search_recipes_by_ingredients(index, ["Cherry Tomatoes"],
+                                         term_mapping={"cherry tomatoes": ["tomato"]})
+    assert [h["id"] for h in hits] == ["a"] and hits[0]["matched_ingredients"] == ["tomato"]
+
+
+def test_refresh_follows_other_workers(fake_db):
+    pytest.importorskip("firebase_admin")
+    from app.services.recipe_ingredient_index import load_recipe_ingredient_index, refresh_recipe_ingredient_index
+    from app.services.searchSimRecipe import remove_recipe_from_index
+
+    db = fake_db({"recipes": {
+        "a": {"name": "Pesto", "ingredient_names": ["basil", "garlic"]},
+        "b": {"name": "Caprese", "ingredient_names": ["basil", "tomato"]},
+    }})
+    worker, other = (SimpleNamespace(state=SimpleNamespace(db=db, resources={})) for _ in range(2))
+    load_recipe_ingredient_index(worker)
+    assert {h["id"] for h in worker.state.recipe_ingredients.search(["basil"], 5)} == {"a", "b"}
+
+    # the other worker deletes "a" (the delete route) and creates "c"
+    db.collection("recipes").document("a").delete()
+    remove_recipe_from_index(SimpleNamespace(app=other), "a")
+    db.collections["recipes"]["c"] = {"name": "Soup", "ingredient_names": ["basil"],
+                                      "updatedAt": datetime.now(timezone.utc)}
+
+    assert refresh_recipe_ingredient_index(worker) == 2
+    assert {h["id"] for h in worker.state.recipe_ingredients.search(["basil"], 5)} == {"b", "c"}
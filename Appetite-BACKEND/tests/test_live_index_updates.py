@@ -0,0 +1,97 @@
+"""
+Live similarity index updates on recipe create / delete: a created recipe is
+searchable right away and its embedding is stored (written outside the CPU
+pool), a deleted one is gone and tombstoned, and a recipe created before
+CLIP has loaded is indexed once it has. CLIP is a fake that embeds every
+image as the same vector.
+"""
+import asyncio
+import io
+import threading
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("faiss")
+pytest.importorskip("firebase_admin")
+from PIL import Image
+
+from app.resources import LOADING, READY, ResourceState
+from app.services import searchSimRecipe
+from app.services.recipe_index import RecipeIndex
+from app.services.searchSimRecipe import index_recipe_image, remove_recipe_from_index
+
+DIM = 512
+NEW_VECTOR = np.eye(DIM, dtype="float32")[7]
+
+
+class _FakeClip:
+    def encode_image(self, batch):
+        return torch.from_numpy(np.tile(NEW_VECTOR, (batch.shape[0], 1)))
+
+
+@pytest.fixture
+def request_(fake_db):
+    rng = np.random.default_rng(0)
+    ids = [f"r{i}" for i in range(20)]
+    state = SimpleNamespace(
+        db=fake_db(),
+        model=_FakeClip(),
+        preprocess=lambda pil: torch.zeros(3, 8, 8),
+        device="cpu",
+        recipe_index=RecipeIndex.from_embeddings(ids, rng.normal(size=(20, DIM)).astype("float32"), "flat"),
+        resources={name: ResourceState(name) for name in ("clip", "recipe_index")},
+    )
+    for s in state.resources.values():
+        s.status = READY
+    return SimpleNamespace(app=SimpleNamespace(state=state))
+
+
+def _jpeg() -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", (64, 64), (0, 120, 0)).save(buf, "JPEG")
+    return buf.getvalue()
+
+
+def _top(request, k=3):
+    return [rid for rid, _ in request.app.state.recipe_index.search(NEW_VECTOR, k)]
+
+
+def test_create_is_searchable_and_delete_is_gone(request_, monkeypatch):
+    writers = []
+    doc_type = type(request_.app.state.db.collection("recipe_embeddings").document("new"))
+    real_set = doc_type.set
+
+    def recording_set(self, *args, **kwargs):
+        writers.append(threading.current_thread().name)
+        real_set(self, *args, **kwargs)
+
+    monkeypatch.setattr(doc_type, "set", recording_set)
+
+    assert asyncio.run(index_recipe_image(request_, "new", _jpeg(), {"category": "Salad"}))
+    assert _top(request_)[0] == "new"
+    stored = request_.app.state.db.collections["recipe_embeddings"]["new"]
+    assert "updatedAt" in stored and not stored.get("deleted")
+    assert not writers[0].startswith("cpu")  # the Firestore write doesn't hold a CPU slot
+
+    assert remove_recipe_from_index(request_, "new")
+    assert "new" not in _top(request_)
+    assert request_.app.state.db.collections["recipe_embeddings"]["new"]["deleted"] is True
+
+
+def test_created_before_clip_loads_is_indexed_later(request_):
+    clip_state = request_.app.state.resources["clip"]
+    clip_state.status = LOADING
+
+    async def run():
+        assert not await index_recipe_image(request_, "early", _jpeg())
+        await asyncio.sleep(0.01)
+        assert "early" not in _top(request_)
+        clip_state.status = READY
+        clip_state.settled.set()
+        await asyncio.gather(*searchSimRecipe._deferred_indexing)
+
+    asyncio.run(run())
+    assert _top(request_)[0] == "early"
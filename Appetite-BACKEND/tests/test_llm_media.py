@@ -0,0 +1,118 @@
+"""
+Media preparation for Gemini calls: large photos are downscaled and sent as
+one JPEG encode, small JPEG uploads go as is, WAV is resampled to 16 kHz mono,
+and request sizes show up in llm_requests metrics. A stub model stands in
+for Gemini and keeps the parts it was sent.
+"""
+import asyncio
+import io
+import wave
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+pytest.importorskip("PIL")
+pytest.importorskip("scipy")
+from PIL import Image
+
+try:
+    from app.services import gemini_api
+except Exception as e:  # pragma: no cover - depends on the server environment
+    pytest.skip(f"app.services.gemini_api is not importable here (Firebase credentials etc.): {e}",
+                allow_module_level=True)
+
+from app.services.extraction_cache import ExtractionCache
+from app.utils import media
+from app.utils.images import decode_image
+from app.utils.metrics import collect_metrics
+
+
+def _jpeg(size, quality=85, exif_orientation=None) -> bytes:
+    rng = np.random.default_rng(0)
+    blocks = rng.integers(0, 256, (24, 32, 3), dtype=np.uint8)
+    img = Image.fromarray(blocks).resize(size, Image.BILINEAR)
+    out = io.BytesIO()
+    exif = Image.Exif()
+    if exif_orientation:
+        exif[0x0112] = exif_orientation
+    img.save(out, "JPEG", quality=quality, exif=exif)
+    return out.getvalue()
+
+
+def _wav(seconds=2.0, rate=44100, channels=2) -> bytes:
+    t = np.arange(int(seconds * rate)) / rate
+    tone = (0.3 * np.sin(2 * np.pi * 440 * t) * 32767).astype("<i2")
+    out = io.BytesIO()
+    with wave.open(out, "wb") as wf:
+        wf.setnchannels(channels)
+        wf.setsampwidth(2)
+        wf.setframerate(rate)
+        wf.writeframes(np.repeat(tone, channels).tobytes())
+    return out.getvalue()
+
+
+def test_large_photo_is_downscaled_once():
+    photo = _jpeg((4000, 3000))
+    img = decode_image(photo, 768)
+    blob = media.prepare_image(img, photo)
+    assert blob["mime_type"] == "image/jpeg"
+    sent = Image.open(io.BytesIO(blob["data"]))
+    assert max(sent.size) == media.LLM_IMAGE_MAX_EDGE and sent.size[0] / sent.size[1] == pytest.approx(4 / 3, 0.01)
+    # the SDK sent the decoded image losslessly: compare with its raw pixels (see benchmarks/llm_payload.py)
+    assert len(blob["data"]) < img.width * img.height * 3 / 20
+
+
+def test_small_upright_jpeg_passes_through():
+    small = _jpeg((800, 600))
+    assert media.prepare_image(source=small)["data"] is small
+    rotated = _jpeg((800, 600), exif_orientation=6)
+    sent = Image.open(io.BytesIO(media.prepare_image(source=rotated)["data"]))
+    assert sent.size == (600, 800)  # re-encoded upright
+    heavy = _jpeg((800, 600), quality=100)  # within the size limit, but far more bytes than needed
+    assert media.prepare_image(source=heavy)["data"] is not heavy
+
+
+def test_wav_is_resampled_to_mono(monkeypatch):
+    monkeypatch.setattr(media, "ffmpeg_available", lambda: False)
+    raw = _wav()
+    blob = media.prepare_audio(raw)
+    assert blob["mime_type"] == "audio/wav"
+    with wave.open(io.BytesIO(blob["data"])) as wf:
+        assert (wf.getnchannels(), wf.getframerate()) == (1, 16000)
+        assert wf.getnframes() == 32000
+    assert len(blob["data"]) < len(raw) / 5
+    m4a = b"\x00\x00\x00\x20ftypM4A rest"
+    assert media.prepare_audio(m4a) == {"mime_type": "audio/mp4", "data": m4a}
+
+
+@pytest.mark.skipif(not media.ffmpeg_available(), reason="needs ffmpeg")
+def test_wav_to_opus(monkeypatch):
+    monkeypatch.setattr(media, "LLM_AUDIO_CODEC", "opus")
+    blob = media.prepare_audio(_wav())
+    assert blob["mime_type"] == "audio/ogg" and blob["data"][:4] == b"OggS"
+
+
+def test_gemini_receives_prepared_media(monkeypatch):
+    sent = []
+
+    class _Model:
+        def generate_content(self, contents):
+            sent.append(contents)
+            return SimpleNamespace(text='["egg"]' if isinstance(contents, list) and contents[1]["mime_type"].startswith("image")
+                                   else '{"transcript": "next", "intent": "next"}')
+
+    monkeypatch.setattr(gemini_api, "gemini_model", lambda name=None: _Model())
+    monkeypatch.setattr(gemini_api, "extraction_cache", ExtractionCache(4, 60))
+    monkeypatch.setattr(media, "ffmpeg_available", lambda: False)
+
+    photo = _jpeg((4000, 3000))
+    assert asyncio.run(gemini_api.extract_ingredients_cached(photo)) == ["egg"]
+    assert asyncio.run(gemini_api.gemini_classify_from_audio(_wav()))["intent"] == "next"
+    image_part, audio_part = sent[0][1], sent[1][1]
+    assert image_part["mime_type"] == "image/jpeg" and len(image_part["data"]) < len(photo)
+    assert audio_part["mime_type"] == "audio/wav"
+
+    requests = collect_metrics()["llm_requests"]
+    assert requests["extract_ingredients"]["last_bytes"] == len(image_part["data"]) + len(gemini_api.INGREDIENTS_PROMPT)
+    assert requests["classify_audio"]["last_bytes"] > len(audio_part["data"])
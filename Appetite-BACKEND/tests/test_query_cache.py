@@ -0,0 +1,94 @@
+"""
+Similarity query cache: LRU/TTL behaviour, URL normalization, and reuse of
+cached embeddings / hits across index versions. Runs without CLIP: the
+batcher is replaced by a fake that counts encodes.
+"""
+import asyncio
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+pytest.importorskip("faiss")
+pytest.importorskip("PIL")
+
+from app.services import searchSimRecipe as sim
+from app.services.recipe_index import RecipeIndex
+from app.utils.cache import TTLCache
+
+DIM = 16
+
+
+def test_ttl_cache_lru_eviction_and_counters():
+    cache = TTLCache(maxsize=2, ttl_seconds=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1      # a is now most recent
+    cache.set("c", 3)               # evicts b
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["evictions"]) == (2, 1, 1)
+
+
+def test_ttl_cache_expiry():
+    cache = TTLCache(maxsize=4, ttl_seconds=0.01)
+    cache.set("a", 1)
+    time.sleep(0.02)
+    assert cache.get("a") is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_url_key_normalization():
+    a = sim.url_cache_key("HTTPS://Example.com:443/img.jpg?b=2&a=1#top", '"v1"')
+    b = sim.url_cache_key("https://example.com/img.jpg?a=1&b=2", '"v1"')
+    assert a == b
+    assert a != sim.url_cache_key("https://example.com/img.jpg?a=1&b=2", '"v2"')
+
+
+class _CountingBatcher:
+    def __init__(self):
+        self.calls = 0
+
+    async def encode(self, tensor):
+        self.calls += 1
+        return np.ones(DIM, dtype="float32")
+
+
+def _request():
+    rng = np.random.default_rng(0)
+    ids = [f"r{i}" for i in range(50)]
+    state = SimpleNamespace(
+        recipe_index=RecipeIndex.from_embeddings(ids, rng.random((50, DIM)), index_type="flat"),
+        clip_batcher=_CountingBatcher(),
+        preprocess=lambda pil: pil,
+    )
+    return SimpleNamespace(app=SimpleNamespace(state=state))
+
+
+def test_search_similar_reuses_embedding_and_hits():
+    sim.query_cache.clear()
+    request = _request()
+    batcher = request.app.state.clip_batcher
+    loads = []
+
+    async def load_image():
+        loads.append(1)
+        return "image"
+
+    async def scenario():
+        first = await sim.search_similar(request, 5, "upload:abc", load_image)
+        again = await sim.search_similar(request, 3, "upload:abc", load_image)
+        assert again == first[:3]
+        assert (batcher.calls, len(loads)) == (1, 1)
+
+        # Index changed: hits are stale, embedding still valid
+        request.app.state.recipe_index.remove(first[0][0])
+        after = await sim.search_similar(request, 5, "upload:abc", load_image)
+        assert first[0][0] not in [rid for rid, _ in after]
+        assert (batcher.calls, len(loads)) == (1, 1)
+
+    asyncio.run(scenario())
+    counts = sim._query_cache_stats()
+    assert counts["result_hits"] >= 1 and counts["embedding_hits"] >= 1
@@ -0,0 +1,70 @@
+"""
+Background resource readiness: endpoints that need a resource answer 503 +
+Retry-After while it loads and 503 once it failed, /readyz reports every
+resource's state, and start_resource tracks a loader through to READY or
+FAILED.
+"""
+import asyncio
+
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+
+from app.resources import (FAILED, LOADING, READY, RETRY_AFTER_SECONDS, ResourceState,
+                           require_resource, start_resource, wait_resource)
+from app.routers import health
+
+
+@pytest.fixture
+def app():
+    app = FastAPI()
+    app.include_router(health.router)
+    app.state.resources = {name: ResourceState(name) for name in ("clip", "recipe_index")}
+
+    @app.get("/needs-clip", dependencies=[Depends(require_resource("clip"))])
+    def needs_clip():
+        return {"ok": True}
+
+    return app
+
+
+def test_loading_then_ready(app):
+    client = TestClient(app)
+    for path in ("/needs-clip", "/readyz"):
+        response = client.get(path)
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == str(RETRY_AFTER_SECONDS)
+    assert client.get("/readyz").json()["resources"]["clip"]["status"] == LOADING
+
+    app.state.resources["clip"].status = READY
+    assert client.get("/needs-clip").json() == {"ok": True}
+    assert client.get("/readyz").status_code == 503  # recipe_index still loading
+
+    app.state.resources["recipe_index"].status = READY
+    assert client.get("/readyz").json()["ready"] is True
+
+
+def test_failed_resource(app):
+    clip = app.state.resources["clip"]
+    clip.status, clip.error = FAILED, "no weights"
+    client = TestClient(app)
+    response = client.get("/needs-clip")
+    assert response.status_code == 503 and "Retry-After" not in response.headers
+    assert response.json()["detail"] == "clip failed to load"
+    body = client.get("/readyz").json()
+    assert body["resources"]["clip"] == {"status": FAILED, "error": "no weights", "load_seconds": None}
+
+
+def test_start_resource_tracks_the_loader():
+    app = FastAPI()
+
+    def boom(app):
+        raise RuntimeError("no weights")
+
+    async def run():
+        await asyncio.gather(start_resource(app, "good", lambda app: None), start_resource(app, "bad", boom))
+        return await wait_resource(app, "good"), await wait_resource(app, "bad")
+
+    assert asyncio.run(run()) == (True, False)
+    assert app.state.resources["good"].status == READY
+    assert app.state.resources["bad"].status == FAILED and app.state.resources["bad"].error == "no weights"
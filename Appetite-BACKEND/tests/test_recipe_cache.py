@@ -0,0 +1,78 @@
+"""
+Read-through recipe cache: one Firestore read per hot recipe, negative
+caching of unknown ids, invalidation on write, and batched lookups that
+only fetch what is not cached.
+"""
+import pytest
+
+pytest.importorskip("firebase_admin")
+
+from app.services.recipe_cache import (
+    get_recipe_doc, get_recipe_docs, invalidate_recipe, recipe_cache)
+
+
+@pytest.fixture(autouse=True)
+def _empty_cache():
+    recipe_cache.clear()
+
+
+def test_read_through_and_invalidate(fake_db):
+    db = fake_db({"recipes": {"r1": {"name": "Pho", "steps": ["boil"]}}})
+    assert get_recipe_doc(db, "r1")["name"] == "Pho"
+    assert get_recipe_doc(db, "r1")["name"] == "Pho"
+    assert db.reads == 1 and db.get_all_calls == []
+
+    db.collections["recipes"]["r1"]["name"] = "Pho Bo"
+    invalidate_recipe("r1")
+    assert get_recipe_doc(db, "r1")["name"] == "Pho Bo"
+    assert db.reads == 2
+
+
+def test_missing_ids_are_negatively_cached(fake_db):
+    db = fake_db()
+    assert get_recipe_doc(db, "nope") is None
+    assert get_recipe_doc(db, "nope") is None
+    assert db.reads == 1
+
+
+def test_callers_get_a_copy(fake_db):
+    db = fake_db({"recipes": {"r1": {"name": "Pho"}}})
+    get_recipe_doc(db, "r1")["id"] = "r1"
+    assert "id" not in get_recipe_doc(db, "r1")
+
+
+def test_batched_lookup_only_fetches_uncached(fake_db):
+    db = fake_db({"recipes": {"a": {"name": "A"}, "b": {"name": "B"}}})
+    hits, misses = recipe_cache.hits, recipe_cache.misses
+    assert set(get_recipe_docs(db, ["a", "gone"])) == {"a"}
+    assert db.reads == 2
+
+    docs = get_recipe_docs(db, ["b", "a", "gone"])
+    assert set(docs) == {"a", "b"}
+    assert db.reads == 3  # only "b" was read
+    assert (recipe_cache.hits - hits, recipe_cache.misses - misses) == (2, 3)
+
+
+def test_read_racing_an_invalidation_is_not_cached(fake_db, monkeypatch):
+    db = fake_db({"recipes": {"r1": {"name": "Pho"}, "r2": {"name": "Bun"}}})
+    doc_type = type(db.collection("recipes").document("r1"))
+    real_get, real_get_all = doc_type.get, db.get_all
+
+    def write_during(read):
+        def racing(*args):
+            result = read(*args)  # the old version, already on its way back
+            for rid in ("r1", "r2"):
+                db.collections["recipes"][rid]["name"] += " (edited)"
+                invalidate_recipe(rid)
+            return result
+        return racing
+
+    monkeypatch.setattr(doc_type, "get", write_during(real_get))
+    assert get_recipe_doc(db, "r1")["name"] == "Pho"  # read before the write completed
+    monkeypatch.setattr(doc_type, "get", real_get)
+    assert get_recipe_doc(db, "r1")["name"] == "Pho (edited)"
+
+    monkeypatch.setattr(db, "get_all", write_during(real_get_all))
+    assert get_recipe_docs(db, ["r2"])["r2"]["name"] == "Bun (edited)"
+    monkeypatch.setattr(db, "get_all", real_get_all)
+    assert get_recipe_docs(db, ["r2"])["r2"]["name"] == "Bun (edited) (edited)"
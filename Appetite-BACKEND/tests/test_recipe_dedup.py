@@ -0,0 +1,46 @@
+"""
+Near-duplicate detection: the tiled self-join finds exactly the brute-force
+pairs (across tile boundaries), union-find merges chains, and planted
+clusters come back as clusters.
+"""
+import numpy as np
+
+from app.services.recipe_dedup import duplicate_clusters, near_duplicate_pairs, union_find
+
+
+def planted(n=600, dim=64, clusters=((3, 250), (10, 11, 599), (40, 41)), seed=0):
+    rng = np.random.default_rng(seed)
+    x = rng.normal(size=(n, dim)).astype("float32")
+    for members in clusters:
+        x[list(members[1:])] = x[members[0]] + rng.normal(scale=0.02, size=(len(members) - 1, dim))
+    return x
+
+
+def test_pairs_match_brute_force_across_tiles():
+    x = planted()
+    left, right, sims = near_duplicate_pairs(x, threshold=0.9, chunk_size=64)
+
+    unit = x / np.linalg.norm(x, axis=1, keepdims=True)
+    full = unit @ unit.T
+    i, j = np.nonzero(np.triu(full >= 0.9, k=1))
+
+    assert sorted(zip(left.tolist(), right.tolist())) == sorted(zip(i.tolist(), j.tolist()))
+    assert np.all(left < right)
+    np.testing.assert_allclose(sims, full[left, right], atol=1e-5)
+
+
+def test_union_find_merges_chains():
+    # 0-1, 1-2, 2-3 chain reaches 0; 5-4 pair; 6 alone
+    roots = union_find(7, np.array([2, 1, 0, 5]), np.array([3, 2, 1, 4]))
+    assert roots.tolist() == [0, 0, 0, 0, 4, 4, 6]
+    assert union_find(3, np.array([], "int64"), np.array([], "int64")).tolist() == [0, 1, 2]
+
+
+def test_planted_clusters_found():
+    groups = duplicate_clusters(planted(), threshold=0.9, chunk_size=128)
+    assert [sorted(g.tolist()) for g in groups] == [[10, 11, 599], [3, 250], [40, 41]]
+
+
+def test_no_duplicates():
+    x = np.random.default_rng(1).normal(size=(200, 64)).astype("float32")
+    assert duplicate_clusters(x, threshold=0.9) == []
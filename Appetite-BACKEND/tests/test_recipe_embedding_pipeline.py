@@ -0,0 +1,100 @@
+"""
+Recipe embedding pipeline (db_init/addRecipeEmbeddings.py): batched encoding,
+skip-if-unchanged by URL / content hash / model, checkpoint resume, and
+failures that don't stall the pipeline.
+"""
+import asyncio
+import hashlib
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from app.utils.embedding_codec import EMBEDDING_MODEL
+from db_init import addRecipeEmbeddings as pipeline
+
+
+@pytest.fixture(autouse=True)
+def small_batches(monkeypatch):
+    monkeypatch.setattr(pipeline, "BATCH_SIZE", 4)
+    monkeypatch.setattr(pipeline, "DOWNLOADS", 3)
+    monkeypatch.setattr(pipeline, "BATCH_WAIT_SECONDS", 0.05)
+
+
+def image_bytes(i: int) -> bytes:
+    return f"image-{i}".encode()
+
+
+def run(items, state, checkpoint, broken=(), relabeled=None):
+    written, batch_sizes = {}, []
+
+    async def load(item):
+        await asyncio.sleep(0.001)
+        if item["id"] in broken:
+            raise ValueError("404")
+        return image_bytes(int(item["id"][1:]))
+
+    def encode(tensors):
+        batch_sizes.append(len(tensors))
+        return np.stack([np.full(4, t, dtype="float32") for t in tensors])
+
+    def write(item, sha256, embedding):
+        written[item["id"]] = (sha256, embedding)
+        checkpoint.record(item["id"], item["source"], "done")
+
+    def relabel(item):
+        relabeled[item["id"]] = item["source"]
+        checkpoint.record(item["id"], item["source"], "done")
+
+    stats = asyncio.run(pipeline.embed_items(
+        items, state, checkpoint, load, lambda data: float(len(data)), encode, write, Counter(),
+        relabel if relabeled is not None else None))
+    return stats, written, batch_sizes
+
+
+def items(n):
+    return [{"id": f"r{i}", "source": f"https://img/{i}.jpg"} for i in range(n)]
+
+
+def test_batches_and_checkpoint_resume(tmp_path):
+    path = str(tmp_path / "ckpt.jsonl")
+    stats, written, batch_sizes = run(items(10), {}, pipeline.Checkpoint(path), broken={"r3"})
+
+    assert set(written) == {f"r{i}" for i in range(10)} - {"r3"}
+    assert stats["encoded"] == 9 and stats["failed"] == 1
+    assert max(batch_sizes) == 4 and sum(batch_sizes) == 9
+    assert written["r1"][0] == hashlib.sha256(image_bytes(1)).hexdigest()
+
+    # Second run: everything is in the checkpoint (the failure too), nothing is fetched
+    stats, written, _ = run(items(12), {}, pipeline.Checkpoint(path))
+    assert set(written) == {"r10", "r11"}
+    assert stats["skipped_checkpoint"] == 10
+
+
+def test_skips_unchanged_by_url_hash_and_model(tmp_path):
+    sha = lambda i: hashlib.sha256(image_bytes(i)).hexdigest()
+    state = {
+        "r0": {"embedding_model": EMBEDDING_MODEL, "source": "https://img/0.jpg"},        # same URL
+        "r1": {"embedding_model": EMBEDDING_MODEL, "source": "https://old/1.jpg",
+               "source_sha256": sha(1)},                                                  # moved, same bytes
+        "r2": {"embedding_model": "RN50", "source": "https://img/2.jpg"},                 # other model
+        "r3": {"embedding_model": EMBEDDING_MODEL, "source": "https://img/3.jpg", "deleted": True},
+    }
+    relabeled = {}
+    stats, written, _ = run(items(5), state, pipeline.Checkpoint(str(tmp_path / "ckpt.jsonl")),
+                            relabeled=relabeled)
+
+    assert set(written) == {"r2", "r3", "r4"}
+    assert stats["skipped_unchanged"] == 2
+    assert relabeled == {"r1": "https://img/1.jpg"}  # the moved URL is stored, the vector kept
+
+
+def test_directory_source(tmp_path):
+    (tmp_path / "abc.jpg").write_bytes(b"x")
+    (tmp_path / "notes.txt").write_text("skip me")
+    found = list(pipeline.directory_items(str(tmp_path)))
+    assert [f["id"] for f in found] == ["abc"] and found[0]["source"].startswith("file:abc.jpg@")
+    assert not pipeline.unchanged({"embedding_model": EMBEDDING_MODEL, "source": found[0]["source"]},
+                                  found[0]["source"])  # local files are only matched by hash
+    # images named after a recipe that doesn't exist are not embedded
+    assert list(pipeline.directory_items(str(tmp_path), known_ids={"other"})) == []
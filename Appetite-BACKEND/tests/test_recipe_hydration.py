@@ -0,0 +1,36 @@
+"""
+Batched result hydration: get_recipes_details reads every hit in one
+db.get_all call, keeps ranking order and drops ids that no longer exist.
+"""
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("firebase_admin")
+
+from app.services.recipe_cache import recipe_cache
+from app.services.searchSimRecipe import get_recipes_details
+
+
+@pytest.fixture(autouse=True)
+def _empty_recipe_cache():
+    recipe_cache.clear()
+
+
+def _request(db):
+    return SimpleNamespace(app=SimpleNamespace(state=SimpleNamespace(db=db)))
+
+
+def test_one_round_trip_in_ranking_order(fake_db):
+    db = fake_db({"recipes": {"a": {"name": "A"}, "b": {"name": "B"}, "c": {"name": "C"}}})
+    details = get_recipes_details(["c", "gone", "a", "b"], _request(db))
+
+    assert [d["id"] for d in details] == ["c", "a", "b"]
+    assert details[0] == {"name": "C", "id": "c"}
+    assert len(db.get_all_calls) == 1
+
+
+def test_empty_hits_skip_firestore(fake_db):
+    db = fake_db()
+    assert get_recipes_details([], _request(db)) == []
+    assert db.get_all_calls == []
@@ -0,0 +1,113 @@
+"""
+Event-loop responsiveness under similarity load.
+
+Fires a burst of /api/v1/similarity/by-upload requests against an app whose
+CLIP model is replaced by a deliberately slow fake, and checks that /healthz
+keeps answering quickly while they run: image decoding, preprocessing, the
+CLIP forward pass and the FAISS search must all stay off the event loop.
+
+Runs in-process through httpx.ASGITransport; skipped when app.main (Firebase
+credentials etc.), torch or httpx are not available.
+"""
+import asyncio
+import gc
+import io
+import time
+
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+httpx = pytest.importorskip("httpx")
+Image = pytest.importorskip("PIL.Image")
+
+try:
+    from app.main import create_app
+except Exception as e:  # pragma: no cover - depends on the server environment
+    pytest.skip(f"app.main is not importable here: {e}", allow_module_level=True)
+
+from app.resources import READY, ResourceState
+from app.services.clip_batcher import ClipBatcher
+from app.services.recipe_index import RecipeIndex
+
+DIM = 512
+N_RECIPES = 200
+N_REQUESTS = 24
+FORWARD_SECONDS = 0.25     # per batch, blocks its worker thread like a real forward pass
+HEALTH_BUDGET_SECONDS = 0.1
+
+
+class SlowClip:
+    def encode_image(self, batch):
+        time.sleep(FORWARD_SECONDS)
+        return torch.rand(batch.shape[0], DIM)
+
+
+def slow_preprocess(pil_image):
+    time.sleep(0.005)
+    return torch.rand(3, 8, 8)
+
+
+def _jpeg() -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", (640, 480), (200, 10, 10)).save(buf, "JPEG")
+    return buf.getvalue()
+
+
+def _make_app(db):
+    app = create_app()  # no lifespan under ASGITransport: wire state by hand
+    rng = np.random.default_rng(0)
+    ids = [f"r{i}" for i in range(N_RECIPES)]
+    app.state.db = db
+    app.state.device = "cpu"
+    app.state.model = SlowClip()
+    app.state.preprocess = slow_preprocess
+    app.state.recipe_index = RecipeIndex.from_embeddings(ids, rng.random((N_RECIPES, DIM)), index_type="flat")
+    app.state.resources = {name: ResourceState(name) for name in ("clip", "recipe_index")}
+    for state in app.state.resources.values():
+        state.status = READY
+    return app
+
+
+async def _run_burst(db):
+    app = _make_app(db)
+    app.state.clip_batcher = ClipBatcher(app)
+    app.state.clip_batcher.start()
+    image = _jpeg()
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        async def search():
+            return await client.post(
+                "/api/v1/similarity/by-upload",
+                files={"file": ("dish.jpg", image, "image/jpeg")},
+            )
+
+        async def probe_health():
+            latencies = []
+            while not burst.done():
+                started = time.perf_counter()
+                resp = await client.get("/healthz")
+                latencies.append(time.perf_counter() - started)
+                assert resp.status_code == 200
+                await asyncio.sleep(0.01)
+            return latencies
+
+        gc.collect()  # a full collection mid-burst would show up as a loop stall
+        burst = asyncio.ensure_future(asyncio.gather(*(search() for _ in range(N_REQUESTS))))
+        latencies = await probe_health()
+        responses = await burst
+
+    await app.state.clip_batcher.stop()
+    return responses, latencies
+
+
+def test_healthz_stays_responsive_during_similarity_burst(fake_db):
+    db = fake_db({"recipes": {f"r{i}": {"name": f"Recipe r{i}"} for i in range(N_RECIPES)}})
+    responses, latencies = asyncio.run(_run_burst(db))
+
+    assert [r.status_code for r in responses] == [200] * N_REQUESTS
+    assert all(len(r.json()["results"]) == 8 for r in responses)
+    assert latencies, "burst finished before /healthz was probed"
+    worst = max(latencies)
+    assert worst < HEALTH_BUDGET_SECONDS, f"/healthz took {worst * 1000:.0f} ms during the burst"